@@ -0,0 +1,273 @@
+"""Rate limiting and admission control in front of the route handlers.
+
+Two independent checks run before a request reaches its handler:
+
+* a token bucket per client and route, configured by ``RATE_LIMITS``;
+  an empty bucket answers ``429`` with ``Retry-After``;
+* a cap of ``ADMISSION_CONCURRENCY`` requests in flight. Requests over the
+  cap queue by priority class, so door check-in is served before
+  registration and registration before listings. A request that cannot
+  start within ``ADMISSION_QUEUE_TARGET_MS`` (longer for the more urgent
+  classes) is shed with ``503``.
+
+Buckets live in memory per worker; ``RATE_LIMIT_URL`` moves them to Redis
+so the limits hold across workers.
+"""
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from starlette.routing import Match
+
+from . import metrics
+
+# "METHOD /route/template=rate/burst" entries, comma separated; "*" sets the
+# default for other routes, e.g. "POST /event/{event_id}/attendees=5/20,*=50/100"
+RATE_LIMITS = os.getenv("RATE_LIMITS", "")
+RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL")
+# Buckets kept in memory; the least recently used are forgotten (and refilled) first
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Requests handled at once per worker; 0 lifts the cap
+ADMISSION_CONCURRENCY = int(os.getenv("ADMISSION_CONCURRENCY", "64"))
+ADMISSION_QUEUE_TARGET_MS = float(os.getenv("ADMISSION_QUEUE_TARGET_MS", "500"))
+
+# Priority classes, most urgent first
+CRITICAL, HIGH, NORMAL, LOW = 0, 1, 2, 3
+PRIORITY_NAMES = {CRITICAL: "critical", HIGH: "high", NORMAL: "normal", LOW: "low"}
+# Multiples of the queue target each class may wait before it is shed
+PATIENCE = {CRITICAL: 4, HIGH: 2, NORMAL: 1, LOW: 1}
+# Routes that are never queued or limited, such as monitoring and long-lived streams
+EXEMPT = None
+
+ADMISSION_REJECTIONS = metrics.REGISTRY.register(metrics.Counter(
+    "admission_rejections_total", "Requests turned away before their handler ran.",
+    ("reason", "priority")))
+ADMISSION_QUEUE_SECONDS = metrics.REGISTRY.register(metrics.Histogram(
+    "admission_queue_seconds", "Time requests waited for a concurrency slot.", ("priority",)))
+ADMISSION_IN_FLIGHT = metrics.REGISTRY.register(metrics.Gauge(
+    "admission_in_flight", "Requests holding a concurrency slot."))
+ADMISSION_QUEUED = metrics.REGISTRY.register(metrics.Gauge(
+    "admission_queued", "Requests waiting for a concurrency slot."))
+
+
+def match_route(scope):
+    """The route ``scope`` will be dispatched to, remembered in ``scope["route"]``."""
+    if "route" not in scope:
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                scope["route"] = route
+                break
+        else:
+            scope["route"] = None
+    return scope["route"]
+
+
+def parse_limits(spec: str) -> Dict[object, Tuple[float, float]]:
+    """Parse ``RATE_LIMITS`` into ``{(method, template) or "*": (rate, burst)}``."""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        target, _, value = entry.rpartition("=")
+        rate, _, burst = value.partition("/")
+        if not target or float(rate) <= 0:
+            raise ValueError(f"Invalid RATE_LIMITS entry {entry!r}")
+        key = "*" if target.strip() == "*" else tuple(target.split(None, 1))
+        limits[key] = (float(rate), float(burst or rate))
+    return limits
+
+
+class MemoryRateLimitBackend:
+    """Token buckets in an LRU-bounded dict."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        """Take a token from ``key``'s bucket; return 0, or the seconds until one is available."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+# Same arithmetic as MemoryRateLimitBackend.take, atomic on the Redis side
+TAKE_SCRIPT = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisRateLimitBackend:
+    def __init__(self, client):
+        self.client = client
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        return float(await self.client.eval(TAKE_SCRIPT, 1, key, rate, burst))
+
+
+class ConcurrencyLimiter:
+    """At most ``limit`` holders; waiters are admitted by priority, then arrival.
+
+    A waiter gives up when not admitted within ``target`` seconds times its
+    class's ``PATIENCE``. A new arrival gives up at once when the oldest
+    request it would queue behind has already waited that long.
+    """
+
+    def __init__(self, limit: int = ADMISSION_CONCURRENCY,
+                 target: float = ADMISSION_QUEUE_TARGET_MS / 1000):
+        self.limit = limit
+        self.target = target
+        self.in_flight = 0
+        self._waiters = []
+        self._order = itertools.count()
+
+    def queue_delay(self, priority: int, now: float) -> float:
+        """How long the oldest waiter at ``priority`` or above has been queued."""
+        enqueued = [entry[2] for entry in self._waiters
+                    if entry[0] <= priority and not entry[3].done()]
+        return now - min(enqueued) if enqueued else 0.0
+
+    async def acquire(self, priority: int) -> bool:
+        if self.limit <= 0:
+            return True
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            ADMISSION_IN_FLIGHT.inc()
+            return True
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        patience = self.target * PATIENCE[priority]
+        if self.queue_delay(priority, now) >= patience:
+            return False
+        granted = loop.create_future()
+        entry = (priority, next(self._order), now, granted)
+        heapq.heappush(self._waiters, entry)
+        ADMISSION_QUEUED.inc()
+        try:
+            await asyncio.wait_for(granted, patience)
+        except asyncio.TimeoutError:
+            pass
+        except BaseException:
+            # A slot handed over just as the client went away must not leak
+            if granted.done() and not granted.cancelled():
+                self.release()
+            raise
+        finally:
+            if granted.cancelled() and entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            ADMISSION_QUEUED.dec()
+            ADMISSION_QUEUE_SECONDS.observe(loop.time() - now, PRIORITY_NAMES[priority])
+        return granted.done() and not granted.cancelled()
+
+    def release(self):
+        if self.limit <= 0:
+            return
+        # The slot passes straight to the most urgent waiter still waiting
+        while self._waiters:
+            granted = heapq.heappop(self._waiters)[3]
+            if not granted.done():
+                granted.set_result(True)
+                return
+        self.in_flight -= 1
+        ADMISSION_IN_FLIGHT.dec()
+
+
+async def _reject(send, status: int, detail: str, retry_after: int):
+    body = json.dumps({"detail": detail}).encode()
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+        (b"retry-after", str(retry_after).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def client_key(scope) -> str:
+    """Who a bucket belongs to: the bearer token if there is one, else the peer address."""
+    authorization = dict(scope["headers"]).get(b"authorization")
+    if authorization:
+        return "token:" + hashlib.blake2b(authorization, digest_size=16).hexdigest()
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying the rate limits and the concurrency cap.
+
+    ``priorities`` maps ``(method, path template)`` to a priority class or
+    ``EXEMPT``; unlisted routes are ``NORMAL``.
+    """
+
+    def __init__(self, app, priorities: Dict[Tuple[str, str], Optional[int]],
+                 limits: Optional[dict] = None, limiter: Optional[ConcurrencyLimiter] = None):
+        self.app = app
+        self.priorities = priorities
+        self.limits = parse_limits(RATE_LIMITS) if limits is None else limits
+        self.limiter = limiter or ConcurrencyLimiter()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = match_route(scope)
+        name = (scope["method"], route.path) if route is not None else None
+        priority = self.priorities.get(name, NORMAL)
+        if priority is EXEMPT:
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limits.get(name) or self.limits.get("*")
+        if limit is not None:
+            template = route.path if route is not None else "<unmatched>"
+            wait = await rate_limits.take(f"rl:{client_key(scope)}:{scope['method']} {template}", *limit)
+            if wait > 0:
+                ADMISSION_REJECTIONS.inc("rate_limited", PRIORITY_NAMES[priority])
+                await _reject(send, 429, "Too many requests", math.ceil(wait))
+                return
+
+        if not await self.limiter.acquire(priority):
+            ADMISSION_REJECTIONS.inc("shed", PRIORITY_NAMES[priority])
+            await _reject(send, 503, "Server is busy, retry shortly", 1)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release()
+
+
+def create_backend(url: Optional[str] = RATE_LIMIT_URL):
+    if not url:
+        return MemoryRateLimitBackend()
+    try:
+        import redis.asyncio as redis
+    except ImportError:
+        raise RuntimeError("RATE_LIMIT_URL requires the 'redis' package") from None
+    return RedisRateLimitBackend(redis.from_url(url))
+
+
+rate_limits = create_backend()
@@ -1,11 +1,27 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import NamedTuple, Optional
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
+from sqlalchemy import select
+from . import models
+from .database import get_db
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost factor; hashes made with another cost are upgraded on next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt releases the GIL, so hashing threads run in parallel with the event loop
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Hash operations allowed to wait for a worker before new ones are turned away
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "32"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 
 def verify_password(plain_password, hashed_password):
@@ -16,28 +32,161 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
+class PasswordHasher:
+    """Runs bcrypt in a bounded thread pool instead of on the event loop.
+
+    At most ``workers + max_queue`` operations are admitted at once; beyond
+    that callers get a 503 with ``Retry-After`` rather than an ever-growing
+    queue.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_QUEUE):
+        self.max_pending = workers + max_queue
+        self.pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent password operations",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+
+password_hasher = PasswordHasher()
+
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.run(pwd_context.hash, password)
+
+
+async def verify_and_update_password(plain_password: str, hashed_password: str):
+    """Return ``(valid, new_hash)``; ``new_hash`` is set when the cost changed."""
+    return await password_hasher.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
 SECRET_KEY = "your-secret-key-here"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Verified tokens remembered per worker
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=15)) 
-    to_encode.update({"exp": expire})
+    now = datetime.now(timezone.utc)
+    expire = now + (expires_delta or timedelta(minutes=15)) 
+    to_encode.update({"exp": expire, "iat": now})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def verify_token(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
+class Principal(NamedTuple):
+    """The authenticated user behind a bearer token."""
+    user_id: int
+    username: str
+    role: str
+
+
+class TokenCache:
+    """Bounded LRU of verified tokens, keyed by SHA-256 digest of the token.
+
+    A hit skips JWT decoding, signature verification and the user lookup.
+    Entries expire with the token's ``exp``. Revocations are kept apart from
+    the LRU so evicting an entry can never resurrect a revoked token.
+    """
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._revoked_tokens = {}
+        self._revoked_users = {}
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Principal]:
+        key = self.digest(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, principal = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return principal
+
+    def put(self, token: str, principal: Principal, expires_at: float):
+        self._entries[self.digest(token)] = (expires_at, principal)
+        self._entries.move_to_end(self.digest(token))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def is_revoked(self, token: str, payload: dict) -> bool:
+        revoked_at = self._revoked_users.get(payload.get("sub"))
+        if revoked_at is not None and payload.get("iat", 0) <= revoked_at:
+            return True
+        return self.digest(token) in self._revoked_tokens
+
+    def revoke_token(self, token: str, expires_at: float):
+        """Reject ``token`` from now on, e.g. on logout."""
+        now = time.time()
+        self._revoked_tokens = {key: exp for key, exp in self._revoked_tokens.items() if exp > now}
+        self._revoked_tokens[self.digest(token)] = expires_at
+        self._entries.pop(self.digest(token), None)
+
+    def revoke_user(self, username: str):
+        """Reject every token issued to ``username`` so far, e.g. after a password or role change."""
+        self._revoked_users[username] = int(time.time())
+        for key, (_, principal) in list(self._entries.items()):
+            if principal.username == username:
+                del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+
+token_cache = TokenCache()
+
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid authentication credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def decode_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
-        raise credentials_exception
+        raise credentials_exception()
+    if token_cache.is_revoked(token, payload):
+        raise credentials_exception()
+    return payload
+
+
+async def verify_token(token: str = Depends(oauth2_scheme), db=Depends(get_db)) -> Principal:
+    principal = token_cache.get(token)
+    if principal is not None:
+        return principal
+
+    payload = decode_token(token)
+    user = await db.scalar(select(models.User).where(models.User.username == payload.get("sub")))
+    if user is None:
+        raise credentials_exception()
+    principal = Principal(user.id, user.username, user.role)
+    token_cache.put(token, principal, payload["exp"])
+    return principal
+
+
+def revoke_token(token: str):
+    token_cache.revoke_token(token, decode_token(token)["exp"])
@@ -0,0 +1,152 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import Request, Response
+
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "30"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class MemoryCacheBackend:
+    """In-process TTL + LRU store speaking the subset of the Redis API we use.
+
+    ``get``/``set(ex=..., nx=...)``/``incr``/``delete`` mirror
+    ``redis.asyncio.Redis``, so a Redis client (or anything imitating one)
+    can be dropped in as the backend.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # Counters are tiny and must survive eviction, so they live apart
+        self._counters = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        if key in self._counters:
+            return str(self._counters[key]).encode()
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ex: Optional[int] = None, nx: bool = False):
+        if nx and await self.get(key) is not None:
+            return None
+        self._discard(key)
+        if len(value) > self.max_bytes:
+            return None
+        expires_at = time.monotonic() + ex if ex else None
+        self._entries[key] = (expires_at, value)
+        self._bytes += len(value)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._discard(next(iter(self._entries)))
+        return True
+
+    async def delete(self, key: str) -> int:
+        found = key in self._entries
+        self._discard(key)
+        return int(found)
+
+    async def incr(self, key: str) -> int:
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CachedResponse:
+    def __init__(self, etag: str, body: bytes, next_cursor: Optional[str] = None):
+        self.etag = etag
+        self.body = body
+        self.next_cursor = next_cursor
+
+    def dumps(self) -> bytes:
+        return b"\n".join([self.etag.encode(), (self.next_cursor or "").encode(), self.body])
+
+    @classmethod
+    def loads(cls, value: bytes) -> "CachedResponse":
+        etag, next_cursor, body = value.split(b"\n", 2)
+        return cls(etag.decode(), body, next_cursor.decode() or None)
+
+    def to_response(self, request: Request) -> Response:
+        headers = {"ETag": self.etag}
+        if self.next_cursor is not None:
+            headers["X-Next-Cursor"] = self.next_cursor
+        if self.etag in _if_none_match(request):
+            return Response(status_code=304, headers=headers)
+        return Response(self.body, media_type="application/json", headers=headers)
+
+
+def _if_none_match(request: Request) -> set:
+    header = request.headers.get("if-none-match", "")
+    return {tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()}
+
+
+class ResponseCache:
+    """Read-through cache of serialized list responses.
+
+    Keys are grouped in namespaces (``events``, ``attendees:<event_id>``) that
+    carry a generation counter; bumping it with ``invalidate`` orphans every
+    key of the old generation at once, whatever filters they were built for.
+    """
+
+    def __init__(self, backend, ttl: int = RESPONSE_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+
+    async def _generation(self, namespace: str) -> str:
+        value = await self.backend.get(f"gen:{namespace}")
+        return value.decode() if isinstance(value, bytes) else str(value or 0)
+
+    async def key(self, namespace: str, route: str, params: dict) -> str:
+        normalized = "&".join(
+            f"{name}={params[name]}" for name in sorted(params) if params[name] is not None)
+        return f"{namespace}:{await self._generation(namespace)}:{route}?{normalized}"
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        if self.ttl <= 0:
+            return None
+        value = await self.backend.get(key)
+        return CachedResponse.loads(value) if value is not None else None
+
+    async def put(self, key: str, body: bytes, next_cursor: Optional[str] = None) -> CachedResponse:
+        entry = CachedResponse(f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+                               body, next_cursor)
+        if self.ttl > 0:
+            await self.backend.set(key, entry.dumps(), ex=self.ttl)
+        return entry
+
+    async def invalidate(self, namespace: str):
+        await self.backend.incr(f"gen:{namespace}")
+
+
+def create_backend(url: Optional[str] = RESPONSE_CACHE_URL):
+    if not url:
+        return MemoryCacheBackend()
+    try:
+        import redis.asyncio as redis
+    except ImportError:
+        raise RuntimeError("RESPONSE_CACHE_URL requires the 'redis' package") from None
+    return redis.from_url(url)
+
+
+response_cache = ResponseCache(create_backend())
@@ -0,0 +1,89 @@
+"""Group commit for single-attendee check-ins at the door.
+
+With dozens of scanners at one entrance, a transaction per scan means every
+check-in waits for its own commit and fsync behind everyone else's. The
+batcher instead collects concurrent check-ins for up to
+``CHECKIN_BATCH_WAIT_MS``, or until ``CHECKIN_BATCH_SIZE`` are waiting, and
+writes them with ``crud.checkin_batch`` in one transaction. Each caller gets
+its own outcome, and only once the transaction holding its check-in has
+committed, so a successful response is exactly as durable as before. The
+queries of that transaction count towards every request it carried.
+"""
+import asyncio
+import contextvars
+import os
+from collections import deque
+
+from fastapi import HTTPException
+
+from . import crud, querystats
+from .database import open_session
+
+# Check-ins written per transaction; 1 gives every check-in its own transaction again
+CHECKIN_BATCH_SIZE = int(os.getenv("CHECKIN_BATCH_SIZE", "100"))
+# How long the writer lingers for more check-ins before committing a batch
+CHECKIN_BATCH_WAIT_MS = float(os.getenv("CHECKIN_BATCH_WAIT_MS", "2"))
+
+
+class CheckinBatcher:
+    def __init__(self, session_factory=open_session, batch_size: int = CHECKIN_BATCH_SIZE,
+                 batch_wait: float = CHECKIN_BATCH_WAIT_MS / 1000):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self._pending = deque()
+        self._writer = None
+        self.batches = 0
+
+    async def submit(self, event_id: int, attendee_id: int, check_in_status: bool = True):
+        """Queue one check-in and wait until it is committed."""
+        done = asyncio.get_running_loop().create_future()
+        self._pending.append(((event_id, attendee_id, check_in_status), done, querystats.current()))
+        if self._writer is None:
+            # Outlives the request that starts it, so it gets none of its context
+            self._writer = asyncio.create_task(self._write(), context=contextvars.Context())
+        outcome = await done
+        if isinstance(outcome, HTTPException):
+            raise outcome
+        return outcome
+
+    async def _write(self):
+        pending = self._pending
+        try:
+            while pending:
+                if len(pending) < self.batch_size and self.batch_wait > 0:
+                    await asyncio.sleep(self.batch_wait)
+                batch = [pending.popleft() for _ in range(min(self.batch_size, len(pending)))]
+                db = self.session_factory()
+                with querystats.collect() as used:
+                    try:
+                        outcomes = await crud.checkin_batch(db, [checkin for checkin, _, _ in batch])
+                    except Exception as e:
+                        # Nothing in the batch was committed; every caller sees the failure
+                        outcomes = [e] * len(batch)
+                    finally:
+                        await db.close()
+                self.batches += 1
+                for (_, done, stats), outcome in zip(batch, outcomes):
+                    if stats is not None:
+                        stats.add(used)
+                    if not done.done():
+                        if isinstance(outcome, Exception) and not isinstance(outcome, HTTPException):
+                            done.set_exception(outcome)
+                        else:
+                            done.set_result(outcome)
+        finally:
+            self._writer = None
+
+
+async def checkin(db, event_id: int, attendee_id: int, check_in_status: bool = True):
+    """Check an attendee in or out, through the batcher unless batching is off."""
+    if batcher.batch_size <= 1:
+        return await crud.checkin_attendee(db, event_id, attendee_id, check_in_status)
+    # The token lookup may have checked out a connection for this request;
+    # the writer needs one of its own, so give it back before waiting
+    await db.close()
+    return await batcher.submit(event_id, attendee_id, check_in_status)
+
+
+batcher = CheckinBatcher()
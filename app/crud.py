@@ -1,15 +1,16 @@
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
-from datetime import datetime
-from typing import List
-from . import models, schemas
-from .auth import get_password_hash
+from pydantic import ValidationError
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from collections import Counter
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Iterable, List, Optional, Tuple
+from . import feed, metrics, models, schemas
+from .auth import hash_password
 import pytz
-from datetime import datetime
-import pytz
-from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from fastapi import HTTPException
 
 # Helper function to convert naive datetime to aware datetime
 def make_aware(dt: datetime, timezone=pytz.UTC):
@@ -18,45 +19,76 @@ def make_aware(dt: datetime, timezone=pytz.UTC):
     return dt
 
 
-def get_user_by_username(db: Session, username: str):
-    return db.query(models.User).filter(models.User.username == username).first()
+async def get_user_by_username(db: AsyncSession, username: str):
+    return await db.scalar(select(models.User).where(models.User.username == username))
 
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = get_password_hash(user.password)
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    hashed_password = await hash_password(user.password)
     db_user = models.User(username=user.username,
                           hashed_password=hashed_password, role="user")
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
-def update_event_status(db: Session, event_id: int):
-    # Fetch the event by event_id
-    event = db.query(models.Event).filter(models.Event.event_id == event_id).first()
+async def update_event(db: AsyncSession, event_id: int, changes: dict):
+    """Apply ``changes`` to an event, completing it if it has already ended.
+
+    Loads the event once and commits once.
+    """
+    event = await get_event(db, event_id)
 
     if event is None:
         raise HTTPException(status_code=404, detail="Event not found")  # Handle missing event
 
+    for key, value in changes.items():
+        setattr(event, key, value)
+
     if event.end_time is None:
         raise HTTPException(status_code=500, detail="Event does not have an 'end_time' set")
 
-    current_time = datetime.now(pytz.UTC)
-    
     # Ensure `event.end_time` is timezone-aware before comparison
-    event_end_time = event.end_time
-    if not event_end_time.tzinfo:  # Convert to aware if naive
-        event_end_time = make_aware(event_end_time)
-
-    if event_end_time < current_time and event.status != models.EventStatus.COMPLETED:
+    if make_aware(event.end_time) < datetime.now(pytz.UTC) and event.status != models.EventStatus.COMPLETED:
         event.status = models.EventStatus.COMPLETED
-        db.commit()
-        db.refresh(event)  # Ensure changes are reflected
 
+    promoted = []
+    if event.waitlist and {"max_attendees", "waitlist"} & changes.keys():
+        await db.flush()
+        promoted = await _promote_waitlist(db, event_id)
+    await db.commit()
+    await _announce_promotions(event_id, promoted)
     return event
 
-def create_event(db: Session, event: schemas.EventCreate):
+
+async def apply_status_transitions(db: AsyncSession, now: datetime,
+                                   event_ids: Optional[List[int]] = None) -> int:
+    """Move due events to ``ongoing``/``completed`` with set-based UPDATEs.
+
+    Limited to ``event_ids`` when given. Returns the number of events moved.
+    """
+    Event = models.Event
+    completed = update(Event).where(
+        Event.end_time <= now,
+        Event.status.in_([models.EventStatus.SCHEDULED, models.EventStatus.ONGOING]),
+    ).values(status=models.EventStatus.COMPLETED)
+    ongoing = update(Event).where(
+        Event.start_time <= now, Event.end_time > now,
+        Event.status == models.EventStatus.SCHEDULED,
+    ).values(status=models.EventStatus.ONGOING)
+
+    moved = 0
+    for statement in (completed, ongoing):
+        if event_ids is not None:
+            statement = statement.where(Event.event_id.in_(event_ids))
+        result = await db.execute(statement.execution_options(synchronize_session=False))
+        moved += result.rowcount
+    await db.commit()
+    return moved
+
+
+async def create_event(db: AsyncSession, event: schemas.EventCreate):
     db_event = models.Event(**event.model_dump())
     event_end_time = make_aware(db_event.end_time)
     if event_end_time < datetime.now(pytz.UTC):
@@ -66,26 +98,45 @@ def create_event(db: Session, event: schemas.EventCreate):
         )
 
     db.add(db_event)
-    db.commit()
-    db.refresh(db_event)
+    await db.commit()
     return db_event
 
 
-def get_event(db: Session, event_id: int):
-    return db.query(models.Event).filter(models.Event.event_id == event_id).first()
+async def get_event(db: AsyncSession, event_id: int):
+    return await db.scalar(select(models.Event).where(models.Event.event_id == event_id))
 
-def register_attendee(db: Session, event_id: int, attendee_data: schemas.AttendeeCreate):
-    event = db.query(models.Event).filter(models.Event.event_id == event_id).first()
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
 
-    if len(event.attendees) >= event.max_attendees:
-        raise HTTPException(status_code=400, detail="Max attendees limit reached")
+async def register_attendee(db: AsyncSession, event_id: int, attendee_data: schemas.AttendeeCreate):
+    """Register one attendee, or put them on the waitlist of a full event that keeps one.
 
-    # Check if the attendee already exists
-    existing_attendee = db.query(models.Attendee).filter_by(email=attendee_data.email, event_id=event_id).first()
-    if existing_attendee:
-        raise HTTPException(status_code=400, detail="Attendee with this email is already registered for this event")
+    Returns None for events with ``registration_queue`` set, which take
+    their registrations through ``app.registration`` instead.
+    """
+    # Claim a seat with a conditional increment so the capacity check and
+    # the reservation happen in one statement, without loading attendees
+    claimed = (await db.execute(
+        update(models.Event)
+        .where(models.Event.event_id == event_id,
+               models.Event.attendee_count < models.Event.max_attendees,
+               models.Event.registration_queue.is_(False))
+        .values(attendee_count=models.Event.attendee_count + 1)
+        .execution_options(synchronize_session=False)
+    )).rowcount
+    if not claimed:
+        await db.rollback()
+        event = await get_event(db, event_id)
+        if event is None:
+            raise HTTPException(status_code=404, detail="Event not found")
+        if event.registration_queue:
+            # The caller hands these to app.registration's queue instead
+            return None
+        if event.waitlist:
+            outcome, = await register_batch(db, event_id, [attendee_data], source="single")
+            if isinstance(outcome, HTTPException):
+                raise outcome
+            return outcome
+        metrics.REGISTRATION_REJECTIONS.inc("full")
+        raise HTTPException(status_code=400, detail="Max attendees limit reached")
 
     new_attendee = models.Attendee(
         first_name=attendee_data.first_name,
@@ -98,46 +149,667 @@ def register_attendee(db: Session, event_id: int, attendee_data: schemas.Attende
 
     try:
         db.add(new_attendee)
-        db.commit()
-        db.refresh(new_attendee)
+        await db.commit()
     except IntegrityError:
-        db.rollback()
-        raise HTTPException(status_code=400, detail="Database Integrity Error: Possible duplicate entry")
+        # uq_attendees_event_id_email; the rollback also returns the seat
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Attendee with this email is already registered for this event")
+    metrics.REGISTRATIONS.inc("single")
+    await feed.broker.publish(event_id, "registered", source="single",
+                              attendee_ids=[new_attendee.attendee_id])
     return new_attendee
 
-def get_attendee_count(db: Session, event_id: int) -> int:
-    return db.query(models.Attendee).filter(models.Attendee.event_id == event_id).count()
+DUPLICATE_REGISTRATION = "Attendee with this email is already registered for this event"
+
+
+async def register_batch(db: AsyncSession, event_id: int, attendees: List[schemas.AttendeeCreate],
+                         source: str = "queue") -> list:
+    """Register ``attendees`` in arrival order in one transaction.
+
+    Seats are claimed once for the whole batch and the admitted attendees
+    inserted with one multi-row INSERT; when the event keeps a waitlist, the
+    overflow joins it the same way. Each attendee gets its own outcome, in
+    order: the registered attendee as a dict, a ``schemas.WaitlistPosition``,
+    or the ``HTTPException`` a single registration would have raised.
+    """
+    Event, Attendee, Entry = models.Event, models.Attendee, models.WaitlistEntry
+    event = (await db.execute(
+        select(Event.event_id, Event.waitlist).where(Event.event_id == event_id))).first()
+    if event is None:
+        return [HTTPException(status_code=404, detail="Event not found") for _ in attendees]
+
+    emails = [attendee.email for attendee in attendees]
+    registered = set((await db.scalars(
+        select(Attendee.email).where(Attendee.event_id == event_id, Attendee.email.in_(emails)))).all())
+    waiting = set((await db.scalars(
+        select(Entry.email).where(Entry.event_id == event_id, Entry.email.in_(emails))
+    )).all()) if event.waitlist else set()
+
+    outcomes = [None] * len(attendees)
+    accepted = []
+    seen = set()
+    for i, attendee in enumerate(attendees):
+        if attendee.email in registered or attendee.email in seen:
+            outcomes[i] = HTTPException(status_code=400, detail=DUPLICATE_REGISTRATION)
+        elif attendee.email in waiting:
+            outcomes[i] = HTTPException(
+                status_code=400, detail="Attendee with this email is already on the waitlist for this event")
+        else:
+            seen.add(attendee.email)
+            accepted.append(i)
+
+    def row(attendee, **extra):
+        return {"first_name": attendee.first_name, "last_name": attendee.last_name,
+                "email": attendee.email, "phone_number": attendee.phone_number,
+                "event_id": event_id, **extra}
+
+    try:
+        seats = await _claim_seats(db, event_id, len(accepted))
+        admitted, overflow = accepted[:seats], accepted[seats:]
+        if admitted:
+            ids = dict((await db.execute(
+                insert(Attendee).returning(Attendee.email, Attendee.attendee_id),
+                [row(attendees[i], check_in_status=False) for i in admitted])).all())
+            for i in admitted:
+                outcomes[i] = {"attendee_id": ids[attendees[i].email], "event_id": event_id,
+                               "check_in_status": False}
+        if overflow and event.waitlist:
+            ahead = await db.scalar(
+                select(func.count()).select_from(Entry).where(Entry.event_id == event_id))
+            now = datetime.now(timezone.utc)
+            entry_ids = dict((await db.execute(
+                insert(Entry).returning(Entry.email, Entry.entry_id),
+                [row(attendees[i], created_at=now) for i in overflow])).all())
+            for position, i in enumerate(overflow, start=ahead + 1):
+                outcomes[i] = schemas.WaitlistPosition(
+                    event_id=event_id, entry_id=entry_ids[attendees[i].email],
+                    email=attendees[i].email, position=position)
+        else:
+            for i in overflow:
+                outcomes[i] = HTTPException(status_code=400, detail="Max attendees limit reached")
+        await db.commit()
+    except IntegrityError:
+        # A registration outside this batch took one of the emails meanwhile;
+        # one at a time, only the clashing attendee fails
+        await db.rollback()
+        if len(attendees) == 1:
+            return [HTTPException(status_code=400, detail=DUPLICATE_REGISTRATION)]
+        return [outcome for attendee in attendees
+                for outcome in await register_batch(db, event_id, [attendee], source)]
+    except Exception:
+        await db.rollback()
+        raise
+
+    metrics.REGISTRATIONS.inc(source, amount=len(admitted))
+    if event.waitlist:
+        metrics.WAITLIST.inc("added", amount=len(overflow))
+    else:
+        metrics.REGISTRATION_REJECTIONS.inc("full", amount=len(overflow))
+    if admitted:
+        await feed.broker.publish(event_id, "registered", source=source,
+                                  attendee_ids=[outcomes[i]["attendee_id"] for i in admitted])
+    return outcomes
+
+
+async def _promote_waitlist(db: AsyncSession, event_id: int) -> List[int]:
+    """Fill free seats from the waitlist, oldest entry first, inside the caller's transaction.
+
+    Returns the new attendee ids.
+    """
+    Event, Attendee, Entry = models.Event, models.Attendee, models.WaitlistEntry
+    free = await db.scalar(
+        select(Event.max_attendees - Event.attendee_count).where(Event.event_id == event_id))
+    if not free or free <= 0:
+        return []
+    entries = (await db.execute(
+        select(Entry.entry_id, Entry.first_name, Entry.last_name, Entry.email, Entry.phone_number)
+        .where(Entry.event_id == event_id).order_by(Entry.entry_id).limit(free))).all()
+    if not entries:
+        return []
+    # Someone who registered directly in the meantime keeps their seat
+    ids = (await db.scalars(
+        UPSERTS[db.bind.dialect.name](Attendee)
+        .on_conflict_do_nothing(index_elements=["event_id", "email"])
+        .returning(Attendee.attendee_id),
+        [{"first_name": entry.first_name, "last_name": entry.last_name, "email": entry.email,
+          "phone_number": entry.phone_number, "event_id": event_id, "check_in_status": False}
+         for entry in entries])).all()
+    await db.execute(delete(Entry).where(Entry.entry_id.in_([entry.entry_id for entry in entries])))
+    if ids:
+        await db.execute(
+            update(Event).where(Event.event_id == event_id)
+            .values(attendee_count=Event.attendee_count + len(ids))
+            .execution_options(synchronize_session=False))
+    return ids
+
+
+async def _announce_promotions(event_id: int, promoted: List[int]):
+    if promoted:
+        metrics.WAITLIST.inc("promoted", amount=len(promoted))
+        await feed.broker.publish(event_id, "registered", source="waitlist", attendee_ids=promoted)
+
+
+async def cancel_registration(db: AsyncSession, event_id: int, attendee_id: int) -> List[int]:
+    """Remove an attendee and give their seat to the waitlist, in one transaction.
+
+    Returns the ids of attendees promoted from the waitlist.
+    """
+    Event, Attendee = models.Event, models.Attendee
+    checked_in = (await db.execute(
+        delete(Attendee)
+        .where(Attendee.event_id == event_id, Attendee.attendee_id == attendee_id)
+        .returning(Attendee.check_in_status)
+        .execution_options(synchronize_session=False))).first()
+    if checked_in is None:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Attendee not found")
+    await db.execute(
+        update(Event).where(Event.event_id == event_id)
+        .values(attendee_count=Event.attendee_count - 1,
+                checked_in_count=Event.checked_in_count - (1 if checked_in[0] else 0))
+        .execution_options(synchronize_session=False))
+    promoted = await _promote_waitlist(db, event_id)
+    await db.commit()
+    await feed.broker.publish(event_id, "cancelled", source="single", attendee_ids=[attendee_id])
+    await _announce_promotions(event_id, promoted)
+    return promoted
+
+
+async def get_attendee_count(db: AsyncSession, event_id: int) -> int:
+    return await db.scalar(
+        select(func.count()).select_from(models.Attendee).where(models.Attendee.event_id == event_id))
+
+
+async def recount_attendees(db: AsyncSession) -> int:
+    """Rebuild ``Event.attendee_count`` from the attendees table.
+
+    Returns the number of events whose stored count was wrong.
+    """
+    actual = (
+        select(func.count(models.Attendee.attendee_id))
+        .where(models.Attendee.event_id == models.Event.event_id)
+        .scalar_subquery()
+    )
+    fixed = (await db.execute(
+        update(models.Event)
+        .where(models.Event.attendee_count != actual)
+        .values(attendee_count=actual)
+        .execution_options(synchronize_session=False)
+    )).rowcount
+    await db.commit()
+    return fixed
+
+
+UPSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def _minute(moment: datetime) -> datetime:
+    # Buckets are keyed by naive UTC minutes, like the other stored datetimes
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.replace(second=0, microsecond=0)
+
+
+async def _count_checkins(db: AsyncSession, event_id: int, delta: int, now: datetime):
+    """Apply ``delta`` check-ins to the event's aggregates in the current transaction.
+
+    Only check-ins (positive deltas) land in the per-minute buckets;
+    undoing one lowers the running total but not the time series.
+    """
+    if not delta:
+        return
+    await db.execute(
+        update(models.Event)
+        .where(models.Event.event_id == event_id)
+        .values(checked_in_count=models.Event.checked_in_count + delta)
+        .execution_options(synchronize_session=False)
+    )
+    if delta > 0:
+        upsert = UPSERTS[db.bind.dialect.name](models.CheckinBucket).values(
+            event_id=event_id, minute=_minute(now), count=delta)
+        await db.execute(upsert.on_conflict_do_update(
+            index_elements=["event_id", "minute"],
+            set_={"count": models.CheckinBucket.count + upsert.excluded.count}))
+
+
+async def checkin_attendee(db: AsyncSession, event_id: int, attendee_id: int,
+                           check_in_status: bool = True):
+    attendee = await db.scalar(select(models.Attendee).where(
+        models.Attendee.event_id == event_id,
+        models.Attendee.attendee_id == attendee_id
+    ))
+    if not attendee:
+        raise HTTPException(status_code=404, detail="Attendee not found")
+    if bool(attendee.check_in_status) == check_in_status:
+        return attendee
+
+    now = datetime.now(timezone.utc)
+    # Conditional on the old status so concurrent requests change it once
+    changed = (await db.execute(
+        update(models.Attendee)
+        .where(models.Attendee.attendee_id == attendee_id,
+               models.Attendee.check_in_status.is_not(check_in_status))
+        .values(check_in_status=check_in_status, checked_in_at=now if check_in_status else None)
+    )).rowcount
+    if changed:
+        await _count_checkins(db, event_id, 1 if check_in_status else -1, now)
+    await db.commit()
+    if changed:
+        if check_in_status:
+            metrics.CHECKINS.inc("single")
+        await feed.broker.publish(event_id, "checked_in" if check_in_status else "checked_out",
+                                  source="single", attendee_ids=[attendee_id])
+    return attendee
+
+
+async def checkin_batch(db: AsyncSession, checkins: List[Tuple[int, int, bool]]) -> list:
+    """Apply single check-ins and check-outs, in order, in one transaction.
 
-def bulk_checkin(db: Session, event_id: int, csv_data: List[dict]):
-    event = db.query(models.Event).filter(
-        models.Event.event_id == event_id).first()
+    ``checkins`` holds ``(event_id, attendee_id, check_in_status)`` triples,
+    as sent to ``checkin_attendee``. All attendees are read with one SELECT
+    and changed with at most one UPDATE per direction. Each triple gets its
+    own outcome, in order: the attendee as a dict, or the ``HTTPException``
+    ``checkin_attendee`` would have raised.
+    """
+    Attendee = models.Attendee
+    rows = {row.attendee_id: row for row in (await db.execute(
+        select(Attendee.attendee_id, Attendee.event_id, Attendee.first_name, Attendee.last_name,
+               Attendee.email, Attendee.phone_number, Attendee.check_in_status)
+        .where(Attendee.attendee_id.in_({attendee_id for _, attendee_id, _ in checkins}))
+    )).all()}
+
+    # Later requests for the same attendee see the state earlier ones left behind
+    state = {}
+    outcomes = []
+    for event_id, attendee_id, check_in_status in checkins:
+        row = rows.get(attendee_id)
+        if row is None or row.event_id != event_id:
+            outcomes.append(HTTPException(status_code=404, detail="Attendee not found"))
+            continue
+        state[attendee_id] = check_in_status
+        outcomes.append({**row._asdict(), "check_in_status": check_in_status})
+
+    now = datetime.now(timezone.utc)
+    changed = {True: [], False: []}
+    try:
+        for check_in_status in changed:
+            ids = [attendee_id for attendee_id, final in state.items()
+                   if final == check_in_status and bool(rows[attendee_id].check_in_status) != final]
+            if ids:
+                # Conditional on the old status so concurrent requests change it once
+                changed[check_in_status] = (await db.execute(
+                    update(Attendee)
+                    .where(Attendee.attendee_id.in_(ids), Attendee.check_in_status.is_not(check_in_status))
+                    .values(check_in_status=check_in_status,
+                            checked_in_at=now if check_in_status else None)
+                    .returning(Attendee.event_id, Attendee.attendee_id)
+                    .execution_options(synchronize_session=False)
+                )).all()
+        for check_in_status, sign in ((True, 1), (False, -1)):
+            for event_id, count in Counter(e for e, _ in changed[check_in_status]).items():
+                await _count_checkins(db, event_id, sign * count, now)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    metrics.CHECKINS.inc("single", amount=len(changed[True]))
+    for check_in_status, message in ((True, "checked_in"), (False, "checked_out")):
+        by_event = {}
+        for event_id, attendee_id in changed[check_in_status]:
+            by_event.setdefault(event_id, []).append(attendee_id)
+        for event_id, attendee_ids in by_event.items():
+            await feed.broker.publish(event_id, message, source="single", attendee_ids=attendee_ids)
+    return outcomes
+
+
+def _event_stats(row) -> dict:
+    return {
+        "event_id": row.event_id,
+        "registered": row.attendee_count,
+        "checked_in": row.checked_in_count,
+        "capacity": row.max_attendees,
+        "remaining": max((row.max_attendees or 0) - row.attendee_count, 0),
+        "check_in_rate": row.checked_in_count / row.attendee_count if row.attendee_count else 0.0,
+    }
+
+
+async def get_event_stats(db: AsyncSession, event_ids: Iterable[int]) -> List[dict]:
+    """Registration and check-in totals for ``event_ids``, read from the event rows."""
+    Event = models.Event
+    rows = (await db.execute(
+        select(Event.event_id, Event.attendee_count, Event.checked_in_count, Event.max_attendees)
+        .where(Event.event_id.in_(set(event_ids)))
+        .order_by(Event.event_id)
+    )).all()
+    return [_event_stats(row) for row in rows]
+
+
+async def get_checkin_series(db: AsyncSession, event_id: int, since: datetime, until: datetime):
+    Bucket = models.CheckinBucket
+    return (await db.execute(
+        select(Bucket.minute, Bucket.count)
+        .where(Bucket.event_id == event_id, Bucket.minute >= _minute(since),
+               Bucket.minute <= _minute(until))
+        .order_by(Bucket.minute)
+    )).all()
+
+
+# Buckets written per INSERT when rebuilding
+REBUILD_CHUNK_SIZE = 1000
+
+
+async def rebuild_event_stats(db: AsyncSession) -> dict:
+    """Recompute every check-in aggregate from the attendees table.
+
+    The rebuilt time series only holds attendees that are still checked in,
+    since undone check-ins leave no timestamp behind.
+    """
+    Attendee = models.Attendee
+    checked_in = (
+        select(func.count(Attendee.attendee_id))
+        .where(Attendee.event_id == models.Event.event_id, Attendee.check_in_status.is_(True))
+        .scalar_subquery()
+    )
+    fixed = (await db.execute(
+        update(models.Event)
+        .where(models.Event.checked_in_count != checked_in)
+        .values(checked_in_count=checked_in)
+        .execution_options(synchronize_session=False)
+    )).rowcount
+
+    buckets = Counter()
+    result = await db.stream(
+        select(Attendee.event_id, Attendee.checked_in_at)
+        .where(Attendee.check_in_status.is_(True), Attendee.checked_in_at.is_not(None))
+        .execution_options(yield_per=REBUILD_CHUNK_SIZE))
+    async for event_id, checked_in_at in result:
+        buckets[event_id, _minute(checked_in_at)] += 1
+
+    await db.execute(delete(models.CheckinBucket))
+    rows = iter(buckets.items())
+    while chunk := list(islice(rows, REBUILD_CHUNK_SIZE)):
+        await db.execute(insert(models.CheckinBucket), [
+            {"event_id": event_id, "minute": minute, "count": count}
+            for (event_id, minute), count in chunk])
+    await db.commit()
+    return {"checked_in_count": fixed, "buckets": len(buckets)}
+
+
+# Rows resolved per UPDATE; keeps the IN (...) lists well under SQLite's
+# bound-parameter limit while still amortising the round-trips.
+BULK_CHECKIN_CHUNK_SIZE = 500
+
+
+def _parse_checkin_row(row: dict):
+    # A row is keyed by attendee_id when present, otherwise by email
+    attendee_id = (row.get("attendee_id") or "").strip()
+    if attendee_id:
+        try:
+            return "attendee_id", int(attendee_id)
+        except ValueError:
+            return None
+    email = (row.get("email") or "").strip()
+    if email:
+        return "email", email
+    return None
+
+
+async def _checkin_chunk(db: AsyncSession, event_id: int, chunk: List[tuple], results: dict,
+                         now: datetime, checked_in: List[List[int]]):
+    ids = {key for kind, key in chunk if kind == "attendee_id"}
+    emails = {key for kind, key in chunk if kind == "email"}
+
+    conditions = []
+    if ids:
+        conditions.append(models.Attendee.attendee_id.in_(ids))
+    if emails:
+        conditions.append(models.Attendee.email.in_(emails))
+
+    rows = (await db.execute(
+        select(models.Attendee.attendee_id, models.Attendee.email,
+               models.Attendee.check_in_status)
+        .where(models.Attendee.event_id == event_id, or_(*conditions))
+    )).all()
+    by_id = {row.attendee_id: row for row in rows}
+    by_email = {row.email: row for row in rows}
+
+    to_update = set()
+    for kind, key in chunk:
+        row = by_id.get(key) if kind == "attendee_id" else by_email.get(key)
+        if row is None:
+            results["not_found"].append(str(key))
+        elif row.check_in_status or row.attendee_id in to_update:
+            results["already_checked_in"] += 1
+        else:
+            to_update.add(row.attendee_id)
+
+    if to_update:
+        # Re-checked in the UPDATE so a concurrent check-in is not counted twice
+        updated = (await db.scalars(
+            update(models.Attendee)
+            .where(models.Attendee.event_id == event_id,
+                   models.Attendee.attendee_id.in_(to_update),
+                   models.Attendee.check_in_status.is_not(True))
+            .values(check_in_status=True, checked_in_at=now)
+            .returning(models.Attendee.attendee_id)
+            .execution_options(synchronize_session=False)
+        )).all()
+        results["updated"] += len(updated)
+        if updated:
+            checked_in.append(updated)
+
+
+async def bulk_checkin(db: AsyncSession, event_id: int, csv_data: Iterable[dict],
+                       chunk_size: int = BULK_CHECKIN_CHUNK_SIZE):
+    """Check in every attendee referenced by ``csv_data`` in one transaction.
+
+    Rows may be keyed by ``attendee_id`` or ``email`` and are consumed
+    lazily, ``chunk_size`` at a time, so the upload never has to be held in
+    memory. Each chunk costs one SELECT and at most one UPDATE.
+    """
+    event = await db.scalar(
+        select(models.Event.event_id).where(models.Event.event_id == event_id))
     if not event:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Event not found"
         )
 
-    results = {"success": 0, "failed": 0, "errors": []}
+    results = {"updated": 0, "already_checked_in": 0,
+               "not_found": [], "malformed": []}
+    now = datetime.now(timezone.utc)
+    # Attendee ids checked in by each chunk, announced once committed
+    checked_in = []
 
-    for row in csv_data:
-        try:
-            attendee = db.query(models.Attendee).filter(
-                models.Attendee.event_id == event_id,
-                models.Attendee.email == row.get('email')
-            ).first()
-
-            if attendee:
-                attendee.check_in_status = True
-                results["success"] += 1
+    rows = iter(csv_data)
+    # Line 1 of the upload is the CSV header
+    line_number = 1
+    try:
+        while True:
+            batch = list(islice(rows, chunk_size))
+            if not batch:
+                break
+            chunk = []
+            for row in batch:
+                line_number += 1
+                parsed = _parse_checkin_row(row)
+                if parsed is None:
+                    results["malformed"].append(line_number)
+                else:
+                    chunk.append(parsed)
+            if chunk:
+                await _checkin_chunk(db, event_id, chunk, results, now, checked_in)
+        await _count_checkins(db, event_id, results["updated"], now)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    metrics.CHECKINS.inc("bulk", amount=results["updated"])
+    for outcome in ("updated", "already_checked_in"):
+        metrics.BULK_CHECKIN_ROWS.inc(outcome, amount=results[outcome])
+    for outcome in ("not_found", "malformed"):
+        metrics.BULK_CHECKIN_ROWS.inc(outcome, amount=len(results[outcome]))
+    for attendee_ids in checked_in:
+        await feed.broker.publish(event_id, "checked_in", source="bulk", attendee_ids=attendee_ids)
+    return results
+
+
+# Rows validated, deduplicated and inserted per round-trip
+IMPORT_CHUNK_SIZE = 500
+
+
+async def _claim_seats(db: AsyncSession, event_id: int, wanted: int) -> int:
+    """Reserve up to ``wanted`` seats with one conditional increment.
+
+    Retries only if a concurrent registration took seats between reading
+    the remaining capacity and claiming it.
+    """
+    Event = models.Event
+    while wanted > 0:
+        remaining = await db.scalar(
+            select(Event.max_attendees - Event.attendee_count).where(Event.event_id == event_id))
+        claim = min(wanted, max(remaining or 0, 0))
+        if claim == 0:
+            return 0
+        claimed = (await db.execute(
+            update(Event)
+            .where(Event.event_id == event_id,
+                   Event.attendee_count + claim <= Event.max_attendees)
+            .values(attendee_count=Event.attendee_count + claim)
+            .execution_options(synchronize_session=False)
+        )).rowcount
+        if claimed:
+            return claim
+    return 0
+
+
+async def _import_to_waitlist(db: AsyncSession, event_id: int, overflow: List[tuple], chunk_size: int):
+    """Add the imported rows that found no seat to the event's waitlist, in order."""
+    Entry = models.WaitlistEntry
+    position = await db.scalar(select(func.count()).select_from(Entry).where(Entry.event_id == event_id))
+    now = datetime.now(timezone.utc)
+    rows = iter(overflow)
+    while chunk := list(islice(rows, chunk_size)):
+        entry_ids = dict((await db.execute(
+            insert(Entry).returning(Entry.email, Entry.entry_id),
+            [{"first_name": attendee.first_name, "last_name": attendee.last_name,
+              "email": attendee.email, "phone_number": attendee.phone_number,
+              "event_id": event_id, "created_at": now} for _, attendee in chunk])).all())
+        for outcome, attendee in chunk:
+            position += 1
+            outcome.update(status="waitlisted", entry_id=entry_ids[attendee.email], position=position)
+
+
+async def import_attendees(db: AsyncSession, event_id: int, rows: Iterable[dict],
+                           chunk_size: int = IMPORT_CHUNK_SIZE):
+    """Register a batch of attendees in one transaction.
+
+    Rows are validated lazily against ``schemas.AttendeeCreate``. Emails are
+    deduplicated within the batch and, one chunk at a time, against the event
+    with a single IN lookup. Capacity is claimed once for all accepted rows,
+    which are then inserted in chunked multi-row INSERTs; when the event keeps
+    a waitlist, the rows that found no seat join it, in order, the same way.
+    Returns one outcome per input row, numbered from 1.
+
+    The import is one transaction already, so it does not go through
+    ``app.registration``'s queue even for events that have one.
+    """
+    Entry = models.WaitlistEntry
+    event = (await db.execute(
+        select(models.Event.event_id, models.Event.waitlist).where(models.Event.event_id == event_id))).first()
+    if event is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    outcomes = []
+    accepted = []
+    seen = set()
+    rows = iter(rows)
+    row_number = 0
+    while batch := list(islice(rows, chunk_size)):
+        candidates = []
+        for row in batch:
+            row_number += 1
+            try:
+                attendee = schemas.AttendeeCreate.model_validate(row)
+            except ValidationError as e:
+                error = e.errors()[0]
+                field = ".".join(str(part) for part in error["loc"]) or "row"
+                email = row.get("email") if isinstance(row, dict) else None
+                email = email if isinstance(email, str) else None
+                outcomes.append({"row": row_number, "email": email,
+                                 "status": "invalid", "detail": f"{field}: {error['msg']}"})
+                continue
+            if attendee.email in seen:
+                outcomes.append({"row": row_number, "email": attendee.email, "status": "duplicate",
+                                 "detail": "Email appears earlier in this batch"})
+                continue
+            seen.add(attendee.email)
+            outcome = {"row": row_number, "email": attendee.email, "status": "created"}
+            outcomes.append(outcome)
+            candidates.append((outcome, attendee))
+
+        if not candidates:
+            continue
+        emails = [attendee.email for _, attendee in candidates]
+        registered = set((await db.scalars(
+            select(models.Attendee.email).where(
+                models.Attendee.event_id == event_id, models.Attendee.email.in_(emails))
+        )).all())
+        waiting = set((await db.scalars(
+            select(Entry.email).where(Entry.event_id == event_id, Entry.email.in_(emails))
+        )).all()) if event.waitlist else set()
+        for outcome, attendee in candidates:
+            if attendee.email in registered:
+                outcome.update(status="duplicate", detail=DUPLICATE_REGISTRATION)
+            elif attendee.email in waiting:
+                outcome.update(status="duplicate",
+                               detail="Attendee with this email is already on the waitlist for this event")
             else:
-                results["failed"] += 1
-                results["errors"].append(
-                    f"Attendee not found: {row.get('email')}")
+                accepted.append((outcome, attendee))
 
-        except Exception as e:
-            results["failed"] += 1
-            results["errors"].append(
-                f"Error processing {row.get('email')}: {str(e)}")
+    try:
+        seats = await _claim_seats(db, event_id, len(accepted))
+        if event.waitlist:
+            await _import_to_waitlist(db, event_id, accepted[seats:], chunk_size)
+        else:
+            for outcome, _ in accepted[seats:]:
+                outcome.update(status="full", detail="Max attendees limit reached")
+        admitted = iter(accepted[:seats])
+        while chunk := list(islice(admitted, chunk_size)):
+            # Rows are matched back by email, which is unique within the batch;
+            # asking SQLite for RETURNING in parameter order would make
+            # SQLAlchemy fall back to one INSERT per row
+            ids = dict((await db.execute(
+                insert(models.Attendee).returning(models.Attendee.email, models.Attendee.attendee_id),
+                [{
+                    "first_name": attendee.first_name,
+                    "last_name": attendee.last_name,
+                    "email": attendee.email,
+                    "phone_number": attendee.phone_number,
+                    "event_id": event_id,
+                    "check_in_status": False,
+                } for _, attendee in chunk],
+            )).all())
+            for outcome, attendee in chunk:
+                outcome["attendee_id"] = ids[attendee.email]
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409,
+                            detail="Attendees were registered concurrently, retry the import")
+    except Exception:
+        await db.rollback()
+        raise
 
-    db.commit()
-    return results
+    counts = {"created": 0, "duplicate": 0, "invalid": 0, "full": 0, "waitlisted": 0}
+    for outcome in outcomes:
+        counts[outcome["status"]] += 1
+    metrics.REGISTRATIONS.inc("import", amount=counts["created"])
+    metrics.REGISTRATION_REJECTIONS.inc("full", amount=counts["full"])
+    metrics.WAITLIST.inc("added", amount=counts["waitlisted"])
+    created = [outcome["attendee_id"] for outcome in outcomes if outcome["status"] == "created"]
+    for start in range(0, len(created), chunk_size):
+        await feed.broker.publish(event_id, "registered", source="import",
+                                  attendee_ids=created[start:start + chunk_size])
+    return {**counts, "rows": outcomes}
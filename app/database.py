@@ -1,22 +1,329 @@
-from sqlalchemy import create_engine
+import os
+import time
+
+from sqlalchemy import Boolean, create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.sql.functions import FunctionElement
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./events.db"
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+from . import metrics, querystats
 
-Base = declarative_base()
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./events.db")
+
+# "async" serves requests through SQLAlchemy asyncio (aiosqlite/asyncpg),
+# "sync" runs the same code against a blocking Session for comparison.
+DATABASE_MODE = os.getenv("DATABASE_MODE", "async")
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_url(url: str) -> str:
+    """Return ``url`` rewritten to use the asyncio driver for its backend."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if url.get_driver_name() in ("aiosqlite", "asyncpg"):
+        return url.render_as_string(hide_password=False)
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver configured for '{backend}' databases")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+# Deployment-size presets; every value can be overridden by its own variable
+ENGINE_PROFILES = {
+    # One worker on a laptop or small VM
+    "small": {"pool_size": 5, "max_overflow": 5,
+              "sqlite_cache_size_kib": 16 * 1024, "sqlite_mmap_size_mib": 64},
+    # A few workers on a single host
+    "medium": {"pool_size": 10, "max_overflow": 20,
+               "sqlite_cache_size_kib": 64 * 1024, "sqlite_mmap_size_mib": 256},
+    # Many workers against a dedicated database server
+    "large": {"pool_size": 20, "max_overflow": 40,
+              "sqlite_cache_size_kib": 256 * 1024, "sqlite_mmap_size_mib": 1024},
+}
+DATABASE_PROFILE = os.getenv("DATABASE_PROFILE", "small")
+
+
+def _setting(name: str, default):
+    return type(default)(os.getenv(f"DB_{name.upper()}", default))
+
+
+def engine_profile(name: str) -> dict:
+    """Return the settings of the ``DATABASE_PROFILE`` called ``name``."""
+    if name not in ENGINE_PROFILES:
+        raise ValueError(f"Unknown DATABASE_PROFILE '{name}'; choose one of {', '.join(ENGINE_PROFILES)}")
+    return ENGINE_PROFILES[name]
+
+
+profile = engine_profile(DATABASE_PROFILE)
+DB_POOL_SIZE = _setting("pool_size", profile["pool_size"])
+DB_MAX_OVERFLOW = _setting("max_overflow", profile["max_overflow"])
+DB_POOL_TIMEOUT = _setting("pool_timeout", 30)
+DB_POOL_RECYCLE = _setting("pool_recycle", 1800)
+DB_BUSY_TIMEOUT_MS = _setting("busy_timeout_ms", 5000)
+DB_SQLITE_CACHE_SIZE_KIB = _setting("sqlite_cache_size_kib", profile["sqlite_cache_size_kib"])
+DB_SQLITE_MMAP_SIZE_MIB = _setting("sqlite_mmap_size_mib", profile["sqlite_mmap_size_mib"])
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers run alongside the single writer; NORMAL only syncs
+    # at checkpoints, which WAL keeps crash-safe.
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    # Writers queue on the lock instead of failing with "database is locked"
+    cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    # Negative cache_size is in KiB
+    cursor.execute(f"PRAGMA cache_size=-{DB_SQLITE_CACHE_SIZE_KIB}")
+    cursor.execute(f"PRAGMA mmap_size={DB_SQLITE_MMAP_SIZE_MIB * 1024 * 1024}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+class _WaitTracking:
+    """Pool mixin counting checkouts that find every connection in use."""
+
+    def _do_get(self):
+        if self._max_overflow < 0 or self.checkedout() < self.size() + self._max_overflow:
+            return super()._do_get()
+        metrics.DB_POOL_WAITS.inc()
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+
+class TrackedQueuePool(_WaitTracking, QueuePool):
+    pass
+
+
+class TrackedAsyncQueuePool(_WaitTracking, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(url: str) -> dict:
+    """Engine keyword arguments for ``url`` under the configured profile."""
+    url = make_url(url)
+    is_async = url.get_driver_name() in ("aiosqlite", "asyncpg")
+    pool = {
+        "poolclass": TrackedAsyncQueuePool if is_async else TrackedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            return {}
+        if is_async:
+            # aiosqlite defaults to NullPool, which reopens the file (and
+            # re-runs the pragmas) for every session
+            return pool
+        return {**pool, "connect_args": {"check_same_thread": False}}
+    return {**pool, "pool_recycle": DB_POOL_RECYCLE, "pool_pre_ping": True}
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    metrics.DB_QUERY_LATENCY.observe(elapsed, metrics.statement_verb(statement))
+    querystats.record_statement(cursor, elapsed)
+
+
+def _committed(conn):
+    querystats.record_commit()
+
+
+def _execute_failed(context):
+    # after_cursor_execute never runs for a failed statement
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
+
+
+def _checked_out(dbapi_connection, connection_record, connection_proxy):
+    metrics.DB_POOL_CHECKOUTS.inc()
+    metrics.DB_POOL_CHECKED_OUT.inc()
+
+
+def _checked_in(dbapi_connection, connection_record):
+    metrics.DB_POOL_CHECKED_OUT.dec()
+
+
+def _connected(dbapi_connection, connection_record):
+    metrics.DB_POOL_CONNECTS.inc()
+
+
+def configure_engine(engine):
+    """Install connect-time tuning and metrics hooks on a sync engine or an async engine's sync core."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    url = sync_engine.url
+    if url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:"):
+        event.listen(sync_engine, "connect", _apply_sqlite_pragmas)
+    event.listen(sync_engine, "before_cursor_execute", _before_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_execute)
+    event.listen(sync_engine, "handle_error", _execute_failed)
+    event.listen(sync_engine, "commit", _committed)
+    event.listen(sync_engine, "checkout", _checked_out)
+    event.listen(sync_engine, "checkin", _checked_in)
+    event.listen(sync_engine, "connect", _connected)
+    return engine
+
+
+def _merge_options(url: str, kwargs: dict) -> dict:
+    options = engine_options(url)
+    if "poolclass" in kwargs:
+        # Sizing only applies to the queue pools chosen above
+        for key in ("poolclass", "pool_size", "max_overflow", "pool_timeout"):
+            options.pop(key, None)
+    return {**options, **kwargs}
 
-# Create all tables
-Base.metadata.create_all(bind=engine)
+
+def make_engine(url: str = SQLALCHEMY_DATABASE_URL, **kwargs):
+    return configure_engine(create_engine(url, **_merge_options(url, kwargs)))
+
+
+def make_async_engine(url: str = SQLALCHEMY_DATABASE_URL, **kwargs):
+    url = async_url(url)
+    return configure_engine(create_async_engine(url, **_merge_options(url, kwargs)))
+
+
+engine = make_engine()
+async_engine = make_async_engine()
+
+# Tables are created and changed by app.migrations, never at import
+Base = declarative_base()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay usable after commit; lazy refreshes are not possible under asyncio
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+class BlockingResult:
+    """Async iteration over a synchronous ``Result``, see ``BlockingSession``."""
+
+    def __init__(self, result):
+        self._result = result
+        self._rows = iter(result)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._rows)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def partitions(self, size=None):
+        for partition in self._result.partitions(size):
+            yield partition
+
+    async def close(self):
+        self._result.close()
+
+
+class BlockingSession:
+    """AsyncSession-compatible facade over a synchronous ``Session``.
+
+    Every awaited call runs the query inline and blocks the event loop,
+    which is exactly how the API behaved before the asyncio port. It lets
+    ``DATABASE_MODE=sync`` share the async crud code for side-by-side load
+    comparisons.
+    """
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    @property
+    def bind(self):
+        return self.sync_session.bind
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, *args, **kwargs):
+        return self.sync_session.execute(statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return self.sync_session.scalar(statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        return self.sync_session.scalars(statement, *args, **kwargs)
+
+    async def stream(self, statement, *args, **kwargs):
+        statement = statement.execution_options(stream_results=True)
+        return BlockingResult(self.sync_session.execute(statement, *args, **kwargs))
+
+    async def stream_scalars(self, statement, *args, **kwargs):
+        statement = statement.execution_options(stream_results=True)
+        return BlockingResult(self.sync_session.scalars(statement, *args, **kwargs))
+
+    async def get(self, entity, ident, **kwargs):
+        return self.sync_session.get(entity, ident, **kwargs)
+
+    async def refresh(self, instance, *args, **kwargs):
+        self.sync_session.refresh(instance, *args, **kwargs)
+
+    async def flush(self, *args, **kwargs):
+        self.sync_session.flush(*args, **kwargs)
+
+    async def commit(self):
+        self.sync_session.commit()
+
+    async def rollback(self):
+        self.sync_session.rollback()
+
+    async def close(self):
+        self.sync_session.close()
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return fn(self.sync_session, *args, **kwargs)
+
+
+class selective(FunctionElement):
+    """Tell SQLite's planner that a predicate matches few rows; a no-op elsewhere.
+
+    Renders SQLite's ``likelihood()``, which is strong enough to beat a
+    primary-key walk even when LIMIT is a bound parameter.
+    """
+    type = Boolean()
+    inherit_cache = True
+    # Render as a bare predicate rather than "likelihood(...) = 1"
+    _is_implicitly_boolean = True
+
+
+@compiles(selective)
+def _compile_selective(element, compiler, **kw):
+    return compiler.process(element.clauses, **kw)
+
+
+@compiles(selective, "sqlite")
+def _compile_selective_sqlite(element, compiler, **kw):
+    return "likelihood(%s, 0.001)" % compiler.process(element.clauses, **kw)
+
+
+def open_session():
+    """Create a request session for the configured ``DATABASE_MODE``."""
+    if DATABASE_MODE == "sync":
+        return BlockingSession(SessionLocal())
+    return AsyncSessionLocal()
 
 
-def get_db():
-    db = SessionLocal()
+async def get_db():
+    db = open_session()
     try:
         yield db
     finally:
-        db.close()
+        await db.close()
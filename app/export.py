@@ -0,0 +1,95 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select
+
+from . import models
+
+# Rows fetched per round-trip from the server-side cursor; each batch goes
+# out as one chunk of the response body
+EXPORT_YIELD_PER = int(os.getenv("EXPORT_YIELD_PER", "2000"))
+
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+ATTENDEE_COLUMNS = (
+    models.Attendee.attendee_id,
+    models.Attendee.first_name,
+    models.Attendee.last_name,
+    models.Attendee.email,
+    models.Attendee.phone_number,
+    models.Attendee.check_in_status,
+)
+
+EVENT_COLUMNS = (
+    models.Event.event_id,
+    models.Event.name,
+    models.Event.description,
+    models.Event.start_time,
+    models.Event.end_time,
+    models.Event.location,
+    models.Event.max_attendees,
+    models.Event.attendee_count,
+    models.Event.status,
+)
+
+
+def attendees_query(event_id: int, check_in_status: Optional[bool] = None):
+    query = select(*ATTENDEE_COLUMNS).where(models.Attendee.event_id == event_id)
+    if check_in_status is not None:
+        query = query.where(models.Attendee.check_in_status == check_in_status)
+    return query.order_by(models.Attendee.attendee_id)
+
+
+def events_query(status: Optional[str] = None, location: Optional[str] = None):
+    query = select(*EVENT_COLUMNS)
+    if status:
+        query = query.where(models.Event.status == status)
+    if location:
+        query = query.where(models.Event.location == location)
+    return query.order_by(models.Event.event_id)
+
+
+def _plain(value):
+    # EventStatus is a str subclass already; only datetimes need help
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _csv_chunk(rows, header=None) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header is not None:
+        writer.writerow(header)
+    writer.writerows([_plain(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+
+def _ndjson_chunk(names, rows) -> str:
+    return "".join(
+        json.dumps(dict(zip(names, map(_plain, row)))) + "\n" for row in rows)
+
+
+async def stream_rows(db, query, export_format: str):
+    """Yield ``query``'s rows as CSV or NDJSON text, one chunk per fetched batch.
+
+    The query selects plain columns, so rows come back as tuples and no ORM
+    objects or Pydantic models are built. Only one batch is held in memory
+    at a time. The session is closed when the stream ends, since the request
+    dependency has already let go of it by then.
+    """
+    names = [column.key for column in query.selected_columns]
+    try:
+        if export_format == "csv":
+            # Sent before the query runs, so the client sees bytes right away
+            yield _csv_chunk((), header=names)
+        result = await db.stream(query.execution_options(yield_per=EXPORT_YIELD_PER))
+        async for rows in result.partitions():
+            if export_format == "csv":
+                yield _csv_chunk(rows)
+            else:
+                yield _ndjson_chunk(names, rows)
+    finally:
+        await db.close()
@@ -0,0 +1,305 @@
+"""Live per-event feed of registrations and check-ins.
+
+Handlers publish deltas to ``broker`` after their transaction commits; the
+WebSocket and SSE endpoints in ``main`` relay them to subscribers. Every
+message carries a per-event sequence number, and the broker keeps the last
+``FEED_HISTORY`` messages of each event, so a client that reconnects with
+the last ``seq`` it saw gets what it missed.
+
+Publishing goes through a backend. ``LocalFeedBackend`` delivers within
+this process; with ``FEED_URL`` set, ``RedisFeedBackend`` numbers messages
+in Redis and fans them out to every worker over pub/sub.
+"""
+import asyncio
+import json
+import os
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Optional
+
+from starlette.websockets import WebSocket
+
+from . import metrics
+
+FEED_URL = os.getenv("FEED_URL")
+# Messages a subscriber may fall behind by before it is dropped
+FEED_QUEUE_SIZE = int(os.getenv("FEED_QUEUE_SIZE", "256"))
+# Messages kept per event for resuming subscribers
+FEED_HISTORY = int(os.getenv("FEED_HISTORY", "1000"))
+# Events whose history is kept; the least recently active are forgotten first
+FEED_HISTORY_EVENTS = int(os.getenv("FEED_HISTORY_EVENTS", "1024"))
+# Seconds between SSE comments that keep idle connections open through proxies
+FEED_HEARTBEAT_SECONDS = float(os.getenv("FEED_HEARTBEAT_SECONDS", "15"))
+# Longest an SSE response stays open; EventSource reconnects with
+# Last-Event-ID, which also spreads long-lived clients across workers
+FEED_MAX_SECONDS = float(os.getenv("FEED_MAX_SECONDS", "300"))
+FEED_CHANNEL = "event-feed"
+
+FEED_SUBSCRIBERS = metrics.REGISTRY.register(metrics.Gauge(
+    "feed_subscribers", "Open live feed subscriptions."))
+FEED_MESSAGES = metrics.REGISTRY.register(metrics.Counter(
+    "feed_messages_total", "Feed messages delivered to this worker, by type.", ("type",)))
+FEED_DROPPED = metrics.REGISTRY.register(metrics.Counter(
+    "feed_dropped_subscribers_total", "Subscribers dropped for falling too far behind."))
+
+
+class Subscription:
+    """Messages for one subscriber, oldest first.
+
+    A subscriber that lets its queue fill up is dropped: it still receives
+    what was queued, then iteration stops with ``dropped`` set so the client
+    can reconnect from the last ``seq`` it saw.
+    """
+
+    def __init__(self, event_id: int, backlog, queue_size: int):
+        self.event_id = event_id
+        self.dropped = False
+        self.closed = False
+        self._queue = asyncio.Queue(maxsize=queue_size + len(backlog))
+        for message in backlog:
+            self._queue.put_nowait(message)
+
+    def offer(self, message: dict) -> bool:
+        try:
+            self._queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.dropped = True
+            return False
+
+    def close(self):
+        self.closed = True
+        try:
+            self._queue.put_nowait(None)
+        except asyncio.QueueFull:
+            self.dropped = True
+
+    def poll(self) -> Optional[dict]:
+        """The next queued message, or None when nothing is waiting."""
+        if self._queue.empty():
+            return None
+        return self._queue.get_nowait()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> dict:
+        if self.dropped and self._queue.empty():
+            raise StopAsyncIteration
+        message = await self._queue.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+
+class LocalFeedBackend:
+    """In-process stand-in for a cross-worker backend; numbers messages itself."""
+
+    def __init__(self):
+        self._sequences = {}
+        self._dispatch = None
+
+    def bind(self, dispatch):
+        self._dispatch = dispatch
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, event_id: int, message: dict):
+        message["seq"] = self._sequences[event_id] = self._sequences.get(event_id, 0) + 1
+        self._dispatch(message)
+
+
+class RedisFeedBackend:
+    """Numbers messages with INCR and fans them out to every worker over pub/sub."""
+
+    def __init__(self, client):
+        self.client = client
+        self._dispatch = None
+        self._task = None
+
+    def bind(self, dispatch):
+        self._dispatch = dispatch
+
+    async def start(self):
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(FEED_CHANNEL)
+        self._task = asyncio.create_task(self._listen(pubsub))
+
+    async def _listen(self, pubsub):
+        async for item in pubsub.listen():
+            if item.get("type") == "message":
+                self._dispatch(json.loads(item["data"]))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def publish(self, event_id: int, message: dict):
+        message["seq"] = await self.client.incr(f"feed:seq:{event_id}")
+        await self.client.publish(FEED_CHANNEL, json.dumps(message))
+
+
+class FeedBroker:
+    def __init__(self, backend, queue_size: int = FEED_QUEUE_SIZE, history: int = FEED_HISTORY,
+                 history_events: int = FEED_HISTORY_EVENTS):
+        self.backend = backend
+        self.queue_size = queue_size
+        self.history = history
+        self.history_events = history_events
+        self._subscribers = {}
+        self._history = OrderedDict()
+        backend.bind(self.dispatch)
+
+    async def start(self):
+        await self.backend.start()
+
+    async def stop(self):
+        await self.backend.stop()
+        for subscribers in list(self._subscribers.values()):
+            for subscription in list(subscribers):
+                self.unsubscribe(subscription)
+                subscription.close()
+
+    async def publish(self, event_id: int, type: str, **data):
+        """Announce a committed change to ``event_id``'s subscribers on every worker."""
+        await self.backend.publish(event_id, {
+            "event_id": event_id, "type": type,
+            "at": datetime.now(timezone.utc).isoformat(), **data})
+
+    def dispatch(self, message: dict):
+        """Record a numbered message and hand it to local subscribers."""
+        event_id = message["event_id"]
+        history = self._history.get(event_id)
+        if history is None:
+            history = self._history[event_id] = deque(maxlen=self.history)
+            while len(self._history) > self.history_events:
+                self._history.popitem(last=False)
+        self._history.move_to_end(event_id)
+        history.append(message)
+        FEED_MESSAGES.inc(message["type"])
+        for subscription in list(self._subscribers.get(event_id, ())):
+            if not subscription.offer(message):
+                FEED_DROPPED.inc()
+                self.unsubscribe(subscription)
+
+    def subscribe(self, event_id: int, since: Optional[int] = None) -> Subscription:
+        """Follow ``event_id``, first replaying what came after ``since``.
+
+        When some of those messages are no longer held, the replay starts
+        with a ``reset`` message telling the client to reload its state,
+        followed by everything that is.
+        """
+        backlog = []
+        if since is not None:
+            history = self._history.get(event_id, ())
+            first = history[0]["seq"] if history else None
+            last = history[-1]["seq"] if history else 0
+            if (first is not None and since < first - 1) or since > last:
+                since = first - 1 if first is not None else 0
+                backlog.append({"event_id": event_id, "type": "reset", "seq": since})
+            backlog.extend(message for message in history if message["seq"] > since)
+        subscription = Subscription(event_id, backlog, self.queue_size)
+        self._subscribers.setdefault(event_id, set()).add(subscription)
+        FEED_SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.event_id)
+        if subscribers and subscription in subscribers:
+            subscribers.discard(subscription)
+            FEED_SUBSCRIBERS.dec()
+            if not subscribers:
+                del self._subscribers[subscription.event_id]
+
+
+def _dropped(subscription: Subscription, last_seq: int) -> dict:
+    return {"event_id": subscription.event_id, "type": "dropped", "seq": last_seq}
+
+
+async def sse_events(subscription: Subscription, lifetime: float = FEED_MAX_SECONDS,
+                     heartbeat: float = FEED_HEARTBEAT_SECONDS):
+    """Yield ``subscription``'s messages as Server-Sent Events for ``lifetime`` seconds.
+
+    The ``id`` of each event is its ``seq``, so a reconnecting EventSource
+    resumes through ``Last-Event-ID`` on its own. A ``lifetime`` of 0 sends
+    what is already queued, such as a resume backlog, and stops.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + lifetime
+    last_seq = 0
+    messages = subscription.__aiter__()
+    try:
+        while True:
+            remaining = deadline - loop.time()
+            if remaining > 0:
+                try:
+                    message = await asyncio.wait_for(messages.__anext__(), min(heartbeat, remaining))
+                except asyncio.TimeoutError:
+                    if remaining > heartbeat:
+                        yield ": keep-alive\n\n"
+                    continue
+                except StopAsyncIteration:
+                    break
+            else:
+                message = subscription.poll()
+                if message is None:
+                    break
+            last_seq = message["seq"]
+            yield f"id: {last_seq}\nevent: {message['type']}\ndata: {json.dumps(message)}\n\n"
+        if subscription.dropped:
+            message = _dropped(subscription, last_seq)
+            yield f"event: dropped\ndata: {json.dumps(message)}\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def relay_websocket(websocket: WebSocket, subscription: Subscription):
+    """Send ``subscription``'s messages as JSON until either side goes away."""
+    async def send():
+        last_seq = 0
+        async for message in subscription:
+            last_seq = message["seq"]
+            await websocket.send_json(message)
+        if subscription.dropped:
+            await websocket.send_json(_dropped(subscription, last_seq))
+            # 1013: try again later
+            await websocket.close(code=1013)
+        else:
+            await websocket.close(code=1001)
+
+    async def receive():
+        # Clients have nothing to say; reading only notices them leaving
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    tasks = [asyncio.create_task(send()), asyncio.create_task(receive())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        broker.unsubscribe(subscription)
+
+
+def create_backend(url: Optional[str] = FEED_URL):
+    if not url:
+        return LocalFeedBackend()
+    try:
+        import redis.asyncio as redis
+    except ImportError:
+        raise RuntimeError("FEED_URL requires the 'redis' package") from None
+    return RedisFeedBackend(redis.from_url(url))
+
+
+broker = FeedBroker(create_backend())
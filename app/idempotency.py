@@ -0,0 +1,277 @@
+"""``Idempotency-Key`` support for retried writes.
+
+The first request with a key claims it (``SET NX``) and runs; its response
+is then stored for ``IDEMPOTENCY_TTL`` seconds. A retry with the same key,
+credentials and path gets the stored response back after a single key
+lookup, without reaching the handler or the database. A duplicate that
+arrives while the first is still running waits for it instead of running
+too. Server errors release the key so the request can be retried.
+
+The stored response carries a hash of the request body it answered. A key
+sent again with a different body is a client bug, not a retry, and gets
+``422`` instead of the other request's response.
+"""
+import asyncio
+import hashlib
+import json
+import os
+from typing import Iterable, Optional, Tuple
+
+from . import metrics
+from .admission import match_route
+from .cache import MemoryCacheBackend
+
+IDEMPOTENCY_URL = os.getenv("IDEMPOTENCY_URL")
+# Seconds a completed response is replayed for
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))
+# Seconds a key stays claimed by a request that never finished, e.g. on a crashed worker
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+# Seconds a duplicate waits for the original before giving up with 409
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "100000"))
+IDEMPOTENCY_MAX_BYTES = int(os.getenv("IDEMPOTENCY_MAX_BYTES", str(64 * 1024 * 1024)))
+
+HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+# These depend on more than the request itself, so a retry runs again
+NOT_STORED = {401, 403, 429}
+PENDING = b"pending"
+# How often a duplicate checks on an original running in another worker
+POLL_SECONDS = 0.05
+
+IDEMPOTENT_REQUESTS = metrics.REGISTRY.register(metrics.Counter(
+    "idempotent_requests_total", "Requests carrying an Idempotency-Key, by outcome.", ("outcome",)))
+
+
+def _multipart_boundary(scope) -> bytes:
+    content_type = dict(scope["headers"]).get(b"content-type", b"")
+    if not content_type.lower().startswith(b"multipart/"):
+        return b""
+    for parameter in content_type.split(b";")[1:]:
+        name, _, value = parameter.strip().partition(b"=")
+        if name.lower() == b"boundary":
+            return value.strip(b'"')
+    return b""
+
+
+class BodyHash:
+    """Wraps ``receive`` to hash the request body as the app reads it.
+
+    Clients pick a new multipart boundary for every attempt, so boundaries
+    are left out of the hash; a retried upload hashes the same.
+    """
+
+    def __init__(self, scope, receive):
+        self._receive = receive
+        self._hash = hashlib.blake2b(digest_size=20)
+        self._boundary = _multipart_boundary(scope)
+        # Bytes held back in case a boundary continues in the next chunk
+        self._tail = b""
+        self.complete = False
+
+    def _update(self, chunk: bytes):
+        if not self._boundary:
+            self._hash.update(chunk)
+            return
+        data = (self._tail + chunk).replace(self._boundary, b"")
+        keep = len(self._boundary) - 1
+        self._hash.update(data[:-keep] if keep else data)
+        self._tail = data[-keep:] if keep else b""
+
+    async def receive(self):
+        message = await self._receive()
+        if message["type"] == "http.request":
+            self._update(message.get("body", b""))
+            self.complete = not message.get("more_body", False)
+        elif message["type"] == "http.disconnect":
+            self.complete = True
+        return message
+
+    async def hexdigest(self) -> str:
+        """The hash of the whole body, reading whatever the app left unread."""
+        while not self.complete:
+            await self.receive()
+        self._hash.update(self._tail)
+        self._tail = b""
+        return self._hash.hexdigest()
+
+
+class StoredResponse:
+    def __init__(self, status: int, content_type: str, body: bytes, request_hash: str = ""):
+        self.status = status
+        self.content_type = content_type
+        self.body = body
+        self.request_hash = request_hash
+
+    def dumps(self) -> bytes:
+        return b"\n".join([str(self.status).encode(), self.request_hash.encode(),
+                           self.content_type.encode(), self.body])
+
+    @classmethod
+    def loads(cls, value: bytes) -> "StoredResponse":
+        status, request_hash, content_type, body = value.split(b"\n", 3)
+        return cls(int(status), content_type.decode(), body, request_hash.decode())
+
+    async def send(self, send):
+        headers = [(b"content-length", str(len(self.body)).encode()),
+                   (b"idempotent-replayed", b"true")]
+        if self.content_type:
+            headers.append((b"content-type", self.content_type.encode()))
+        await send({"type": "http.response.start", "status": self.status, "headers": headers})
+        await send({"type": "http.response.body", "body": self.body})
+
+
+class IdempotencyStore:
+    """Claims, stored responses and in-flight tracking for idempotency keys.
+
+    ``backend`` speaks the Redis subset of ``cache.MemoryCacheBackend``; with
+    a shared Redis, keys are claimed and replayed across workers.
+    """
+
+    def __init__(self, backend, ttl: int = IDEMPOTENCY_TTL,
+                 lock_seconds: int = IDEMPOTENCY_LOCK_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.lock_seconds = lock_seconds
+        # Keys claimed by requests running in this worker
+        self._in_flight = {}
+
+    @staticmethod
+    def key(scope, route: str, idempotency_key: bytes) -> str:
+        headers = dict(scope["headers"])
+        # Keys are scoped to the caller's credentials and the exact path
+        material = b"\0".join([headers.get(b"authorization", b""), scope["method"].encode(),
+                               route.encode(), scope["path"].encode(), idempotency_key])
+        return "idem:" + hashlib.blake2b(material, digest_size=20).hexdigest()
+
+    async def claim(self, key: str):
+        """Return the stored response, ``PENDING`` while another request holds
+        the key, or None once this request has claimed it."""
+        value = await self.backend.get(key)
+        if value is None:
+            if await self.backend.set(key, PENDING, ex=self.lock_seconds, nx=True):
+                self._in_flight[key] = asyncio.Event()
+                return None
+            value = await self.backend.get(key)
+        if value is None or value == PENDING:
+            return PENDING
+        return StoredResponse.loads(value)
+
+    async def wait(self, key: str, timeout: float):
+        """Wait up to ``timeout`` seconds for the request holding ``key`` to finish."""
+        done = self._in_flight.get(key)
+        if done is not None:
+            try:
+                await asyncio.wait_for(done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        else:
+            await asyncio.sleep(min(POLL_SECONDS, timeout))
+
+    async def finish(self, key: str, response: Optional[StoredResponse]):
+        """Store ``response`` for replay, or free the key when there is nothing to keep."""
+        try:
+            if response is None:
+                await self.backend.delete(key)
+            else:
+                await self.backend.set(key, response.dumps(), ex=self.ttl)
+        finally:
+            done = self._in_flight.pop(key, None)
+            if done is not None:
+                done.set()
+
+
+async def _send_json(send, status: int, detail: str, headers: Iterable[Tuple[bytes, bytes]] = ()):
+    body = json.dumps({"detail": detail}).encode()
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+        *headers]})
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware honouring ``Idempotency-Key`` on the given routes.
+
+    ``routes`` holds ``(method, path template)`` pairs; other requests pass
+    through untouched, whatever headers they carry.
+    """
+
+    def __init__(self, app, routes: Iterable[Tuple[str, str]],
+                 wait_seconds: float = IDEMPOTENCY_WAIT_SECONDS):
+        self.app = app
+        self.routes = frozenset(routes)
+        self.wait_seconds = wait_seconds
+
+    def _route(self, scope):
+        route = match_route(scope)
+        return route if route is not None and (scope["method"], route.path) in self.routes else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+        idempotency_key = dict(scope["headers"]).get(HEADER)
+        route = self._route(scope) if idempotency_key is not None else None
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            await _send_json(send, 400, f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+            return
+
+        key = store.key(scope, route.path, idempotency_key)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_seconds
+        while (stored := await store.claim(key)) is PENDING:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                IDEMPOTENT_REQUESTS.inc("conflict")
+                await _send_json(send, 409, "A request with this Idempotency-Key is still in progress",
+                                 [(b"retry-after", b"1")])
+                return
+            await store.wait(key, remaining)
+        request_body = BodyHash(scope, receive)
+        if stored is not None:
+            if await request_body.hexdigest() != stored.request_hash:
+                IDEMPOTENT_REQUESTS.inc("mismatch")
+                await _send_json(send, 422, "This Idempotency-Key was already used with a different request body")
+                return
+            IDEMPOTENT_REQUESTS.inc("replayed")
+            await stored.send(send)
+            return
+
+        IDEMPOTENT_REQUESTS.inc("executed")
+        status_code, content_type, body, complete = 500, "", [], False
+
+        async def send_wrapper(message):
+            nonlocal status_code, content_type, complete
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"").decode()
+            elif message["type"] == "http.response.body":
+                body.append(message.get("body", b""))
+                complete = not message.get("more_body", False)
+            await send(message)
+
+        response = None
+        try:
+            await self.app(scope, request_body.receive, send_wrapper)
+            if complete and status_code < 500 and status_code not in NOT_STORED:
+                response = StoredResponse(status_code, content_type, b"".join(body),
+                                          await request_body.hexdigest())
+        finally:
+            await store.finish(key, response)
+
+
+def create_backend(url: Optional[str] = IDEMPOTENCY_URL):
+    if not url:
+        return MemoryCacheBackend(max_entries=IDEMPOTENCY_MAX_ENTRIES, max_bytes=IDEMPOTENCY_MAX_BYTES)
+    try:
+        import redis.asyncio as redis
+    except ImportError:
+        raise RuntimeError("IDEMPOTENCY_URL requires the 'redis' package") from None
+    return redis.from_url(url)
+
+
+store = IdempotencyStore(create_backend())
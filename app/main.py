@@ -1,104 +1,172 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Depends, HTTPException, File, UploadFile, status
+from fastapi import FastAPI, Depends, Header, HTTPException, File, Query, Request, UploadFile, WebSocket, status
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from typing import Optional
 import csv
 import io
-from .database import Base
-from . import crud, schemas, auth, models
-from .database import engine, get_db
-from datetime import datetime, timezone
+from . import admission, checkins, crud, schemas, auth, models, export, feed, idempotency, metrics, migrations, querystats, registration, replicas, search, serialization
+from .database import async_engine, get_db, open_session, selective
+from .replicas import get_read_db
+from .cache import response_cache
+from .scheduler import EventLifecycleScheduler
+from datetime import datetime, timedelta, timezone
 
-app = FastAPI(title="Event Management API")
+# Keeps event status in step with start_time/end_time while the app runs
+scheduler = EventLifecycleScheduler(
+    open_session, on_transition=lambda: response_cache.invalidate("events"))
 
-# Create the database tables
-Base.metadata.create_all(bind=engine)
 
-# Automatically update event status to 'completed' if end_time has passed
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup code
-    db = next(get_db())
-    events = db.query(models.Event).filter(models.Event.end_time < datetime.now(timezone.utc)).all()
-    for event in events:
-        event.status = "completed"
-        db.commit()
-        db.refresh(event)
+    async with async_engine.connect() as conn:
+        await conn.run_sync(migrations.upgrade if migrations.MIGRATE_ON_STARTUP else migrations.check)
+    # Catches up on transitions missed while stopped before serving requests
+    await scheduler.catch_up()
+    scheduler.start()
+    await feed.broker.start()
+    await replicas.readers.start()
     yield
-    # Shutdown code (if needed)
+    # Shutdown code
+    await replicas.readers.stop()
+    await feed.broker.stop()
+    await scheduler.stop()
 
 app = FastAPI(lifespan=lifespan)
+# Writes a client may safely retry with the same Idempotency-Key
+app.add_middleware(idempotency.IdempotencyMiddleware, routes=[
+    ("POST", "/event"),
+    ("PUT", "/event/{event_id}"),
+    ("POST", "/event/{event_id}/attendees"),
+    ("DELETE", "/event/{event_id}/attendees/{attendee_id}"),
+    ("PUT", "/event/{event_id}/attendees/{attendee_id}/checkin"),
+    ("POST", "/event/{event_id}/attendees/import"),
+    ("POST", "/event/{event_id}/attendees/bulk-checkin"),
+])
+# Under load, door check-in is served before registration, and registration
+# before listings; unlisted routes are NORMAL
+app.add_middleware(admission.AdmissionMiddleware, priorities={
+    ("PUT", "/event/{event_id}/attendees/{attendee_id}/checkin"): admission.CRITICAL,
+    ("POST", "/event/{event_id}/attendees/bulk-checkin"): admission.CRITICAL,
+    ("POST", "/event/{event_id}/attendees"): admission.HIGH,
+    ("POST", "/event/{event_id}/attendees/import"): admission.HIGH,
+    ("GET", "/events"): admission.LOW,
+    ("GET", "/events/search"): admission.LOW,
+    ("GET", "/events/stats"): admission.LOW,
+    ("GET", "/event/{event_id}/attendees"): admission.LOW,
+    ("GET", "/events/export"): admission.LOW,
+    ("GET", "/event/{event_id}/attendees/export"): admission.LOW,
+    ("GET", "/metrics"): admission.EXEMPT,
+    ("GET", "/event/{event_id}/feed"): admission.EXEMPT,
+})
+# After a write, the client's reads go to the primary for a while
+app.add_middleware(replicas.ReadYourWritesMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(querystats.QueryStatsMiddleware)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Request, database and domain metrics in the Prometheus text format."""
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.post("/register", response_model=schemas.Register)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_username(db, username=user.username)
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    db_user = await crud.get_user_by_username(db, username=user.username)
     if db_user:
         raise HTTPException(
             status_code=400, detail="Username already registered")
-    return crud.create_user(db=db, user=user)
+    return await crud.create_user(db=db, user=user)
 
 # Authentication endpoints
 @app.post("/token", include_in_schema=False)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = crud.get_user_by_username(db, username=form_data.username)
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+    user = await crud.get_user_by_username(db, username=form_data.username)
+    valid, new_hash = (False, None)
+    if user:
+        valid, new_hash = await auth.verify_and_update_password(form_data.password, user.hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password"
         )
+    if new_hash:
+        # Stored with a different bcrypt cost than configured; upgrade it
+        user.hashed_password = new_hash
+        await db.commit()
     access_token = auth.create_access_token(data={"sub": user.username})
     return {"access_token": access_token, "token_type": "bearer"}
 
+@app.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    token: str = Depends(auth.oauth2_scheme),
+    principal: auth.Principal = Depends(auth.verify_token)
+):
+    auth.revoke_token(token)
+
+
 @app.post("/event", response_model=schemas.Event, status_code=status.HTTP_201_CREATED)
 async def create_event(
     event: schemas.EventCreate,
-    db: Session = Depends(get_db),
-    token: dict = Depends(auth.verify_token)
+    db: AsyncSession = Depends(get_db),
+    principal: auth.Principal = Depends(auth.verify_token)
 ):
-    return crud.create_event(db=db, event=event)
+    db_event = await crud.create_event(db=db, event=event)
+    scheduler.schedule(db_event)
+    await response_cache.invalidate("events")
+    return db_event
 
 @app.put("/event/{event_id}", response_model=schemas.Event)
 async def update_event(
     event_id: int,
     event_update: schemas.EventUpdate,
-    db: Session = Depends(get_db),
-    token: dict = Depends(auth.verify_token)
+    db: AsyncSession = Depends(get_db),
+    principal: auth.Principal = Depends(auth.verify_token)
 ):
-    event = crud.get_event(db, event_id)
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
-    
-    for key, value in event_update.model_dump(exclude_unset=True).items():
-        setattr(event, key, value)
-   
-    crud.update_event_status(db, event.event_id)
-    db.commit()
-    db.refresh(event)
+    event = await crud.update_event(db, event_id, event_update.model_dump(exclude_unset=True))
+    scheduler.schedule(event)
+    registration.queues.remember(event_id, event.registration_queue)
+    await response_cache.invalidate("events")
+    await response_cache.invalidate(f"attendees:{event_id}")
     return event
 
-@app.post("/event/{event_id}/attendees", response_model=schemas.AttendeeResponse)
+
+@app.get("/scheduler", response_model=schemas.SchedulerStats)
+async def scheduler_stats(principal: auth.Principal = Depends(auth.verify_token)):
+    """Queue depth and lag of the event lifecycle scheduler."""
+    return scheduler.stats()
+
+@app.post("/event/{event_id}/attendees", response_model=schemas.AttendeeResponse, responses={
+    202: {"model": schemas.WaitlistPosition, "description": "The event is full; joined its waitlist"}})
 async def register_attendee(
     event_id: int,
     attendee: schemas.AttendeeCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    event = crud.get_event(db, event_id)
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
-
-    if len(event.attendees) >= event.max_attendees:
-        raise HTTPException(status_code=400, detail="Max attendees limit reached")
+    outcome = await registration.register(db, event_id, attendee)
+    if isinstance(outcome, schemas.WaitlistPosition):
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=outcome.model_dump())
+    await response_cache.invalidate(f"attendees:{event_id}")
+    return outcome
 
-    new_attendee = crud.register_attendee(db, event_id, attendee)
-    if new_attendee == "FULL":
-        raise HTTPException(status_code=400, detail="Event is already full")
 
-    return new_attendee
+@app.delete("/event/{event_id}/attendees/{attendee_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def cancel_registration(
+    event_id: int,
+    attendee_id: int,
+    db: AsyncSession = Depends(get_db),
+    principal: auth.Principal = Depends(auth.verify_token)
+):
+    """Cancel a registration; the seat goes to the first person on the waitlist."""
+    await crud.cancel_registration(db, event_id, attendee_id)
+    await response_cache.invalidate(f"attendees:{event_id}")
 
 
 @app.put("/event/{event_id}/attendees/{attendee_id}/checkin", response_model=schemas.Attendee)
@@ -106,94 +174,341 @@ async def checkin_attendee(
     event_id: int,
     attendee_id: int,
     check_in_status: Optional[bool] = True,
-    db: Session = Depends(get_db),
-    token: dict = Depends(auth.verify_token)
+    db: AsyncSession = Depends(get_db),
+    principal: auth.Principal = Depends(auth.verify_token)
 ):
-    attendee = db.query(models.Attendee).filter(
-        models.Attendee.event_id == event_id,
-        models.Attendee.attendee_id == attendee_id
-    ).first()
+    attendee = await checkins.checkin(db, event_id, attendee_id, check_in_status)
+    await response_cache.invalidate(f"attendees:{event_id}")
+    return attendee
 
-    if not attendee:
-        raise HTTPException(status_code=404, detail="Attendee not found")
+@app.post("/event/{event_id}/attendees/import", response_model=schemas.AttendeeImportResult, openapi_extra={
+    # The JSON form is read from the request directly, so FastAPI only documents the upload
+    "requestBody": {"required": True, "content": {"application/json": {"schema": {
+        "type": "array", "items": {"$ref": "#/components/schemas/AttendeeCreate"}}}}}})
+async def import_attendees(
+    event_id: int,
+    request: Request,
+    file: Optional[UploadFile] = File(None),
+    db: AsyncSession = Depends(get_db),
+    principal: auth.Principal = Depends(auth.verify_token)
+):
+    """Register many attendees at once from a CSV upload or a JSON array.
 
-    attendee.check_in_status = check_in_status
-    db.commit()
-    db.refresh(attendee)
-    return attendee
+    The CSV needs ``first_name``, ``last_name``, ``email`` and
+    ``phone_number`` columns; a JSON body is a list of the same objects.
+    Every row gets its own outcome. Rows that find no seat join the
+    waitlist of an event that keeps one, like single registrations. The
+    import is written in one transaction of its own, so events with
+    ``registration_queue`` do not queue it.
+    """
+    if file is not None:
+        text = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+        try:
+            result = await crud.import_attendees(db, event_id, csv.DictReader(text))
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="CSV file must be UTF-8 encoded")
+        finally:
+            text.detach()
+    else:
+        try:
+            rows = await request.json()
+        except ValueError:
+            rows = None
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400,
+                                detail="Send a CSV file upload or a JSON array of attendees")
+        result = await crud.import_attendees(db, event_id, rows)
+    if result["created"]:
+        await response_cache.invalidate(f"attendees:{event_id}")
+    return result
 
-@app.post("/event/{event_id}/attendees/bulk-checkin", response_model=List[schemas.Attendee])
+@app.post("/event/{event_id}/attendees/bulk-checkin", response_model=schemas.BulkCheckinResult)
 async def bulk_checkin_attendees(
     event_id: int,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    token: dict = Depends(auth.verify_token)
+    db: AsyncSession = Depends(get_db),
+    principal: auth.Principal = Depends(auth.verify_token)
 ):
-    content = await file.read()
-    csv_reader = csv.DictReader(io.StringIO(content.decode("utf-8")))
-    
-    attendees = []
-    failed_updates = []
+    # Parse the spooled upload lazily instead of reading it into memory
+    text = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        result = await crud.bulk_checkin(db, event_id, csv.DictReader(text))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV file must be UTF-8 encoded")
+    finally:
+        text.detach()
+    if result["updated"]:
+        await response_cache.invalidate(f"attendees:{event_id}")
+    return result
 
-    for row in csv_reader:
-        try:
-            attendee_id = int(row["attendee_id"])
-            print(f"Processing attendee_id: {attendee_id}")
 
-            attendee = db.query(models.Attendee).filter(
-                models.Attendee.event_id == event_id,
-                models.Attendee.attendee_id == attendee_id
-            ).first()
+# Rows fetched per round-trip when streaming NDJSON from a server-side cursor
+STREAM_YIELD_PER = 500
+
+
+async def _keyset_page(db, request: Request, query, key, limit: int,
+                       after: Optional[int], response_format: str,
+                       cache_namespace: str, cache_params: dict):
+    """Return one page of ``query`` ordered by ``key``, starting after ``after``.
+
+    ``query`` selects the response schema's columns (see
+    ``serialization.schema_columns``), which are encoded without building
+    models. The next page's cursor goes out in the ``X-Next-Cursor`` header
+    so the body keeps its plain list shape. Serialized pages are kept in the
+    response cache under ``cache_namespace`` and carry an ETag, so pollers
+    sending ``If-None-Match`` get a bodiless 304 while nothing changed;
+    clients pinned to the primary after a write always get a fresh page.
+    With ``format=ndjson`` every matching row is streamed instead, one JSON
+    document per line.
+    """
+    if after is not None:
+        query = query.where(key > after)
+    query = query.order_by(key)
+
+    if response_format == "ndjson":
+        return StreamingResponse(_ndjson_rows(db, query), media_type="application/x-ndjson")
 
-            if attendee:
-                attendee.check_in_status = True
-                db.commit()
-                db.refresh(attendee)
-                attendees.append(attendee)
-            else:
-                print(f"Attendee {attendee_id} not found for event {event_id}")
-                failed_updates.append(attendee_id)
-        except Exception as e:
-            print(f"Error processing attendee {row}: {e}")
-            failed_updates.append(row["attendee_id"])
+    cache_key = await response_cache.key(
+        cache_namespace, request.url.path, dict(cache_params, limit=limit, after=after))
+    entry = None if replicas.pinned_read(request) else await response_cache.get(cache_key)
+    if entry is None:
+        rows = (await db.execute(query.limit(limit + 1))).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = str(getattr(rows[-1], key.key))
+        body = serialization.dump_rows(serialization.column_names(query), rows)
+        entry = await response_cache.put(cache_key, body, next_cursor)
+    return entry.to_response(request)
 
-    if failed_updates:
-        print(f"Failed to update attendees: {failed_updates}")
 
-    return attendees
+async def _ndjson_rows(db, query):
+    # The session dependency has already closed the session by the time the
+    # body is sent; a closed session reconnects on use, so close it again here.
+    names = serialization.column_names(query)
+    try:
+        result = await db.stream(query.execution_options(yield_per=STREAM_YIELD_PER))
+        async for rows in result.partitions():
+            yield serialization.dump_ndjson(names, rows)
+    finally:
+        await db.close()
+
+
+def _filter_events(query, status: Optional[str], location: Optional[str], date: Optional[datetime]):
+    if status:
+        query = query.where(models.Event.status == status)
+    if location:
+        query = query.where(models.Event.location == location)
+    if date:
+        # Open-ended ranges look unselective to SQLite's planner, which would
+        # rather walk the primary key; events that have not ended yet are the
+        # small side of the split.
+        query = query.where(models.Event.start_time <= date, selective(models.Event.end_time >= date))
+    return query
 
 
 # Get list of the events
 @app.get("/events", response_model=List[schemas.Event])
 async def list_events(
+    request: Request,
     status: Optional[str] = None,
     location: Optional[str] = None,
     date: Optional[datetime] = None,
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[int] = None,
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Fetch a list of events, optionally filtering by status, location, and date."""
+    """Fetch a list of events, optionally filtering by status, location, and date.
 
-    query = db.query(models.Event)
+    Results are paginated by ``event_id``: pass the ``X-Next-Cursor`` header of
+    a page as ``after`` to get the next one.
+    """
 
-    if status:
-        query = query.filter(models.Event.status == status)
-    if location:
-        query = query.filter(models.Event.location == location)
-    if date:
-        query = query.filter(models.Event.start_time <= date, models.Event.end_time >= date)
+    query = _filter_events(
+        select(*serialization.schema_columns(models.Event, schemas.Event)), status, location, date)
 
-    return query.all()
+    return await _keyset_page(
+        db, request, query, models.Event.event_id, limit, after, response_format,
+        "events", {"status": status, "location": location,
+                   "date": date.isoformat() if date else None})
+
+@app.get("/events/stats", response_model=List[schemas.EventStats])
+async def events_stats(
+    event_ids: List[int] = Query(..., alias="event_id", min_length=1, max_length=500),
+    db: AsyncSession = Depends(get_read_db),
+    principal: auth.Principal = Depends(auth.verify_token)
+):
+    """Registration and check-in totals for several events, e.g. ``?event_id=1&event_id=2``.
+
+    Unknown event ids are left out of the result.
+    """
+    return await crud.get_event_stats(db, event_ids)
+
+
+@app.get("/event/{event_id}/stats", response_model=schemas.EventStats)
+async def event_stats(
+    event_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    principal: auth.Principal = Depends(auth.verify_token)
+):
+    """Registered, checked-in and remaining places, kept up to date on every write."""
+    stats = await crud.get_event_stats(db, [event_id])
+    if not stats:
+        raise HTTPException(status_code=404, detail="Event not found")
+    return stats[0]
+
+
+@app.get("/event/{event_id}/stats/checkins", response_model=List[schemas.CheckinBucket])
+async def event_checkin_series(
+    event_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_read_db),
+    principal: auth.Principal = Depends(auth.verify_token)
+):
+    """Check-ins per minute between ``since`` (default: an hour ago) and ``until`` (default: now).
+
+    Minutes without check-ins are omitted.
+    """
+    until = until or datetime.now(timezone.utc)
+    since = since or until - timedelta(hours=1)
+    return await crud.get_checkin_series(db, event_id, since, until)
+
+
+@app.get("/event/{event_id}/feed")
+async def event_feed(
+    event_id: int,
+    since: Optional[int] = Query(None, ge=0),
+    timeout: float = Query(feed.FEED_MAX_SECONDS, ge=0, le=feed.FEED_MAX_SECONDS),
+    last_event_id: Optional[int] = Header(None, ge=0),
+    db: AsyncSession = Depends(get_read_db),
+    principal: auth.Principal = Depends(auth.verify_token)
+):
+    """Server-Sent Events stream of the event's registrations and check-ins.
+
+    Pass the last ``seq`` seen as ``since`` (or let EventSource send
+    ``Last-Event-ID``) to receive what was published in between. The
+    response ends after ``timeout`` seconds; with 0 it only catches up.
+    """
+    if await crud.get_event(db, event_id) is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    subscription = feed.broker.subscribe(event_id, since if since is not None else last_event_id)
+    return StreamingResponse(feed.sse_events(subscription, timeout), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.websocket("/event/{event_id}/feed/ws")
+async def event_feed_socket(
+    websocket: WebSocket,
+    event_id: int,
+    token: str,
+    since: Optional[int] = Query(None, ge=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """WebSocket twin of ``GET /event/{event_id}/feed``; browsers cannot set
+    headers on a WebSocket, so the bearer token comes as ``token``."""
+    try:
+        await auth.verify_token(token, db)
+        found = await crud.get_event(db, event_id) is not None
+    except HTTPException:
+        found = None
+    finally:
+        # The connection may stay open for hours; it needs no session
+        await db.close()
+    if not found:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION,
+                              reason="Not authenticated" if found is None else "Event not found")
+        return
+    await websocket.accept()
+    await feed.relay_websocket(websocket, feed.broker.subscribe(event_id, since))
+
+
+@app.get("/events/search", response_model=List[schemas.Event])
+async def search_events(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    status: Optional[str] = None,
+    location: Optional[str] = None,
+    date: Optional[datetime] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Search event names, descriptions and locations, best match first.
+
+    Every word in ``q`` has to match; end a word with ``*`` to match it as a
+    prefix. The ``status``, ``location`` and ``date`` filters work as on
+    ``GET /events``.
+    """
+    if search.match_expression(q) is None:
+        return []
+    cache_key = await response_cache.key("events", request.url.path, {
+        "q": q, "status": status, "location": location,
+        "date": date.isoformat() if date else None, "limit": limit, "offset": offset})
+    entry = None if replicas.pinned_read(request) else await response_cache.get(cache_key)
+    if entry is None:
+        query = _filter_events(search.events_query(db.bind.dialect.name, q), status, location, date)
+        query = query.with_only_columns(*serialization.schema_columns(models.Event, schemas.Event))
+        rows = (await db.execute(query.offset(offset).limit(limit))).all()
+        entry = await response_cache.put(
+            cache_key, serialization.dump_rows(serialization.column_names(query), rows))
+    return entry.to_response(request)
 
 @app.get("/event/{event_id}/attendees", response_model=List[schemas.Attendee])
 async def list_attendees(
     event_id: int,
+    request: Request,
     check_in_status: Optional[bool] = None,
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[int] = None,
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_read_db)
 ):
 
-    query = db.query(models.Attendee).filter(models.Attendee.event_id == event_id)
+    query = (select(*serialization.schema_columns(models.Attendee, schemas.Attendee))
+             .where(models.Attendee.event_id == event_id))
 
     if check_in_status is not None:
-        query = query.filter(models.Attendee.check_in_status == check_in_status)
+        query = query.where(models.Attendee.check_in_status == check_in_status)
+
+    return await _keyset_page(
+        db, request, query, models.Attendee.attendee_id, limit, after,
+        response_format, f"attendees:{event_id}", {"check_in_status": check_in_status})
+
+
+def _export_response(db, query, export_format: str, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        export.stream_rows(db, query, export_format),
+        media_type=export.MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'},
+    )
+
+
+@app.get("/events/export")
+async def export_events(
+    status: Optional[str] = None,
+    location: Optional[str] = None,
+    export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    db: AsyncSession = Depends(get_read_db),
+    principal: auth.Principal = Depends(auth.verify_token)
+):
+    """Stream every matching event as CSV or NDJSON, ordered by ``event_id``."""
+    return _export_response(db, export.events_query(status, location), export_format, "events")
+
+
+@app.get("/event/{event_id}/attendees/export")
+async def export_attendees(
+    event_id: int,
+    check_in_status: Optional[bool] = None,
+    export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    db: AsyncSession = Depends(get_read_db),
+    principal: auth.Principal = Depends(auth.verify_token)
+):
+    """Stream an event's attendees as CSV or NDJSON, ordered by ``attendee_id``.
 
-    return query.all()
\ No newline at end of file
+    The CSV carries ``attendee_id`` and ``email`` columns, so a filtered
+    export can be fed straight back into the bulk check-in endpoint.
+    """
+    return _export_response(db, export.attendees_query(event_id, check_in_status),
+                            export_format, f"event-{event_id}-attendees")
@@ -0,0 +1,100 @@
+"""Maintenance commands for existing databases.
+
+Usage: ``python -m app.manage migrate [--to N]|downgrade --to N|migration-status|``
+``recount-attendees|rebuild-stats|rebuild-search-index``
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import text
+
+from . import crud, migrations
+from .database import AsyncSessionLocal, async_engine, engine
+
+
+def migrate(args):
+    with engine.connect() as conn:
+        for migration in migrations.upgrade(conn, args.to):
+            print(f"Applied {migration.version}: {migration.name}")
+        print(f"Schema is at version {max(migrations.applied(conn), default=0)}")
+
+
+def downgrade(args):
+    if args.to is None:
+        raise SystemExit("downgrade needs --to VERSION")
+    with engine.connect() as conn:
+        for migration in migrations.downgrade(conn, args.to):
+            print(f"Reversed {migration.version}: {migration.name}")
+        print(f"Schema is at version {max(migrations.applied(conn), default=0)}")
+
+
+def migration_status(args):
+    with engine.connect() as conn:
+        done = set(migrations.applied(conn))
+    for migration in migrations.MIGRATIONS:
+        print(f"[{'x' if migration.version in done else ' '}] {migration.version}: {migration.name}")
+
+
+def _upgrade_schema():
+    with engine.connect() as conn:
+        migrations.upgrade(conn)
+
+
+async def _recount_attendees():
+    try:
+        async with AsyncSessionLocal() as db:
+            return await crud.recount_attendees(db)
+    finally:
+        await async_engine.dispose()
+
+
+def recount_attendees(args):
+    _upgrade_schema()
+    fixed = asyncio.run(_recount_attendees())
+    print(f"Recounted attendees, {fixed} event(s) corrected")
+
+
+async def _rebuild_stats():
+    try:
+        async with AsyncSessionLocal() as db:
+            await crud.recount_attendees(db)
+            return await crud.rebuild_event_stats(db)
+    finally:
+        await async_engine.dispose()
+
+
+def rebuild_stats(args):
+    _upgrade_schema()
+    result = asyncio.run(_rebuild_stats())
+    print(f"Rebuilt event stats, {result['checked_in_count']} check-in total(s) corrected, "
+          f"{result['buckets']} minute bucket(s) written")
+
+
+def rebuild_search_index(args):
+    _upgrade_schema()
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO events_fts(events_fts) VALUES ('rebuild')"))
+    print("Rebuilt the event search index")
+
+
+COMMANDS = {
+    "migrate": migrate,
+    "downgrade": downgrade,
+    "migration-status": migration_status,
+    "recount-attendees": recount_attendees,
+    "rebuild-stats": rebuild_stats,
+    "rebuild-search-index": rebuild_search_index,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.manage")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    parser.add_argument("--to", type=int, metavar="VERSION",
+                        help="schema version to migrate or downgrade to (migrate defaults to the latest)")
+    args = parser.parse_args(argv)
+    COMMANDS[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
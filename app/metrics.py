@@ -0,0 +1,206 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+A deliberately small registry: counters, gauges and histograms with
+positional label values, rendered on demand by ``GET /metrics``. Updates are
+plain dict operations on the event loop, so recording costs a few
+microseconds and needs no client library or collector to test.
+"""
+import time
+from bisect import bisect_left
+from typing import Dict, Sequence, Tuple
+
+# Request and query latencies span sub-millisecond cache hits to slow exports
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def get(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in sorted(self._values.items()):
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        state = self._values.get(labels)
+        if state is None:
+            # Per-bucket (not yet cumulative) counts, the +Inf bucket, sum
+            state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def get(self, *labels):
+        """``(count, sum)`` of the observations recorded under ``labels``."""
+        state = self._values.get(labels)
+        return (sum(state[:-1]), state[-1]) if state else (0, 0.0)
+
+    def samples(self):
+        bucket_names = self.labelnames + ("le",)
+        for labels, state in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state):
+                cumulative += count
+                yield (f"{self.name}_bucket",
+                       _format_labels(bucket_names, labels + (_format_value(bound),)), cumulative)
+            plain = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum", plain, state[-1]
+            yield f"{self.name}_count", plain, cumulative
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# HTTP
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total", "Requests served, by route template and status code.",
+    ("method", "route", "status")))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Time from request start to the last body byte.",
+    ("method", "route")))
+HTTP_IN_PROGRESS = REGISTRY.register(Gauge(
+    "http_requests_in_progress", "Requests currently being served."))
+
+# Database
+DB_QUERY_LATENCY = REGISTRY.register(Histogram(
+    "db_query_duration_seconds", "Statement execution time, by SQL verb.", ("statement",)))
+DB_POOL_CHECKOUTS = REGISTRY.register(Counter(
+    "db_pool_checkouts_total", "Connections handed out by the pool."))
+DB_POOL_CHECKED_OUT = REGISTRY.register(Gauge(
+    "db_pool_checked_out", "Connections currently in use."))
+DB_POOL_CONNECTS = REGISTRY.register(Counter(
+    "db_pool_connections_opened_total", "New database connections opened by the pool."))
+DB_POOL_WAITS = REGISTRY.register(Counter(
+    "db_pool_waits_total", "Checkouts that found the pool exhausted and had to wait."))
+DB_POOL_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "db_pool_wait_seconds", "Time spent waiting for a connection when the pool was exhausted."))
+
+# Domain
+REGISTRATIONS = REGISTRY.register(Counter(
+    "attendee_registrations_total", "Attendees registered, by path.", ("source",)))
+REGISTRATION_REJECTIONS = REGISTRY.register(Counter(
+    "attendee_registration_rejections_total", "Registrations turned away, by reason.",
+    ("reason",)))
+WAITLIST = REGISTRY.register(Counter(
+    "waitlist_entries_total", "Waitlist entries added and promoted to attendees.", ("outcome",)))
+CHECKINS = REGISTRY.register(Counter(
+    "attendee_checkins_total", "Attendees checked in, by path.", ("source",)))
+BULK_CHECKIN_ROWS = REGISTRY.register(Counter(
+    "bulk_checkin_rows_total", "Bulk check-in rows processed, by outcome.", ("outcome",)))
+
+STATEMENT_VERBS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+
+def statement_verb(statement: str) -> str:
+    words = statement.split(None, 1)
+    verb = words[0].upper() if words else ""
+    return verb if verb in STATEMENT_VERBS else "OTHER"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency and in-flight requests.
+
+    Routes are labelled by their template (``/event/{event_id}``), never the
+    raw path, to keep label cardinality bounded; unmatched paths share one
+    label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_PROGRESS.dec()
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "<unmatched>"
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, template, str(status_code))
+            HTTP_LATENCY.observe(elapsed, method, template)
@@ -0,0 +1,315 @@
+"""Versioned, reversible schema migrations.
+
+Every migration has a version, an ``upgrade`` and a ``downgrade``; the
+versions applied to a database are recorded in ``schema_migrations``. Apply
+them with ``python -m app.manage migrate`` (the app also does on startup,
+see ``MIGRATE_ON_STARTUP``) and step back with
+``python -m app.manage downgrade --to N``.
+
+Migration 1 creates whatever table is missing from the current models, so
+a new database is complete after it. Each later migration checks what is
+already there before changing anything, which brings databases created by
+earlier versions of the app, with no ``schema_migrations`` at all, up to
+date without redoing what a new database already has.
+
+Work that grows with table size stays off long locks: backfills run over
+key ranges of ``MIGRATION_BATCH_SIZE`` rows with a commit after each, and
+PostgreSQL builds indexes ``CONCURRENTLY``. A migration interrupted part
+way through is simply run again.
+"""
+import os
+from datetime import datetime, timezone
+from typing import Callable, List, NamedTuple, Optional
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, delete, inspect, insert, select, text
+from sqlalchemy.schema import CreateTable
+
+from . import models
+from .database import Base
+
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "10000"))
+# With several workers starting at once, set this to 0 and run
+# `python -m app.manage migrate` before starting them instead
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1") == "1"
+
+schema_migrations = Table(
+    "schema_migrations", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    upgrade: Callable
+    downgrade: Callable
+
+
+def _columns(conn, table: str) -> set:
+    return {column["name"] for column in inspect(conn).get_columns(table)}
+
+
+def _add_column(conn, table: str, definition: str):
+    if definition.split()[0] not in _columns(conn, table):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {definition}"))
+
+
+def _drop_column(conn, table: str, name: str):
+    if name in _columns(conn, table):
+        conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {name}"))
+
+
+def _has_index(conn, table: str, name: str) -> bool:
+    inspector = inspect(conn)
+    return name in ({index["name"] for index in inspector.get_indexes(table)}
+                    | {constraint["name"] for constraint in inspector.get_unique_constraints(table)})
+
+
+def _outside_transaction(conn, statement: str):
+    # CONCURRENTLY refuses to run inside a transaction block
+    conn.commit()
+    conn.execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        conn.execute(text(statement))
+        conn.commit()
+    finally:
+        conn.execution_options(isolation_level=conn.default_isolation_level)
+
+
+def _create_index(conn, name: str, table: str, columns: str, unique: bool = False):
+    if _has_index(conn, table, name):
+        return
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    if conn.dialect.name == "postgresql":
+        # Writes to the table carry on while the index builds
+        _outside_transaction(conn, f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})")
+    else:
+        conn.execute(text(f"CREATE {kind} IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def _drop_index(conn, name: str, table: str):
+    if name not in {index["name"] for index in inspect(conn).get_indexes(table)}:
+        return
+    if conn.dialect.name == "postgresql":
+        _outside_transaction(conn, f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    else:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def _backfill(conn, table: str, key: str, assignment: str):
+    """``UPDATE table SET assignment`` over ranges of ``key``, committing after each."""
+    low, high = conn.execute(text(f"SELECT min({key}), max({key}) FROM {table}")).one()
+    if low is None:
+        return
+    for start in range(low - 1, high, MIGRATION_BATCH_SIZE):
+        conn.execute(text(f"UPDATE {table} SET {assignment} WHERE {key} > :start AND {key} <= :end"),
+                     {"start": start, "end": start + MIGRATION_BATCH_SIZE})
+        conn.commit()
+
+
+def _create_tables(conn):
+    Base.metadata.create_all(conn)
+
+
+def _drop_tables(conn):
+    Base.metadata.drop_all(conn)
+
+
+def _add_attendee_count(conn):
+    _add_column(conn, "events", "attendee_count INTEGER NOT NULL DEFAULT 0")
+    _backfill(conn, "events", "event_id", "attendee_count = "
+              "(SELECT count(*) FROM attendees WHERE attendees.event_id = events.event_id)")
+
+
+def _drop_attendee_count(conn):
+    _drop_column(conn, "events", "attendee_count")
+
+
+# (name, table, columns) of the indexes behind the list filters and check-in lookups
+FILTER_INDEXES = [
+    ("ix_events_status_event_id", "events", "status, event_id"),
+    ("ix_events_location_event_id", "events", "location, event_id"),
+    ("ix_events_start_time", "events", "start_time"),
+    ("ix_events_end_time", "events", "end_time"),
+    ("ix_attendees_event_id_attendee_id", "attendees", "event_id, attendee_id"),
+    ("ix_attendees_event_id_check_in_status", "attendees", "event_id, check_in_status, attendee_id"),
+]
+
+
+def _add_filter_indexes(conn):
+    # The first schema made emails unique across all events
+    _drop_index(conn, "ix_attendees_email", "attendees")
+    _create_index(conn, "uq_attendees_event_id_email", "attendees", "event_id, email", unique=True)
+    for name, table, columns in FILTER_INDEXES:
+        _create_index(conn, name, table, columns)
+
+
+def _drop_filter_indexes(conn):
+    for name, table, _ in reversed(FILTER_INDEXES):
+        _drop_index(conn, name, table)
+    # A table-level constraint on new databases; only the index form can go
+    _drop_index(conn, "uq_attendees_event_id_email", "attendees")
+    # Fails, leaving the database as it was, once an email is registered for two events
+    _create_index(conn, "ix_attendees_email", "attendees", "email", unique=True)
+
+
+EVENT_SEARCH_TRIGGERS = ["events_fts_insert", "events_fts_delete", "events_fts_update"]
+
+
+def _add_event_search(conn):
+    if conn.dialect.name != "sqlite":
+        return
+    created = "events_fts" not in inspect(conn).get_table_names()
+    for statement in models.EVENT_SEARCH_DDL:
+        conn.execute(text(statement))
+    if created:
+        conn.execute(text("INSERT INTO events_fts(events_fts) VALUES ('rebuild')"))
+
+
+def _drop_event_search(conn):
+    if conn.dialect.name != "sqlite":
+        return
+    for trigger in EVENT_SEARCH_TRIGGERS:
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+    conn.execute(text("DROP TABLE IF EXISTS events_fts"))
+
+
+def _add_checkin_stats(conn):
+    # Earlier check-ins have no time and stay out of the per-minute buckets
+    _add_column(conn, "attendees", "checked_in_at TIMESTAMP")
+    _add_column(conn, "events", "checked_in_count INTEGER NOT NULL DEFAULT 0")
+    models.CheckinBucket.__table__.create(conn, checkfirst=True)
+    _backfill(conn, "events", "event_id", "checked_in_count = (SELECT count(*) FROM attendees "
+              "WHERE attendees.event_id = events.event_id AND attendees.check_in_status)")
+
+
+def _drop_checkin_stats(conn):
+    models.CheckinBucket.__table__.drop(conn, checkfirst=True)
+    _drop_column(conn, "events", "checked_in_count")
+    _drop_column(conn, "attendees", "checked_in_at")
+
+
+def _add_registration_options(conn):
+    for name in ("registration_queue", "waitlist"):
+        _add_column(conn, "events", f"{name} BOOLEAN NOT NULL DEFAULT false")
+    models.WaitlistEntry.__table__.create(conn, checkfirst=True)
+
+
+def _drop_registration_options(conn):
+    models.WaitlistEntry.__table__.drop(conn, checkfirst=True)
+    for name in ("waitlist", "registration_queue"):
+        _drop_column(conn, "events", name)
+
+
+def _has_autoincrement(conn, table: str) -> bool:
+    sql = conn.scalar(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                      {"name": table})
+    return "AUTOINCREMENT" in sql.upper()
+
+
+def _rebuild_attendees(conn, autoincrement: bool):
+    """Copy ``attendees`` into a new table made from the model, with or without AUTOINCREMENT.
+
+    SQLite cannot add AUTOINCREMENT to an existing table. The copy keeps the
+    ids, and SQLite starts the sequence after the highest of them.
+    """
+    metadata = MetaData()
+    models.Event.__table__.to_metadata(metadata)
+    table = models.Attendee.__table__.to_metadata(metadata, name="attendees_rebuilt")
+    table.dialect_options["sqlite"]["autoincrement"] = autoincrement
+    if not autoincrement:
+        # The form migration 3 gives older databases, which its downgrade can drop
+        table.constraints -= {c for c in table.constraints if c.name == "uq_attendees_event_id_email"}
+    columns = ", ".join(column.name for column in table.columns)
+    conn.execute(CreateTable(table))
+    conn.execute(text(f"INSERT INTO attendees_rebuilt ({columns}) SELECT {columns} FROM attendees"))
+    conn.execute(text("DROP TABLE attendees"))
+    conn.execute(text("ALTER TABLE attendees_rebuilt RENAME TO attendees"))
+    for index in models.Attendee.__table__.indexes:
+        index.create(conn, checkfirst=True)
+    if not autoincrement:
+        _create_index(conn, "uq_attendees_event_id_email", "attendees", "event_id, email", unique=True)
+
+
+def _add_attendee_autoincrement(conn):
+    # Other databases never hand out a sequence value twice
+    if conn.dialect.name == "sqlite" and not _has_autoincrement(conn, "attendees"):
+        _rebuild_attendees(conn, autoincrement=True)
+
+
+def _drop_attendee_autoincrement(conn):
+    if conn.dialect.name == "sqlite" and _has_autoincrement(conn, "attendees"):
+        _rebuild_attendees(conn, autoincrement=False)
+
+
+MIGRATIONS = [
+    Migration(1, "create tables", _create_tables, _drop_tables),
+    Migration(2, "events.attendee_count", _add_attendee_count, _drop_attendee_count),
+    Migration(3, "filter indexes and per-event email uniqueness", _add_filter_indexes, _drop_filter_indexes),
+    Migration(4, "event search index", _add_event_search, _drop_event_search),
+    Migration(5, "check-in aggregates", _add_checkin_stats, _drop_checkin_stats),
+    Migration(6, "registration queue and waitlist", _add_registration_options, _drop_registration_options),
+    Migration(7, "attendee ids are never reused", _add_attendee_autoincrement, _drop_attendee_autoincrement),
+]
+LATEST = MIGRATIONS[-1].version
+
+
+def applied(conn) -> List[int]:
+    """Versions applied to the database behind ``conn``, in order."""
+    if not inspect(conn).has_table(schema_migrations.name):
+        return []
+    return list(conn.scalars(select(schema_migrations.c.version).order_by(schema_migrations.c.version)))
+
+
+def _run(conn, migrations: List[Migration], step: Callable):
+    for migration in migrations:
+        try:
+            step(migration)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return migrations
+
+
+def upgrade(conn, target: Optional[int] = None) -> List[Migration]:
+    """Apply the migrations not yet applied, up to ``target`` (default: all).
+
+    Takes a sync ``Connection``; returns the migrations that ran.
+    """
+    schema_migrations.create(conn, checkfirst=True)
+    conn.commit()
+    done = set(applied(conn))
+    pending = [m for m in MIGRATIONS
+               if m.version not in done and (target is None or m.version <= target)]
+
+    def step(migration):
+        migration.upgrade(conn)
+        conn.execute(insert(schema_migrations).values(
+            version=migration.version, name=migration.name,
+            applied_at=datetime.now(timezone.utc).replace(tzinfo=None)))
+
+    return _run(conn, pending, step)
+
+
+def downgrade(conn, target: int) -> List[Migration]:
+    """Reverse the applied migrations above ``target``, newest first."""
+    done = set(applied(conn))
+    to_reverse = [m for m in reversed(MIGRATIONS) if m.version > target and m.version in done]
+
+    def step(migration):
+        migration.downgrade(conn)
+        conn.execute(delete(schema_migrations).where(schema_migrations.c.version == migration.version))
+
+    return _run(conn, to_reverse, step)
+
+
+def check(conn):
+    """Raise when the database behind ``conn`` is missing migrations."""
+    done = set(applied(conn))
+    missing = [m.version for m in MIGRATIONS if m.version not in done]
+    if missing:
+        raise RuntimeError(f"Database schema is missing migration(s) {missing}; "
+                           "run `python -m app.manage migrate`")
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, DateTime, Enum, ForeignKey, Integer, String
+from sqlalchemy import DDL, Boolean, Column, DateTime, Enum, ForeignKey, Index, Integer, String, UniqueConstraint, event
 from sqlalchemy.orm import relationship
 from .database import Base
 import enum
@@ -29,10 +29,26 @@ class Event(Base):
     end_time = Column(DateTime)
     location = Column(String)
     max_attendees = Column(Integer)
+    # Maintained by crud.register_attendee; repair with `python -m app.manage recount-attendees`
+    attendee_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Maintained on check-in; repair with `python -m app.manage rebuild-stats`
+    checked_in_count = Column(Integer, nullable=False, default=0, server_default="0")
     status = Column(Enum(EventStatus), default=EventStatus.SCHEDULED)
+    # Opt-ins for ticket drops: registrations go through app.registration's
+    # group-commit queue, and overflow joins the waitlist instead of failing
+    registration_queue = Column(Boolean, nullable=False, default=False, server_default="0")
+    waitlist = Column(Boolean, nullable=False, default=False, server_default="0")
 
     attendees = relationship("Attendee", back_populates="event")
 
+    # Listing filters; event_id is appended so keyset pages stay index-ordered
+    __table_args__ = (
+        Index("ix_events_status_event_id", "status", "event_id"),
+        Index("ix_events_location_event_id", "location", "event_id"),
+        Index("ix_events_start_time", "start_time"),
+        Index("ix_events_end_time", "end_time"),
+    )
+
 
 class Attendee(Base):
     __tablename__ = "attendees"
@@ -40,9 +56,74 @@ class Attendee(Base):
     attendee_id = Column(Integer, primary_key=True, index=True)
     first_name = Column(String)
     last_name = Column(String)
-    email = Column(String, unique=True, index=True)
+    email = Column(String)
     phone_number = Column(String)
     event_id = Column(Integer, ForeignKey("events.event_id"))
     check_in_status = Column(Boolean, default=False)
+    checked_in_at = Column(DateTime)
 
     event = relationship("Event", back_populates="attendees")
+
+    __table_args__ = (
+        # An email registers once per event; also serves duplicate and bulk check-in lookups
+        UniqueConstraint("event_id", "email", name="uq_attendees_event_id_email"),
+        # Check-in and attendee pages within an event
+        Index("ix_attendees_event_id_attendee_id", "event_id", "attendee_id"),
+        Index("ix_attendees_event_id_check_in_status", "event_id", "check_in_status", "attendee_id"),
+        # Cancelled registrations free their row; SQLite must not hand the id to the next attendee
+        {"sqlite_autoincrement": True},
+    )
+
+
+class WaitlistEntry(Base):
+    """Someone waiting for a seat; promoted to an attendee, oldest first, as seats free up."""
+    __tablename__ = "waitlist_entries"
+
+    entry_id = Column(Integer, primary_key=True)
+    event_id = Column(Integer, ForeignKey("events.event_id"), nullable=False)
+    first_name = Column(String)
+    last_name = Column(String)
+    email = Column(String)
+    phone_number = Column(String)
+    created_at = Column(DateTime)
+
+    __table_args__ = (
+        UniqueConstraint("event_id", "email", name="uq_waitlist_entries_event_id_email"),
+        Index("ix_waitlist_entries_event_id_entry_id", "event_id", "entry_id"),
+    )
+
+
+class CheckinBucket(Base):
+    """Check-ins per event per minute (UTC), counted as they happen."""
+    __tablename__ = "checkin_buckets"
+
+    event_id = Column(Integer, ForeignKey("events.event_id"), primary_key=True)
+    minute = Column(DateTime, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+# Full-text index over the searchable event columns (SQLite FTS5). It is an
+# external-content table: the text stays in ``events`` and triggers keep the
+# index in step. Status and attendee counter updates leave it alone.
+EVENT_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5("
+    "name, description, location, content='events', content_rowid='event_id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events BEGIN "
+    "INSERT INTO events_fts(rowid, name, description, location) "
+    "VALUES (new.event_id, new.name, new.description, new.location); END",
+    "CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events BEGIN "
+    "INSERT INTO events_fts(events_fts, rowid, name, description, location) "
+    "VALUES ('delete', old.event_id, old.name, old.description, old.location); END",
+    "CREATE TRIGGER IF NOT EXISTS events_fts_update AFTER UPDATE OF name, description, location "
+    "ON events BEGIN "
+    "INSERT INTO events_fts(events_fts, rowid, name, description, location) "
+    "VALUES ('delete', old.event_id, old.name, old.description, old.location); "
+    "INSERT INTO events_fts(rowid, name, description, location) "
+    "VALUES (new.event_id, new.name, new.description, new.location); END",
+]
+
+for statement in EVENT_SEARCH_DDL:
+    event.listen(Event.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(Event.__table__, "before_drop",
+             DDL("DROP TABLE IF EXISTS events_fts").execute_if(dialect="sqlite"))
@@ -0,0 +1,135 @@
+"""Per-request accounting of the SQL a request issues.
+
+Engine hooks installed by ``database.configure_engine`` feed the
+``QueryStats`` of the request being served, found through a context
+variable, so it works the same for the async and the blocking sessions.
+``QueryStatsMiddleware`` logs every request's totals and, with
+``QUERY_STATS_HEADER=1``, also returns them in an ``X-Query-Stats`` header.
+
+Background writers that batch work for several requests count each batch
+with ``collect`` and ``add`` its totals to every request it served.
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# Return totals in an X-Query-Stats response header; meant for debugging
+QUERY_STATS_HEADER = os.getenv("QUERY_STATS_HEADER", "0") == "1"
+# Requests issuing more statements than this are logged as warnings
+QUERY_STATS_WARN_STATEMENTS = int(os.getenv("QUERY_STATS_WARN_STATEMENTS", "25"))
+
+logger = logging.getLogger("app.querystats")
+
+
+class QueryStats:
+    __slots__ = ("statements", "commits", "rows", "seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.commits = 0
+        # Rows returned by buffered cursors, plus rows affected by DML
+        self.rows = 0
+        self.seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return {"statements": self.statements, "commits": self.commits,
+                "rows": self.rows, "db_ms": round(self.seconds * 1000, 3)}
+
+    def add(self, other: "QueryStats"):
+        self.statements += other.statements
+        self.commits += other.commits
+        self.rows += other.rows
+        self.seconds += other.seconds
+
+    def header(self) -> str:
+        return "; ".join(f"{key}={value}" for key, value in self.as_dict().items())
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current() -> Optional[QueryStats]:
+    return _current.get()
+
+
+@contextmanager
+def collect():
+    """Count the statements run inside the block on a ``QueryStats`` of their own."""
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def _rows(cursor) -> int:
+    # The asyncio adapters buffer the whole result at execute time; plain
+    # DBAPI cursors only report affected rows up front
+    buffered = getattr(cursor, "_rows", None)
+    if cursor.description is not None and buffered is not None:
+        return len(buffered)
+    return max(cursor.rowcount, 0)
+
+
+def record_statement(cursor, seconds: float):
+    stats = _current.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.seconds += seconds
+        stats.rows += _rows(cursor)
+
+
+def record_commit():
+    stats = _current.get()
+    if stats is not None:
+        stats.commits += 1
+
+
+class QueryStatsMiddleware:
+    """ASGI middleware giving each HTTP request its own ``QueryStats``.
+
+    The header carries what was executed before the response started;
+    statements run while a streaming body is sent only reach the log.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and QUERY_STATS_HEADER:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-query-stats", stats.header().encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", None) or scope["path"]
+            level = logging.WARNING if stats.statements > QUERY_STATS_WARN_STATEMENTS else logging.DEBUG
+            if logger.isEnabledFor(level):
+                logger.log(level, "%s %s statements=%d commits=%d rows=%d db_ms=%.3f",
+                           scope["method"], route, stats.statements, stats.commits, stats.rows,
+                           stats.seconds * 1000,
+                           extra={"method": scope["method"], "route": route,
+                                  "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                                  **stats.as_dict()})
+
+
+def parse_header(value: str) -> dict:
+    """Turn an ``X-Query-Stats`` header back into numbers, for tests and tooling."""
+    pairs = (item.split("=", 1) for item in value.split("; "))
+    return {key: float(number) if "." in number else int(number) for key, number in pairs}
@@ -0,0 +1,118 @@
+"""Group-commit registration queue for events that opt in with ``registration_queue``.
+
+During a ticket drop thousands of signups race for the same event row, and
+one transaction each means they mostly wait on each other's write locks.
+Queued events instead collect concurrent signups per event; a single writer
+task per event admits them in arrival order, ``REGISTRATION_BATCH_SIZE`` at
+a time, with ``crud.register_batch``, one transaction per batch. Every
+caller awaits the outcome of its own registration, and the queries of its
+batch count towards its request.
+"""
+import asyncio
+import contextvars
+import os
+import time
+from collections import deque
+
+from fastapi import HTTPException
+
+from . import crud, querystats
+from .database import open_session
+
+REGISTRATION_BATCH_SIZE = int(os.getenv("REGISTRATION_BATCH_SIZE", "200"))
+# How long a writer lingers for more signups before committing a batch
+REGISTRATION_BATCH_WAIT_MS = float(os.getenv("REGISTRATION_BATCH_WAIT_MS", "2"))
+# How long this worker remembers that an event is queued
+REGISTRATION_QUEUE_RECHECK_SECONDS = float(os.getenv("REGISTRATION_QUEUE_RECHECK_SECONDS", "30"))
+
+
+class RegistrationQueues:
+    def __init__(self, session_factory=open_session, batch_size: int = REGISTRATION_BATCH_SIZE,
+                 batch_wait: float = REGISTRATION_BATCH_WAIT_MS / 1000,
+                 recheck_seconds: float = REGISTRATION_QUEUE_RECHECK_SECONDS):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.recheck_seconds = recheck_seconds
+        # event_id -> when to stop assuming the event is queued
+        self._queued = {}
+        self._pending = {}
+        self._writers = {}
+        self.batches = 0
+
+    def handles(self, event_id: int) -> bool:
+        expires = self._queued.get(event_id)
+        if expires is None:
+            return False
+        if expires <= time.monotonic():
+            del self._queued[event_id]
+            return False
+        return True
+
+    def remember(self, event_id: int, queued: bool = True):
+        if queued:
+            self._queued[event_id] = time.monotonic() + self.recheck_seconds
+        else:
+            self._queued.pop(event_id, None)
+
+    async def submit(self, event_id: int, attendee):
+        """Queue ``attendee`` for ``event_id`` and wait for their own outcome."""
+        done = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(event_id, deque()).append((attendee, done, querystats.current()))
+        if event_id not in self._writers:
+            # Outlives the request that starts it, so it gets none of its context
+            self._writers[event_id] = asyncio.create_task(self._write(event_id), context=contextvars.Context())
+        outcome = await done
+        if isinstance(outcome, HTTPException):
+            raise outcome
+        return outcome
+
+    async def _write(self, event_id: int):
+        pending = self._pending[event_id]
+        try:
+            while pending:
+                if len(pending) < self.batch_size and self.batch_wait > 0:
+                    await asyncio.sleep(self.batch_wait)
+                batch = [pending.popleft() for _ in range(min(self.batch_size, len(pending)))]
+                db = self.session_factory()
+                with querystats.collect() as used:
+                    try:
+                        outcomes = await crud.register_batch(db, event_id, [a for a, _, _ in batch])
+                    except Exception as e:
+                        outcomes = [e] * len(batch)
+                    finally:
+                        await db.close()
+                self.batches += 1
+                for (_, done, stats), outcome in zip(batch, outcomes):
+                    if stats is not None:
+                        stats.add(used)
+                    # A caller that went away has nobody to tell
+                    if not done.done():
+                        if isinstance(outcome, Exception) and not isinstance(outcome, HTTPException):
+                            done.set_exception(outcome)
+                        else:
+                            done.set_result(outcome)
+        finally:
+            del self._writers[event_id]
+            if not pending:
+                del self._pending[event_id]
+
+
+async def register(db, event_id: int, attendee):
+    """Register ``attendee`` directly, or through the queue when the event has one.
+
+    Returns the registered attendee or a ``schemas.WaitlistPosition``.
+    """
+    if queues.handles(event_id):
+        return await queues.submit(event_id, attendee)
+    outcome = await crud.register_attendee(db, event_id, attendee)
+    if outcome is None:
+        queues.remember(event_id)
+        # The queue's writer needs a connection of its own; waiting on it
+        # while holding this one would drain the pool under load
+        await db.close()
+        return await queues.submit(event_id, attendee)
+    return outcome
+
+
+queues = RegistrationQueues()
@@ -0,0 +1,205 @@
+"""Read replicas and the routing of request sessions between them and the primary.
+
+Handlers that only read take ``get_read_db``; everything that writes keeps
+``get_db``, which always opens a session on the primary. Read sessions go
+round-robin to the replicas in ``DATABASE_REPLICA_URLS`` that passed their
+last health check, and to the primary when there are none.
+
+Replicas lag behind the primary, so a client that has just written reads
+from the primary for ``READ_YOUR_WRITES_SECONDS`` afterwards. The pin is
+remembered per client (bearer token, else address) in the worker that took
+the write, and in a cookie so it holds whichever worker serves the next
+read. Pinned reads also skip cached list pages (see ``pinned_read``).
+"""
+import asyncio
+import itertools
+import os
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from fastapi import Depends, Request
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from . import admission, database, metrics, migrations
+from .database import BlockingSession, get_db
+
+# Comma-separated; the same form as DATABASE_URL
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", "5"))
+REPLICA_CHECK_TIMEOUT_SECONDS = float(os.getenv("REPLICA_CHECK_TIMEOUT_SECONDS", "2"))
+# Clients pinned in memory; the least recently pinned are forgotten first
+READ_YOUR_WRITES_MAX_CLIENTS = int(os.getenv("READ_YOUR_WRITES_MAX_CLIENTS", "100000"))
+
+PIN_COOKIE = "read_primary_until"
+READ_METHODS = frozenset(("GET", "HEAD", "OPTIONS"))
+
+DB_READ_SESSIONS = metrics.REGISTRY.register(metrics.Counter(
+    "db_read_sessions_total", "Read sessions opened, by where they were sent.", ("target",)))
+DB_REPLICA_HEALTHY = metrics.REGISTRY.register(metrics.Gauge(
+    "db_replica_healthy", "1 while a read replica passes its health checks.", ("replica",)))
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.name = make_url(url).render_as_string(hide_password=True)
+        if database.DATABASE_MODE == "sync":
+            self.engine = database.make_engine(url)
+            sessions = sessionmaker(autoflush=False, bind=self.engine)
+            self.session_factory = lambda: BlockingSession(sessions())
+        else:
+            self.engine = database.make_async_engine(url)
+            self.session_factory = async_sessionmaker(
+                bind=self.engine, autoflush=False, expire_on_commit=False)
+        # Until a check says otherwise
+        self.healthy = True
+
+    async def check(self) -> bool:
+        """Whether the replica answers, and has every migration this app needs."""
+        db = self.session_factory()
+        try:
+            version = await asyncio.wait_for(
+                db.scalar(select(func.max(migrations.schema_migrations.c.version))),
+                REPLICA_CHECK_TIMEOUT_SECONDS)
+            return version is not None and version >= migrations.LATEST
+        except Exception:
+            return False
+        finally:
+            await db.close()
+
+    async def dispose(self):
+        if isinstance(self.engine, AsyncEngine):
+            await self.engine.dispose()
+        else:
+            self.engine.dispose()
+
+
+class ReadReplicas:
+    """Health-checked round-robin over the read replicas, and the clients pinned to the primary."""
+
+    def __init__(self, urls: List[str] = DATABASE_REPLICA_URLS, window: float = READ_YOUR_WRITES_SECONDS,
+                 check_interval: float = REPLICA_CHECK_INTERVAL_SECONDS,
+                 max_clients: int = READ_YOUR_WRITES_MAX_CLIENTS):
+        self.replicas = [Replica(url) for url in urls]
+        self.window = window
+        self.check_interval = check_interval
+        self.max_clients = max_clients
+        self._turn = itertools.count()
+        self._pins = OrderedDict()
+        self._task = None
+
+    async def check(self):
+        results = await asyncio.gather(*(replica.check() for replica in self.replicas))
+        for replica, healthy in zip(self.replicas, results):
+            replica.healthy = healthy
+            DB_REPLICA_HEALTHY.set(int(healthy), replica.name)
+
+    async def _check_forever(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check()
+
+    async def start(self):
+        if self.replicas:
+            await self.check()
+            self._task = asyncio.create_task(self._check_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            await replica.dispose()
+
+    def pick(self) -> Optional[Replica]:
+        """The next healthy replica in turn, or None when there is none."""
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._turn) % len(healthy)]
+
+    def pin(self, scope) -> float:
+        """Send ``scope``'s client to the primary for the next ``window`` seconds; return until when (epoch)."""
+        key = admission.client_key(scope)
+        self._pins.pop(key, None)
+        self._pins[key] = time.monotonic() + self.window
+        while len(self._pins) > self.max_clients:
+            self._pins.popitem(last=False)
+        return time.time() + self.window
+
+    def pinned(self, request: Request) -> bool:
+        deadline = self._pins.get(admission.client_key(request.scope))
+        if deadline is not None and deadline > time.monotonic():
+            return True
+        try:
+            return float(request.cookies.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+
+readers = ReadReplicas()
+
+
+async def get_read_db(request: Request, primary=Depends(get_db)):
+    """A session for handlers that only read: a replica unless the client has to see its own writes.
+
+    Falls back to the request's primary session (the same one ``get_db``
+    hands out), which is only connected if it is used.
+    """
+    replica = None
+    if not readers.replicas:
+        target = "primary"
+    elif readers.pinned(request):
+        target = "pinned"
+    else:
+        replica = readers.pick()
+        target = "replica" if replica is not None else "primary"
+    DB_READ_SESSIONS.inc(target)
+    request.state.read_target = target
+    if replica is None:
+        yield primary
+        return
+    db = replica.session_factory()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+def pinned_read(request: Request) -> bool:
+    """Whether ``request`` reads from the primary so its client sees its own writes.
+
+    Such a read must not be answered from the response cache, which any
+    other client may have filled from a lagging replica after the write.
+    """
+    return getattr(request.state, "read_target", None) == "pinned"
+
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware pinning a client to the primary after each successful write."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in READ_METHODS or not readers.replicas:
+            await self.app(scope, receive, send)
+            return
+
+        async def pinning_send(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = readers.pin(scope)
+                cookie = f"{PIN_COOKIE}={until:.3f}; Max-Age={max(1, round(readers.window))}; Path=/; HttpOnly"
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, pinning_send)
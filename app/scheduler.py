@@ -0,0 +1,161 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+from sqlalchemy import select
+
+from . import crud, models
+
+logger = logging.getLogger("app.scheduler")
+
+
+def _utc(dt: datetime) -> datetime:
+    # SQLite hands back naive datetimes; they are stored as UTC
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+class EventLifecycleScheduler:
+    """Moves events to ``ongoing`` and ``completed`` as their times pass.
+
+    Upcoming start/end boundaries within ``horizon`` are kept in a heap. When
+    one or more fall due they are applied with set-based UPDATEs, at most
+    ``batch_size`` events per statement. Heap entries are only wake-up hints:
+    the UPDATE re-checks the event's times, so entries left behind by an
+    edited event are harmless.
+    """
+
+    def __init__(self, session_factory, batch_size: int = 500,
+                 horizon: timedelta = timedelta(hours=6), on_transition=None,
+                 retry_delay: float = 1.0):
+        self.session_factory = session_factory
+        # Pause after a failed run, e.g. a locked database or a dropped connection
+        self.retry_delay = retry_delay
+        # Awaited after any batch that changed an event's status
+        self.on_transition = on_transition
+        self.batch_size = batch_size
+        self.horizon = horizon
+        self._heap = []
+        self._horizon_end = None
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.transitions_applied = 0
+        self.last_run_at = None
+        self.last_lag = 0.0
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def schedule(self, event: models.Event):
+        """Track the boundaries of an event that was just created or updated."""
+        if self._horizon_end is None:
+            return
+        for when in (event.start_time, event.end_time):
+            if when is not None and _utc(when) <= self._horizon_end:
+                heapq.heappush(self._heap, (_utc(when), event.event_id))
+        self._wakeup.set()
+
+    def stats(self) -> dict:
+        now = datetime.now(timezone.utc)
+        overdue = (now - self._heap[0][0]).total_seconds() if self._heap else 0.0
+        return {
+            "queue_depth": len(self._heap),
+            "lag_seconds": max(overdue, 0.0),
+            "last_lag_seconds": self.last_lag,
+            "last_run_at": self.last_run_at,
+            "transitions_applied": self.transitions_applied,
+        }
+
+    async def catch_up(self):
+        """Apply every transition that is already due and reload the heap."""
+        now = datetime.now(timezone.utc)
+        db = self.session_factory()
+        try:
+            moved = await crud.apply_status_transitions(db, now)
+            await self._load(db, now)
+        finally:
+            await db.close()
+        await self._applied(moved, now)
+
+    async def _load(self, db, now: datetime):
+        horizon_end = now + self.horizon
+        Event = models.Event
+        starts = select(Event.event_id, Event.start_time).where(
+            Event.status == models.EventStatus.SCHEDULED,
+            Event.start_time > now, Event.start_time <= horizon_end)
+        ends = select(Event.event_id, Event.end_time).where(
+            Event.status.in_([models.EventStatus.SCHEDULED, models.EventStatus.ONGOING]),
+            Event.end_time > now, Event.end_time <= horizon_end)
+        heap = []
+        for query in (starts, ends):
+            for event_id, when in (await db.execute(query)).all():
+                heap.append((_utc(when), event_id))
+        heapq.heapify(heap)
+        self._heap = heap
+        self._horizon_end = horizon_end
+
+    async def run_due(self):
+        """Apply the transitions whose boundaries have passed."""
+        now = datetime.now(timezone.utc)
+        due = set()
+        oldest = None
+        while self._heap and self._heap[0][0] <= now:
+            when, event_id = heapq.heappop(self._heap)
+            oldest = oldest or when
+            due.add(event_id)
+        if not due:
+            return
+        moved = 0
+        db = self.session_factory()
+        try:
+            ids = iter(sorted(due))
+            while batch := list(islice(ids, self.batch_size)):
+                moved += await crud.apply_status_transitions(db, now, batch)
+        finally:
+            await db.close()
+        self.last_lag = (now - oldest).total_seconds()
+        await self._applied(moved, now)
+
+    async def _applied(self, moved: int, now: datetime):
+        self.last_run_at = now
+        self.transitions_applied += moved
+        if moved and self.on_transition is not None:
+            await self.on_transition()
+
+    async def run(self):
+        reload = self._horizon_end is None
+        while True:
+            try:
+                if reload:
+                    await self.catch_up()
+                    reload = False
+                await self.run_due()
+                now = datetime.now(timezone.utc)
+                if now >= self._horizon_end:
+                    reload = True
+                    continue
+                wake_at = min(self._heap[0][0], self._horizon_end) if self._heap else self._horizon_end
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), (wake_at - now).total_seconds())
+                except asyncio.TimeoutError:
+                    pass
+            except Exception:
+                # The failed run already took its entries off the heap; catching
+                # up applies everything overdue and reloads it
+                logger.exception("Event lifecycle run failed, retrying in %.1fs", self.retry_delay)
+                reload = True
+                await asyncio.sleep(self.retry_delay)
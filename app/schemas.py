@@ -16,6 +16,11 @@ def make_aware(dt: datetime, timezone=pytz.UTC):
     return dt
 
 
+def to_utc(dt: datetime) -> datetime:
+    # Stored datetimes are read back as UTC, so other offsets are converted first
+    return make_aware(dt).astimezone(pytz.UTC)
+
+
 class AttendeeBase(BaseModel):
     attendee_id:  Optional[int] = None 
     first_name: str
@@ -45,6 +50,62 @@ class AttendeeResponse(AttendeesCheckIn):
         from_attributes = True
 
 
+class WaitlistPosition(BaseModel):
+    event_id: int
+    entry_id: int
+    email: EmailStr
+    position: int  # 1 is next in line
+    status: str = "waitlisted"
+
+
+class BulkCheckinResult(BaseModel):
+    updated: int
+    already_checked_in: int
+    not_found: List[str]  # attendee_id or email keys with no match in the event
+    malformed: List[int]  # CSV line numbers that carried no usable key
+
+
+class EventStats(BaseModel):
+    event_id: int
+    registered: int
+    checked_in: int
+    capacity: Optional[int] = None
+    remaining: int
+    check_in_rate: float  # checked_in / registered
+
+
+class CheckinBucket(BaseModel):
+    minute: datetime  # start of the minute, UTC
+    count: int
+
+
+class SchedulerStats(BaseModel):
+    queue_depth: int
+    lag_seconds: float
+    last_lag_seconds: float
+    last_run_at: Optional[datetime] = None
+    transitions_applied: int
+
+
+class AttendeeImportRow(BaseModel):
+    row: int  # 1-based position in the uploaded batch
+    email: Optional[str] = None
+    status: str  # created, duplicate, invalid, full or waitlisted
+    attendee_id: Optional[int] = None
+    entry_id: Optional[int] = None  # waitlisted rows only
+    position: Optional[int] = None  # place on the waitlist, 1 is next in line
+    detail: Optional[str] = None
+
+
+class AttendeeImportResult(BaseModel):
+    created: int
+    duplicate: int
+    invalid: int
+    full: int
+    waitlisted: int
+    rows: List[AttendeeImportRow]
+
+
 class UserBase(BaseModel):
     username: str
 
@@ -66,6 +127,8 @@ class EventBase(BaseModel):
     description: str
     location: str
     max_attendees: int
+    registration_queue: bool = False
+    waitlist: bool = False
 
 
 class EventCreate(EventBase):
@@ -74,8 +137,8 @@ class EventCreate(EventBase):
 
     def __init__(self, **data):
         super().__init__(**data)
-        self.start_time = make_aware(self.start_time)
-        self.end_time = make_aware(self.end_time)
+        self.start_time = to_utc(self.start_time)
+        self.end_time = to_utc(self.end_time)
 
 
 class EventUpdate(BaseModel):
@@ -86,13 +149,15 @@ class EventUpdate(BaseModel):
     location: Optional[str] = None
     max_attendees: Optional[int] = None
     status: Optional[EventStatus] = None
+    registration_queue: Optional[bool] = None
+    waitlist: Optional[bool] = None
 
     def __init__(self, **data):
         super().__init__(**data)
         if self.start_time:
-            self.start_time = make_aware(self.start_time)
+            self.start_time = to_utc(self.start_time)
         if self.end_time:
-            self.end_time = make_aware(self.end_time)
+            self.end_time = to_utc(self.end_time)
 
 
 class Event(EventBase):
@@ -0,0 +1,49 @@
+"""Full-text search over event names, descriptions and locations.
+
+On SQLite the ``events_fts`` FTS5 index (see ``models.EVENT_SEARCH_DDL``)
+answers the match and ranks hits with bm25. Other backends fall back to
+unranked substring matching.
+"""
+import re
+from typing import Optional
+
+from sqlalchemy import Integer, and_, column, func, literal_column, or_, select, table
+
+from . import models
+
+events_fts = table("events_fts", column("rowid", Integer))
+_fts = literal_column("events_fts")
+
+# bm25() weights for name, description and location: a word in the name
+# counts most, one in the location more than one buried in the description
+RANK_WEIGHTS = (10.0, 1.0, 5.0)
+
+_WORD = re.compile(r"(\w+)(\*?)")
+
+
+def match_expression(q: str) -> Optional[str]:
+    """Turn free text into an FTS5 query, or None when it has no words.
+
+    Every word has to match; ``word*`` matches as a prefix. Words are quoted,
+    so FTS5 operators and column filters in user input are taken literally.
+    """
+    terms = [f'"{word}"{star}' for word, star in _WORD.findall(q)]
+    return " ".join(terms) or None
+
+
+def events_query(dialect: str, q: str):
+    """Events matching ``q``, best match first."""
+    Event = models.Event
+    if dialect == "sqlite":
+        return (
+            select(Event)
+            .join(events_fts, events_fts.c.rowid == Event.event_id)
+            .where(_fts.match(match_expression(q)))
+            .order_by(func.bm25(_fts, *RANK_WEIGHTS), Event.event_id)
+        )
+    words = [word for word, _ in _WORD.findall(q)]
+    return select(Event).where(and_(*(
+        or_(Event.name.ilike(f"%{word}%"), Event.description.ilike(f"%{word}%"),
+            Event.location.ilike(f"%{word}%"))
+        for word in words
+    ))).order_by(Event.event_id)
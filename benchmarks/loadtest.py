@@ -0,0 +1,438 @@
+"""Load test every API route and report throughput and latency percentiles.
+
+Usage::
+
+    python -m benchmarks.loadtest --events 50 --attendees 200 --concurrency 16
+    python -m benchmarks.loadtest --mode uvicorn --output after.json --baseline before.json
+
+A fresh SQLite database is seeded for every run, so runs are comparable
+across commits. ``--mode asgi`` drives the app in-process through httpx's
+ASGI transport; ``--mode uvicorn`` starts a real server process. Results are
+written as JSON. With ``--baseline`` the run is compared against an earlier
+result file and exits non-zero when a route got slower or started failing.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import httpx
+from sqlalchemy import insert
+
+ROOT = Path(__file__).resolve().parent.parent
+
+LOCATIONS = ["Hall A", "Hall B", "Stadium", "Arena", "Online"]
+USERNAME = "bench"
+PASSWORD = "bench-password"
+# Rows per bulk check-in upload and per import request
+BULK_ROWS = 100
+IMPORT_ROWS = 10
+
+
+@dataclass
+class Dataset:
+    events: int
+    attendees_per_event: int
+    event_ids: List[int] = field(default_factory=list)
+    # Open-capacity event that registration and import scenarios write to
+    registration_event_id: int = 0
+
+    def attendee(self, event_id: int, n: int):
+        """``(attendee_id, email)`` of the ``n``-th seeded attendee of ``event_id``."""
+        n %= self.attendees_per_event
+        return ((event_id - 1) * self.attendees_per_event + n + 1,
+                f"a{event_id}-{n}@example.com")
+
+
+def seed(url: str, events: int, attendees_per_event: int, seed: int = 0) -> Dataset:
+    """Create the schema and a deterministic dataset in the database at ``url``."""
+    from app import auth
+    from app.database import Base, make_engine
+    from app.models import Attendee, Event, User
+
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    dataset = Dataset(events, attendees_per_event)
+    engine = make_engine(url)
+    try:
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(insert(User), [{"username": USERNAME, "role": "user",
+                                         "hashed_password": auth.get_password_hash(PASSWORD)}])
+            event_rows = []
+            for event_id in range(1, events + 2):
+                start = now + timedelta(days=rng.randint(1, 60), hours=rng.randint(0, 23))
+                event_rows.append({
+                    "event_id": event_id, "name": f"Event {event_id}", "description": "Seeded",
+                    "location": rng.choice(LOCATIONS), "start_time": start,
+                    "end_time": start + timedelta(hours=rng.randint(1, 48)),
+                    "max_attendees": 10 ** 9 if event_id > events else attendees_per_event * 2,
+                    "attendee_count": 0 if event_id > events else attendees_per_event,
+                })
+            conn.execute(insert(Event), event_rows)
+            for event_id in range(1, events + 1):
+                conn.execute(insert(Attendee), [{
+                    "attendee_id": attendee_id, "event_id": event_id, "email": email,
+                    "first_name": "Seed", "last_name": str(n), "phone_number": "555-0100",
+                    "check_in_status": rng.random() < 0.3,
+                } for n in range(attendees_per_event)
+                    for attendee_id, email in [dataset.attendee(event_id, n)]])
+    finally:
+        engine.dispose()
+    dataset.event_ids = list(range(1, events + 1))
+    dataset.registration_event_id = events + 1
+    return dataset
+
+
+@dataclass
+class Scenario:
+    method: str
+    path: str
+    # (client, dataset, headers, i) -> awaitable response
+    send: Callable
+    expected: int = 200
+    # bcrypt-bound routes run fewer requests, see --auth-requests
+    hashes_password: bool = False
+
+    @property
+    def name(self) -> str:
+        return f"{self.method} {self.path}"
+
+
+def _token_headers(i: int = 0):
+    from app import auth
+    # Tokens minted in the same second are identical, so vary the expiry
+    token = auth.create_access_token({"sub": USERNAME}, timedelta(minutes=30, seconds=i))
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _event_body(i: int) -> dict:
+    start = datetime.now(timezone.utc) + timedelta(days=30, minutes=i)
+    return {"name": f"Bench {i}", "description": "Load test", "location": LOCATIONS[i % len(LOCATIONS)],
+            "start_time": start.isoformat(), "end_time": (start + timedelta(hours=2)).isoformat(),
+            "max_attendees": 100}
+
+
+def _attendee_body(email: str) -> dict:
+    return {"first_name": "Load", "last_name": "Test", "email": email, "phone_number": "555-0199"}
+
+
+def _pick(ds: Dataset, i: int) -> int:
+    return ds.event_ids[i % len(ds.event_ids)]
+
+
+def _bulk_csv(ds: Dataset, i: int) -> str:
+    event_id = _pick(ds, i)
+    rows = (ds.attendee(event_id, i * BULK_ROWS + n)[1] for n in range(BULK_ROWS))
+    return "email\n" + "\n".join(rows) + "\n"
+
+
+def _cancellation(ds: Dataset, i: int):
+    """A distinct seeded ``(event_id, attendee_id)`` per request, from the last event back."""
+    event_id = ds.event_ids[-1 - (i // ds.attendees_per_event) % len(ds.event_ids)]
+    return event_id, ds.attendee(event_id, i)[0]
+
+
+SCENARIOS = [
+    Scenario("POST", "/register", lambda c, ds, h, i: c.post(
+        "/register", json={"username": f"bench-user-{i}", "password": PASSWORD}),
+        hashes_password=True),
+    Scenario("POST", "/token", lambda c, ds, h, i: c.post(
+        "/token", data={"username": USERNAME, "password": PASSWORD}), hashes_password=True),
+    Scenario("POST", "/logout", lambda c, ds, h, i: c.post("/logout", headers=_token_headers(i + 1)),
+             expected=204),
+    Scenario("POST", "/event", lambda c, ds, h, i: c.post(
+        "/event", json=_event_body(i), headers=h), expected=201),
+    Scenario("PUT", "/event/{event_id}", lambda c, ds, h, i: c.put(
+        f"/event/{_pick(ds, i)}", json={"description": f"Updated {i}"}, headers=h)),
+    Scenario("GET", "/scheduler", lambda c, ds, h, i: c.get("/scheduler", headers=h)),
+    Scenario("GET", "/metrics", lambda c, ds, h, i: c.get("/metrics")),
+    Scenario("POST", "/event/{event_id}/attendees", lambda c, ds, h, i: c.post(
+        f"/event/{ds.registration_event_id}/attendees",
+        json=_attendee_body(f"register-{i}@example.com"))),
+    Scenario("PUT", "/event/{event_id}/attendees/{attendee_id}/checkin", lambda c, ds, h, i: c.put(
+        "/event/{}/attendees/{}/checkin".format(
+            _pick(ds, i), ds.attendee(_pick(ds, i), i)[0]), headers=h)),
+    Scenario("POST", "/event/{event_id}/attendees/import", lambda c, ds, h, i: c.post(
+        f"/event/{ds.registration_event_id}/attendees/import", headers=h,
+        json=[_attendee_body(f"import-{i}-{n}@example.com") for n in range(IMPORT_ROWS)])),
+    Scenario("POST", "/event/{event_id}/attendees/bulk-checkin", lambda c, ds, h, i: c.post(
+        f"/event/{_pick(ds, i)}/attendees/bulk-checkin", headers=h,
+        files={"file": ("checkin.csv", _bulk_csv(ds, i), "text/csv")})),
+    Scenario("GET", "/events", lambda c, ds, h, i: c.get(
+        "/events", params=[{}, {"status": "scheduled"}, {"location": LOCATIONS[i % len(LOCATIONS)]},
+                           {"after": _pick(ds, i)}][i % 4])),
+    Scenario("GET", "/event/{event_id}/attendees", lambda c, ds, h, i: c.get(
+        f"/event/{_pick(ds, i)}/attendees",
+        params={"check_in_status": True} if i % 2 else {})),
+    Scenario("GET", "/event/{event_id}/stats", lambda c, ds, h, i: c.get(
+        f"/event/{_pick(ds, i)}/stats", headers=h)),
+    Scenario("GET", "/events/stats", lambda c, ds, h, i: c.get(
+        "/events/stats", headers=h, params={"event_id": ds.event_ids[:50]})),
+    Scenario("GET", "/event/{event_id}/stats/checkins", lambda c, ds, h, i: c.get(
+        f"/event/{_pick(ds, i)}/stats/checkins", headers=h)),
+    Scenario("GET", "/event/{event_id}/feed", lambda c, ds, h, i: c.get(
+        f"/event/{_pick(ds, i)}/feed", headers=h, params={"since": 0, "timeout": 0})),
+    Scenario("GET", "/events/search", lambda c, ds, h, i: c.get(
+        "/events/search", params={"q": [LOCATIONS[i % len(LOCATIONS)], "seed*", "event"][i % 3]})),
+    Scenario("GET", "/events/export", lambda c, ds, h, i: c.get(
+        "/events/export", headers=h, params={"format": "ndjson"})),
+    Scenario("GET", "/event/{event_id}/attendees/export", lambda c, ds, h, i: c.get(
+        f"/event/{_pick(ds, i)}/attendees/export", headers=h)),
+    # Last, so the seeded attendees it removes are not needed afterwards
+    Scenario("DELETE", "/event/{event_id}/attendees/{attendee_id}", lambda c, ds, h, i: c.delete(
+        "/event/{}/attendees/{}".format(*_cancellation(ds, i)), headers=h), expected=204),
+]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(1, min(len(sorted_values), round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": ms(statistics.fmean(latencies)),
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1]),
+    }
+
+
+async def run_scenario(client, scenario: Scenario, dataset: Dataset, headers: dict,
+                       requests: int, concurrency: int) -> dict:
+    latencies = []
+    errors = []
+    indexes = iter(range(requests))
+
+    async def worker():
+        for i in indexes:
+            started = time.perf_counter()
+            response = await scenario.send(client, dataset, headers, i)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != scenario.expected:
+                errors.append(f"{response.status_code} {response.text[:200]}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, requests))))
+    result = summarize(latencies, len(errors), time.perf_counter() - started)
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+@asynccontextmanager
+async def asgi_client(url: str, concurrency: int):
+    """In-process client; the app's sessions are pointed at the seeded database."""
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    from app import checkins, main, registration
+    from app.cache import MemoryCacheBackend
+    from app.database import get_db, make_async_engine
+
+    engine = make_async_engine(url)
+    sessions = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_db():
+        async with sessions() as db:
+            yield db
+
+    saved = (main.app.dependency_overrides.get(get_db), main.scheduler.session_factory,
+             main.response_cache.backend, registration.queues.session_factory,
+             checkins.batcher.session_factory)
+    main.app.dependency_overrides[get_db] = override_get_db
+    main.scheduler.session_factory = registration.queues.session_factory = sessions
+    checkins.batcher.session_factory = sessions
+    # Keep cached pages of other databases out of the measurements, and ours out of theirs
+    main.response_cache.backend = MemoryCacheBackend()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app),
+                                     base_url="http://bench") as client:
+            yield client
+    finally:
+        if saved[0] is None:
+            main.app.dependency_overrides.pop(get_db, None)
+        else:
+            main.app.dependency_overrides[get_db] = saved[0]
+        (main.scheduler.session_factory, main.response_cache.backend,
+         registration.queues.session_factory, checkins.batcher.session_factory) = saved[1:]
+        await engine.dispose()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@asynccontextmanager
+async def uvicorn_client(url: str, concurrency: int, startup_timeout: float = 30):
+    """Client for a real ``uvicorn app.main:app`` process serving the seeded database."""
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT, env=dict(os.environ, DATABASE_URL=url))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits,
+                                     timeout=60) as client:
+            deadline = time.monotonic() + startup_timeout
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with status {server.returncode}")
+                try:
+                    await client.get("/events", params={"limit": 1})
+                    break
+                except httpx.TransportError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError("uvicorn did not start in time")
+                    await asyncio.sleep(0.1)
+            yield client
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+CLIENTS = {"asgi": asgi_client, "uvicorn": uvicorn_client}
+
+
+def select_scenarios(routes: Optional[List[str]] = None) -> List[Scenario]:
+    if not routes:
+        return list(SCENARIOS)
+    return [s for s in SCENARIOS if any(route in s.name for route in routes)]
+
+
+async def run(url: str, dataset: Dataset, mode: str = "asgi", requests: int = 200,
+              auth_requests: int = 20, concurrency: int = 16,
+              routes: Optional[List[str]] = None) -> dict:
+    """Drive every selected scenario against the seeded database; returns per-route stats."""
+    results = {}
+    async with CLIENTS[mode](url, concurrency) as client:
+        headers = _token_headers()
+        for scenario in select_scenarios(routes):
+            count = auth_requests if scenario.hashes_password else requests
+            results[scenario.name] = await run_scenario(
+                client, scenario, dataset, headers, count, concurrency)
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.25) -> List[str]:
+    """List the routes of ``current`` that regressed against ``baseline``.
+
+    A route regresses when its p95 latency grew, or its throughput shrank,
+    by more than ``tolerance``, or when it has errors the baseline did not.
+    """
+    regressions = []
+    for name, now in current["routes"].items():
+        before = baseline["routes"].get(name)
+        if before is None:
+            continue
+        if now["errors"] > before["errors"]:
+            regressions.append(f"{name}: {now['errors']} errors (was {before['errors']})")
+        if now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {now['p95_ms']:.1f}ms (was {before['p95_ms']:.1f}ms)")
+        if now["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: {now['throughput_rps']:.1f} req/s "
+                               f"(was {before['throughput_rps']:.1f} req/s)")
+    return regressions
+
+
+def format_table(routes: dict) -> str:
+    lines = [f"{'route':<52} {'req':>6} {'err':>4} {'req/s':>9} {'p50':>8} {'p95':>8} {'p99':>8}"]
+    for name, r in routes.items():
+        lines.append(f"{name:<52} {r['requests']:>6} {r['errors']:>4} {r['throughput_rps']:>9.1f} "
+                     f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadtest")
+    parser.add_argument("--mode", choices=sorted(CLIENTS), default="asgi")
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--attendees", type=int, default=200, help="attendees per event")
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--auth-requests", type=int, default=20,
+                        help="requests for the bcrypt-bound /register and /token routes")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--route", action="append", dest="routes",
+                        help="only run routes whose 'METHOD /path' contains this; repeatable")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database", help="SQLite file to seed (default: a temporary file)")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="earlier result file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative slowdown before a route counts as regressed")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(args.database or Path(tmp) / "bench.db").resolve()
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{path}{suffix}").unlink(missing_ok=True)
+        url = f"sqlite:///{path}"
+        dataset = seed(url, args.events, args.attendees, args.seed)
+        routes = asyncio.run(run(url, dataset, args.mode, args.requests, args.auth_requests,
+                                 args.concurrency, args.routes))
+
+    result = {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "mode": args.mode,
+            "events": args.events,
+            "attendees_per_event": args.attendees,
+            "requests": args.requests,
+            "auth_requests": args.auth_requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "python": platform.python_version(),
+        },
+        "routes": routes,
+    }
+    Path(args.output).write_text(json.dumps(result, indent=2) + "\n")
+    print(format_table(routes))
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        regressions = compare(result, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        if regressions:
+            print("\nRegressions against", args.baseline)
+            print("\n".join(f"  {line}" for line in regressions))
+            return 1
+        print(f"\nNo regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+import asyncio
+import os
+from typing import NamedTuple
+
+import httpx
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+
+# Set before any test module imports the app: whatever reaches its own
+# engine, like the migrations TestClient(app) runs on startup, goes to the
+# test database and never to events.db or a DATABASE_URL set in the shell
+os.environ["DATABASE_URL"] = "sqlite:///test.db"
+
+
+@pytest.fixture
+def run_asgi():
+    """``run_asgi(app, requests)`` awaits ``requests(client)`` with a client talking to ``app`` in process."""
+    def run(app, requests):
+        async def go():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                         base_url="http://test") as client:
+                return await requests(client)
+        return asyncio.run(go())
+    return run
+
+
+class AppDatabase(NamedTuple):
+    url: str
+    # For seeding and inspecting from the test
+    engine: Engine
+    async_engine: AsyncEngine
+    sessions: async_sessionmaker
+
+
+@pytest.fixture
+def app_db(tmp_path, monkeypatch):
+    """``app_db(name)`` creates an SQLite database under ``tmp_path`` and serves the app from it.
+
+    Requests, the check-in batcher, the registration queues and the
+    lifecycle scheduler all get their sessions from it until the test ends.
+    The schema comes from the models, or from the migrations with
+    ``migrate=True``. ``engine_options`` go to ``make_async_engine``; by
+    default connections are not pooled, so none outlives the event loop
+    that opened it.
+    """
+    from app import checkins, migrations, registration
+    from app.database import Base, get_db, make_async_engine
+    from app.main import app, scheduler
+
+    databases = []
+
+    def create(name: str = "app.db", migrate: bool = False, **engine_options) -> AppDatabase:
+        url = f"sqlite:///{tmp_path / name}"
+        engine = create_engine(url)
+        if migrate:
+            with engine.connect() as conn:
+                migrations.upgrade(conn)
+        else:
+            Base.metadata.create_all(bind=engine)
+        async_engine = make_async_engine(url, **(engine_options or {"poolclass": NullPool}))
+        sessions = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+        async def override_get_db():
+            async with sessions() as db:
+                yield db
+
+        monkeypatch.setitem(app.dependency_overrides, get_db, override_get_db)
+        for user in (checkins.batcher, registration.queues, scheduler):
+            monkeypatch.setattr(user, "session_factory", sessions)
+        database = AppDatabase(url, engine, async_engine, sessions)
+        databases.append(database)
+        return database
+
+    yield create
+    for database in databases:
+        asyncio.run(database.async_engine.dispose())
+        database.engine.dispose()
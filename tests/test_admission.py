@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+
+from app import admission
+from app.admission import ConcurrencyLimiter, MemoryRateLimitBackend
+
+
+def make_app(limits=None, limiter=None):
+    app = FastAPI()
+    app.add_middleware(admission.AdmissionMiddleware, limits=limits or {},
+                       limiter=limiter or ConcurrencyLimiter(limit=0),
+                       priorities={("GET", "/health"): admission.EXEMPT})
+    release = asyncio.Event()
+
+    @app.post("/slow")
+    async def slow():
+        await release.wait()
+        return {"ok": True}
+
+    @app.post("/orders/{order_id}")
+    async def order(order_id: int):
+        return {"order": order_id}
+
+    @app.get("/health")
+    async def health():
+        return {"ok": True}
+
+    app.state.release = release
+    return app
+
+
+@pytest.fixture(autouse=True)
+def fresh_buckets(monkeypatch):
+    monkeypatch.setattr(admission, "rate_limits", MemoryRateLimitBackend())
+
+
+def test_parse_limits():
+    assert admission.parse_limits("POST /event/{event_id}/attendees=5/20, *=50") == {
+        ("POST", "/event/{event_id}/attendees"): (5.0, 20.0), "*": (50.0, 50.0)}
+    assert admission.parse_limits("") == {}
+    with pytest.raises(ValueError):
+        admission.parse_limits("POST /x=0/1")
+
+
+def test_token_buckets_are_per_client_and_route(run_asgi):
+    app = make_app(limits={("POST", "/orders/{order_id}"): (0.5, 2)})
+
+    async def requests(client):
+        mine = [await client.post(f"/orders/{n}", headers={"Authorization": "Bearer a"}) for n in range(3)]
+        theirs = await client.post("/orders/1", headers={"Authorization": "Bearer b"})
+        anonymous = await client.post("/orders/1")
+        return mine, theirs, anonymous
+
+    mine, theirs, anonymous = run_asgi(app, requests)
+    # The bucket covers the route template, not each order
+    assert [r.status_code for r in mine] == [200, 200, 429]
+    assert mine[2].headers["retry-after"] == "2"
+    assert theirs.status_code == anonymous.status_code == 200
+
+
+def test_memory_buckets_refill_over_time(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: clock[0])
+    backend = MemoryRateLimitBackend(max_keys=2)
+
+    async def scenario():
+        waits = [await backend.take("k", 10, 1), await backend.take("k", 10, 1)]
+        clock[0] += 0.2
+        waits.append(await backend.take("k", 10, 1))
+        await backend.take("other", 10, 1)
+        await backend.take("third", 10, 1)
+        return waits, list(backend._buckets)
+
+    waits, keys = asyncio.run(scenario())
+    assert waits[0] == 0 and waits[1] == pytest.approx(0.1) and waits[2] == 0
+    assert keys == ["other", "third"]
+
+
+def test_waiters_are_admitted_by_priority_then_arrival():
+    async def scenario():
+        limiter = ConcurrencyLimiter(limit=1, target=5)
+        assert await limiter.acquire(admission.NORMAL)
+        order = []
+
+        async def request(name, priority):
+            assert await limiter.acquire(priority)
+            order.append(name)
+            await asyncio.sleep(0)
+            limiter.release()
+
+        tasks = [asyncio.create_task(request(name, priority)) for name, priority in [
+            ("listing", admission.LOW), ("register", admission.HIGH),
+            ("checkin", admission.CRITICAL), ("register-2", admission.HIGH)]]
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return order, limiter.in_flight
+
+    order, in_flight = asyncio.run(scenario())
+    assert order == ["checkin", "register", "register-2", "listing"]
+    assert in_flight == 0
+
+
+def test_requests_queued_past_the_target_are_shed():
+    async def scenario():
+        limiter = ConcurrencyLimiter(limit=1, target=0.05)
+        assert await limiter.acquire(admission.NORMAL)
+        listing = asyncio.create_task(limiter.acquire(admission.LOW))
+        first_checkin = asyncio.create_task(limiter.acquire(admission.CRITICAL))
+        await asyncio.sleep(0.08)
+        # The listing gave up; check-ins are more patient
+        listing_result = listing.result()
+        # With a check-in queued past the target, a new listing fails fast...
+        late_listing = await asyncio.wait_for(limiter.acquire(admission.LOW), 0.01)
+        # ...while another check-in still queues and is served in turn
+        second_checkin = asyncio.create_task(limiter.acquire(admission.CRITICAL))
+        await asyncio.sleep(0)
+        limiter.release()
+        first = await first_checkin
+        limiter.release()
+        return (listing_result, late_listing, first, await second_checkin,
+                limiter.in_flight, limiter._waiters)
+
+    listing, late_listing, first, second, in_flight, waiters = asyncio.run(scenario())
+    assert (listing, late_listing, first, second) == (False, False, True, True)
+    assert in_flight == 1
+    assert waiters == []
+
+
+def test_middleware_sheds_with_503_and_leaves_exempt_routes_alone(run_asgi):
+    app = make_app(limiter=ConcurrencyLimiter(limit=1, target=0.05))
+
+    async def requests(client):
+        held = asyncio.create_task(client.post("/slow"))
+        await asyncio.sleep(0.01)
+        shed = await client.post("/orders/1")
+        health = await client.get("/health")
+        app.state.release.set()
+        return await held, shed, health, await client.post("/orders/1")
+
+    held, shed, health, after = run_asgi(app, requests)
+    assert held.status_code == 200
+    assert shed.status_code == 503 and shed.headers["retry-after"] == "1"
+    assert health.status_code == 200
+    assert after.status_code == 200
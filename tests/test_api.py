@@ -1,13 +1,19 @@
+import asyncio
+import csv
+import io
+import json
 import pytest
 from fastapi.testclient import TestClient
 from datetime import datetime, timedelta, timezone
-from app.main import app
-from app.database import Base, engine, get_db
+from app.main import app, scheduler
+from app.database import Base, BlockingSession, get_db, make_async_engine, make_engine
 from app.auth import create_access_token
-from sqlalchemy import create_engine
+from app import checkins, crud, registration
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from sqlalchemy.orm import Session
-from app.models import Event, Attendee
+from app.models import Event, Attendee, User
 from faker import Faker
 import random
 
@@ -17,15 +23,22 @@ fake = Faker()
 # Create an in-memory(Similar like memecache or redis) SQLite database
 # TEST_DATABASE_URL = "sqlite:///:memory:"
 TEST_DATABASE_URL = "sqlite:///test.db"
-engine = create_engine(TEST_DATABASE_URL)
+engine = make_engine(TEST_DATABASE_URL)
 
-# Create all tables
+# Recreate all tables so the test database always matches the models
+Base.metadata.drop_all(bind=engine)
 Base.metadata.create_all(bind=engine)
 
 # Create a configured "SessionLocal" class
 TestingSessionLocal = sessionmaker(
     autocommit=False, autoflush=False, bind=engine)
 
+# Requests go through the asyncio driver, like the app does by default.
+# NullPool keeps connections from outliving the TestClient's event loop.
+async_engine = make_async_engine(TEST_DATABASE_URL, poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False)
+
 
 @pytest.fixture(scope="module")
 def test_db():
@@ -39,19 +52,24 @@ def test_db():
 
 @pytest.fixture(scope="module")
 def client(test_db):
-    def override_get_db():
-        try:
-            yield test_db
-        finally:
-            test_db.close()
+    async def override_get_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
 
     app.dependency_overrides[get_db] = override_get_db
+    scheduler.session_factory = TestingAsyncSessionLocal
+    registration.queues.session_factory = TestingAsyncSessionLocal
+    checkins.batcher.session_factory = TestingAsyncSessionLocal
     with TestClient(app) as c:
         yield c
 
 
 @pytest.fixture
-def auth_headers():
+def auth_headers(test_db):
+    # Tokens are resolved to a user, so make sure the test user exists
+    if test_db.query(User).filter_by(username="testuser").first() is None:
+        test_db.add(User(username="testuser", hashed_password="", role="user"))
+        test_db.commit()
     # Generate a valid auth token for testing
     access_token = create_access_token({"sub": "testuser"})
     return {"Authorization": f"Bearer {access_token}"}
@@ -97,6 +115,24 @@ def test_create_event(client, auth_headers):
     assert response_data["max_attendees"] == event_data["max_attendees"]
 
 
+def test_event_times_are_stored_in_utc(client, auth_headers, test_db: Session):
+    start = datetime(2031, 3, 1, 9, 0, tzinfo=timezone(timedelta(hours=5)))
+    response = client.post("/event", headers=auth_headers, json={
+        "name": "Offset", "description": "d", "location": "Tashkent", "max_attendees": 1,
+        "start_time": start.isoformat(), "end_time": (start + timedelta(hours=2)).isoformat()})
+    assert response.status_code == 201
+    event_id = response.json()["event_id"]
+    response = client.put(f"/event/{event_id}", headers=auth_headers,
+                          json={"end_time": "2031-03-01T08:00:00-03:00"})
+    assert response.status_code == 200
+
+    test_db.expire_all()
+    event = test_db.get(Event, event_id)
+    # Read back as UTC by the scheduler, whatever offset the client sent
+    assert event.start_time.replace(tzinfo=None) == datetime(2031, 3, 1, 4, 0)
+    assert event.end_time.replace(tzinfo=None) == datetime(2031, 3, 1, 11, 0)
+
+
 def test_update_event(client, auth_headers):
     # Create an event
     event_data = {
@@ -213,18 +249,62 @@ def test_bulk_checkin_attendees(client, auth_headers):
             "phone_number": fake.phone_number()
         }
     ]
+    attendee_ids = []
     for attendee_data in attendees_data:
         response = client.post(
             f"/event/{event_id}/attendees", json=attendee_data, headers=auth_headers)
         assert response.status_code == 200
+        attendee_ids.append(response.json()["attendee_id"])
 
     # Bulk check-in attendees
-    csv_content = "attendee_id\n{}\n{}\n".format(
-        attendees_data[0]["attendee_id"], attendees_data[1]["attendee_id"])
+    csv_content = "attendee_id\n{}\n{}\n".format(*attendee_ids)
 
     response = client.post(f"/event/{event_id}/attendees/bulk-checkin",
                         files={"file": ("bulk_checkin.csv", csv_content, "text/csv")}, headers=auth_headers)
     assert response.status_code == 200  # Ensure bulk check-in is successful
+    assert response.json() == {
+        "updated": 2, "already_checked_in": 0, "not_found": [], "malformed": []}
+
+
+def test_bulk_checkin_by_email_reports_summary(client, auth_headers):
+    event_data = {
+        "name": "Test Event",
+        "location": "Test Location",
+        "description": "Test Description",
+        "start_time": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+        "end_time": (datetime.now(timezone.utc) + timedelta(days=2)).isoformat(),
+        "max_attendees": 100
+    }
+    response = client.post("/event", json=event_data, headers=auth_headers)
+    assert response.status_code == 201
+    event_id = response.json()["event_id"]
+
+    attendee_data = {
+        "first_name": fake.first_name(),
+        "last_name": fake.last_name(),
+        "email": fake.unique.email(),
+        "phone_number": fake.phone_number()
+    }
+    response = client.post(f"/event/{event_id}/attendees", json=attendee_data)
+    assert response.status_code == 200
+    attendee_id = response.json()["attendee_id"]
+
+    # Same attendee by id and by email, an unknown email and a bad id
+    csv_content = "attendee_id,email\n{},\n,{}\n,nobody@example.com\nabc,\n".format(
+        attendee_id, attendee_data["email"])
+    response = client.post(f"/event/{event_id}/attendees/bulk-checkin",
+                           files={"file": ("bulk_checkin.csv", csv_content, "text/csv")}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == {
+        "updated": 1,
+        "already_checked_in": 1,
+        "not_found": ["nobody@example.com"],
+        "malformed": [5],
+    }
+
+    response = client.post("/event/999999/attendees/bulk-checkin",
+                           files={"file": ("bulk_checkin.csv", csv_content, "text/csv")}, headers=auth_headers)
+    assert response.status_code == 404
 
 
 def test_list_events(client, auth_headers, test_db: Session):
@@ -302,5 +382,586 @@ def test_list_attendees(client, auth_headers, test_db:Session):
     assert len(response.json()) == 2
 
 
+def test_register_attendee_enforces_capacity(client, auth_headers, test_db: Session):
+    event_data = {
+        "name": "Small Event",
+        "location": "Test Location",
+        "description": "Test Description",
+        "start_time": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+        "end_time": (datetime.now(timezone.utc) + timedelta(days=2)).isoformat(),
+        "max_attendees": 1
+    }
+    response = client.post("/event", json=event_data, headers=auth_headers)
+    assert response.status_code == 201
+    event_id = response.json()["event_id"]
+
+    def attendee():
+        return {
+            "first_name": fake.first_name(),
+            "last_name": fake.last_name(),
+            "email": fake.unique.email(),
+            "phone_number": fake.phone_number()
+        }
+
+    response = client.post(f"/event/{event_id}/attendees", json=attendee())
+    assert response.status_code == 200
+    response = client.post(f"/event/{event_id}/attendees", json=attendee())
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Max attendees limit reached"
+    response = client.post("/event/999999/attendees", json=attendee())
+    assert response.status_code == 404
+
+    event = test_db.get(Event, event_id)
+    test_db.refresh(event)
+    assert event.attendee_count == 1
+
+
+def test_recount_attendees_repairs_counter(client, auth_headers, test_db: Session):
+    event_data = {
+        "name": "Recount Event",
+        "location": "Test Location",
+        "description": "Test Description",
+        "start_time": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+        "end_time": (datetime.now(timezone.utc) + timedelta(days=2)).isoformat(),
+        "max_attendees": 10
+    }
+    response = client.post("/event", json=event_data, headers=auth_headers)
+    event_id = response.json()["event_id"]
+    response = client.post(f"/event/{event_id}/attendees", json={
+        "first_name": fake.first_name(),
+        "last_name": fake.last_name(),
+        "email": fake.unique.email(),
+        "phone_number": fake.phone_number()
+    })
+    assert response.status_code == 200
+
+    test_db.query(Event).filter(Event.event_id == event_id).update({"attendee_count": 7})
+    test_db.commit()
+    assert asyncio.run(crud.recount_attendees(BlockingSession(test_db))) >= 1
+    event = test_db.get(Event, event_id)
+    test_db.refresh(event)
+    assert event.attendee_count == 1
+
+
+def test_list_attendees_keyset_pagination_and_ndjson(client, auth_headers):
+    event_data = {
+        "name": "Paged Event",
+        "location": "Test Location",
+        "description": "Test Description",
+        "start_time": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+        "end_time": (datetime.now(timezone.utc) + timedelta(days=2)).isoformat(),
+        "max_attendees": 10
+    }
+    response = client.post("/event", json=event_data, headers=auth_headers)
+    event_id = response.json()["event_id"]
+    registered = []
+    for _ in range(5):
+        response = client.post(f"/event/{event_id}/attendees", json={
+            "first_name": fake.first_name(),
+            "last_name": fake.last_name(),
+            "email": fake.unique.email(),
+            "phone_number": fake.phone_number()
+        })
+        assert response.status_code == 200
+        registered.append(response.json()["attendee_id"])
+
+    # Walk the pages through the cursor header
+    seen = []
+    params = {"limit": 2}
+    while True:
+        response = client.get(f"/event/{event_id}/attendees", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 2
+        seen.extend(attendee["attendee_id"] for attendee in page)
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params = {"limit": 2, "after": cursor}
+    assert seen == registered
+
+    response = client.get(f"/event/{event_id}/attendees",
+                          params={"format": "ndjson", "after": registered[0]})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["attendee_id"] for line in lines] == registered[1:]
+    assert set(lines[0]) == {"attendee_id", "first_name", "last_name",
+                             "email", "phone_number", "check_in_status"}
+
+
+def test_scheduler_stats(client, auth_headers):
+    response = client.get("/scheduler", headers=auth_headers)
+    assert response.status_code == 200
+    assert set(response.json()) == {"queue_depth", "lag_seconds", "last_lag_seconds",
+                                    "last_run_at", "transitions_applied"}
+    assert client.get("/scheduler").status_code == 401
+
+
+def test_list_events_etag_and_invalidation(client, auth_headers):
+    response = client.get("/events", params={"location": "Etag Hall"})
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = client.get("/events", params={"location": "Etag Hall"},
+                          headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    event_data = {
+        "name": "Etag Event",
+        "location": "Etag Hall",
+        "description": "Test Description",
+        "start_time": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+        "end_time": (datetime.now(timezone.utc) + timedelta(days=2)).isoformat(),
+        "max_attendees": 10
+    }
+    assert client.post("/event", json=event_data, headers=auth_headers).status_code == 201
+
+    # The write invalidated the cached listing
+    response = client.get("/events", params={"location": "Etag Hall"},
+                          headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert [event["name"] for event in response.json()] == ["Etag Event"]
+
+
+def test_import_attendees_csv_and_json(client, auth_headers):
+    event_data = {
+        "name": "Import Event",
+        "location": "Test Location",
+        "description": "Test Description",
+        "start_time": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+        "end_time": (datetime.now(timezone.utc) + timedelta(days=2)).isoformat(),
+        "max_attendees": 4
+    }
+    event_id = client.post("/event", json=event_data, headers=auth_headers).json()["event_id"]
+    existing = fake.unique.email()
+    assert client.post(f"/event/{event_id}/attendees", json={
+        "first_name": "A", "last_name": "B", "email": existing, "phone_number": "1"}).status_code == 200
+
+    first, second = fake.unique.email(), fake.unique.email()
+    csv_content = (
+        "first_name,last_name,email,phone_number\n"
+        f"Ann,Lee,{first},555\n"
+        f"Ann,Lee,{first},555\n"
+        f"Bob,Ray,{existing},555\n"
+        "Cat,Fox,not-an-email,555\n"
+        f"Dan,Orr,{second},555\n"
+    )
+    response = client.post(f"/event/{event_id}/attendees/import", headers=auth_headers,
+                           files={"file": ("import.csv", csv_content, "text/csv")})
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["created"], result["duplicate"], result["invalid"], result["full"]) == (2, 2, 1, 0)
+    assert [row["status"] for row in result["rows"]] == [
+        "created", "duplicate", "duplicate", "invalid", "created"]
+    assert result["rows"][3]["detail"].startswith("email:")
+    created_ids = [row["attendee_id"] for row in result["rows"] if row["status"] == "created"]
+
+    listed = client.get(f"/event/{event_id}/attendees").json()
+    assert [a["attendee_id"] for a in listed][1:] == created_ids
+
+    # One seat is left for two new attendees
+    response = client.post(f"/event/{event_id}/attendees/import", headers=auth_headers, json=[
+        {"first_name": "E", "last_name": "F", "email": fake.unique.email(), "phone_number": "1"},
+        {"first_name": "G", "last_name": "H", "email": fake.unique.email(), "phone_number": "1"},
+    ])
+    assert response.status_code == 200
+    assert [row["status"] for row in response.json()["rows"]] == ["created", "full"]
+
+    response = client.post(f"/event/{event_id}/attendees/import", headers=auth_headers,
+                           json={"not": "a list"})
+    assert response.status_code == 400
+    response = client.post("/event/999999/attendees/import", headers=auth_headers, json=[])
+    assert response.status_code == 404
+
+
+def test_import_documents_both_request_bodies():
+    body = app.openapi()["paths"]["/event/{event_id}/attendees/import"]["post"]["requestBody"]
+    assert set(body["content"]) == {"multipart/form-data", "application/json"}
+    assert body["content"]["application/json"]["schema"] == {
+        "type": "array", "items": {"$ref": "#/components/schemas/AttendeeCreate"}}
+
+
+def test_export_attendees_and_events(client, auth_headers):
+    event_data = {
+        "name": "Export Event",
+        "location": "Export Hall",
+        "description": "Test Description",
+        "start_time": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+        "end_time": (datetime.now(timezone.utc) + timedelta(days=2)).isoformat(),
+        "max_attendees": 10
+    }
+    event_id = client.post("/event", json=event_data, headers=auth_headers).json()["event_id"]
+    emails = [fake.unique.email() for _ in range(3)]
+    ids = [client.post(f"/event/{event_id}/attendees", json={
+        "first_name": "Ex", "last_name": "Port", "email": email, "phone_number": "1"
+    }).json()["attendee_id"] for email in emails]
+    client.put(f"/event/{event_id}/attendees/{ids[1]}/checkin", headers=auth_headers)
+
+    assert client.get(f"/event/{event_id}/attendees/export").status_code == 401
+
+    response = client.get(f"/event/{event_id}/attendees/export", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert "attachment" in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [int(row["attendee_id"]) for row in rows] == ids
+    assert [row["email"] for row in rows] == emails
+    assert [row["check_in_status"] for row in rows] == ["False", "True", "False"]
+
+    response = client.get(f"/event/{event_id}/attendees/export", headers=auth_headers,
+                          params={"format": "ndjson", "check_in_status": False})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["attendee_id"] for line in lines] == [ids[0], ids[2]]
+    assert lines[0]["check_in_status"] is False
+
+    response = client.get("/events/export", headers=auth_headers,
+                          params={"format": "ndjson", "location": "Export Hall"})
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [(e["event_id"], e["status"], e["attendee_count"]) for e in events] == [
+        (event_id, "scheduled", 3)]
+    datetime.fromisoformat(events[0]["start_time"])
+
+
+def test_search_events_ranks_filters_and_follows_updates(client, auth_headers):
+    def create(name, description, location, days=1):
+        start = datetime.now(timezone.utc) + timedelta(days=days)
+        return client.post("/event", headers=auth_headers, json={
+            "name": name, "description": description, "location": location,
+            "start_time": start.isoformat(), "end_time": (start + timedelta(hours=3)).isoformat(),
+            "max_attendees": 10}).json()["event_id"]
+
+    in_name = create("Quokkafest Summit", "Annual gathering", "Perth")
+    in_description = create("Wildlife Day", "Meet a quokkafest mascot", "Perth")
+    elsewhere = create("Quokkafest Meetup", "Small one", "Albany", days=30)
+
+    def search(**params):
+        response = client.get("/events/search", params=params)
+        assert response.status_code == 200
+        return [event["event_id"] for event in response.json()]
+
+    # Name hits outrank a description hit
+    assert search(q="quokkafest")[-1] == in_description
+    assert set(search(q="quokkafest")) == {in_name, in_description, elsewhere}
+    assert search(q="quokka*") == search(q="quokkafest")
+    assert search(q="quokka") == []
+    assert search(q="quokkafest perth") == [in_name, in_description]
+    assert search(q="quokkafest", location="Albany") == [elsewhere]
+    assert search(q="quokkafest", date=(datetime.now(timezone.utc) + timedelta(days=30, hours=1)).isoformat()) == [elsewhere]
+    # FTS5 syntax in user input is taken literally, not parsed
+    assert search(q='quokkafest OR "') == []
+    assert search(q="***") == []
+
+    client.put(f"/event/{in_name}", headers=auth_headers, json={"name": "Numbat Summit"})
+    assert search(q="numbat") == [in_name]
+    assert in_name not in search(q="quokkafest summit")
+
+
+def test_event_stats_follow_registrations_and_checkins(client, auth_headers, test_db: Session):
+    def create(capacity):
+        return client.post("/event", headers=auth_headers, json={
+            "name": "Stats Event", "location": "Test Location", "description": "Test Description",
+            "start_time": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+            "end_time": (datetime.now(timezone.utc) + timedelta(days=2)).isoformat(),
+            "max_attendees": capacity}).json()["event_id"]
+
+    event_id, other_id = create(5), create(3)
+    emails = [fake.unique.email() for _ in range(3)]
+    ids = [client.post(f"/event/{event_id}/attendees", json={
+        "first_name": "S", "last_name": "T", "email": email, "phone_number": "1"
+    }).json()["attendee_id"] for email in emails]
+
+    client.put(f"/event/{event_id}/attendees/{ids[0]}/checkin", headers=auth_headers)
+    # Checking in twice counts once
+    client.put(f"/event/{event_id}/attendees/{ids[0]}/checkin", headers=auth_headers)
+    client.post(f"/event/{event_id}/attendees/bulk-checkin", headers=auth_headers,
+                files={"file": ("c.csv", f"email\n{emails[1]}\n{emails[2]}\n", "text/csv")})
+    client.put(f"/event/{event_id}/attendees/{ids[2]}/checkin",
+               params={"check_in_status": False}, headers=auth_headers)
+
+    response = client.get(f"/event/{event_id}/stats", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == {"event_id": event_id, "registered": 3, "checked_in": 2,
+                               "capacity": 5, "remaining": 2, "check_in_rate": 2 / 3}
+    assert client.get("/event/999999/stats", headers=auth_headers).status_code == 404
+
+    response = client.get("/events/stats", headers=auth_headers,
+                          params={"event_id": [other_id, event_id, 999999]})
+    assert [(s["event_id"], s["registered"], s["checked_in"]) for s in response.json()] == [
+        (event_id, 3, 2), (other_id, 0, 0)]
+
+    # Every check-in lands in a bucket; undoing one does not erase it
+    series = client.get(f"/event/{event_id}/stats/checkins", headers=auth_headers).json()
+    assert sum(bucket["count"] for bucket in series) == 3
+    assert all(datetime.fromisoformat(bucket["minute"]).second == 0 for bucket in series)
+
+    test_db.query(Event).filter(Event.event_id == event_id).update({"checked_in_count": 9})
+    test_db.commit()
+    result = asyncio.run(crud.rebuild_event_stats(BlockingSession(test_db)))
+    assert result["checked_in_count"] >= 1
+    test_db.expire_all()
+    assert test_db.get(Event, event_id).checked_in_count == 2
+    series = client.get(f"/event/{event_id}/stats/checkins", headers=auth_headers).json()
+    assert sum(bucket["count"] for bucket in series) == 2
+
+
+async def read_sse(path, headers, events):
+    """Call the app directly until ``events`` SSE messages arrive, then hang up.
+
+    TestClient would wait for the response to finish, which a feed never does.
+    """
+    body, status_code, enough = [], [], asyncio.Event()
+
+    async def receive():
+        await enough.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status_code.append(message["status"])
+        elif message["type"] == "http.response.body":
+            body.append(message.get("body", b"").decode())
+            if "".join(body).count("\n\n") >= events:
+                enough.set()
+
+    path, _, query = path.partition("?")
+    await app({"type": "http", "http_version": "1.1", "method": "GET", "scheme": "http",
+               "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+               "root_path": "", "server": ("testserver", 80), "client": ("testclient", 1),
+               "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()]},
+              receive, send)
+    events = [dict(line.split(": ", 1) for line in block.splitlines())
+              for block in "".join(body).split("\n\n") if block and not block.startswith(":")]
+    return status_code[0], events
+
+
+def test_live_feed_over_websocket_and_sse(client, auth_headers):
+    from starlette.websockets import WebSocketDisconnect
+
+    event_id = client.post("/event", headers=auth_headers, json={
+        "name": "Feed Event", "location": "Test Location", "description": "Test Description",
+        "start_time": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+        "end_time": (datetime.now(timezone.utc) + timedelta(days=2)).isoformat(),
+        "max_attendees": 10}).json()["event_id"]
+    token = auth_headers["Authorization"].split()[1]
+    emails = [fake.unique.email() for _ in range(3)]
+
+    with client.websocket_connect(f"/event/{event_id}/feed/ws?token={token}") as ws:
+        attendee_id = client.post(f"/event/{event_id}/attendees", json={
+            "first_name": "F", "last_name": "D", "email": emails[0], "phone_number": "1"
+        }).json()["attendee_id"]
+        message = ws.receive_json()
+        assert (message["seq"], message["type"], message["attendee_ids"]) == (1, "registered", [attendee_id])
+
+        client.put(f"/event/{event_id}/attendees/{attendee_id}/checkin", headers=auth_headers)
+        # Repeating a check-in changes nothing and publishes nothing
+        client.put(f"/event/{event_id}/attendees/{attendee_id}/checkin", headers=auth_headers)
+        client.post(f"/event/{event_id}/attendees/import", headers=auth_headers, json=[
+            {"first_name": "I", "last_name": "M", "email": email, "phone_number": "1"}
+            for email in emails[1:]])
+        client.post(f"/event/{event_id}/attendees/bulk-checkin", headers=auth_headers,
+                    files={"file": ("c.csv", f"email\n{emails[1]}\n{emails[2]}\n", "text/csv")})
+        messages = [ws.receive_json() for _ in range(3)]
+        assert [(m["seq"], m["type"], m["source"], len(m["attendee_ids"])) for m in messages] == [
+            (2, "checked_in", "single", 1), (3, "registered", "import", 2), (4, "checked_in", "bulk", 2)]
+
+    # A reconnecting client picks up where it left off
+    with client.websocket_connect(f"/event/{event_id}/feed/ws?token={token}&since=2") as ws:
+        assert [ws.receive_json()["seq"] for _ in range(2)] == [3, 4]
+
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect(f"/event/{event_id}/feed/ws?token=bogus") as ws:
+            ws.receive_json()
+    assert closed.value.code == 1008
+
+    status_code, events = client.portal.call(
+        read_sse, f"/event/{event_id}/feed", {**auth_headers, "Last-Event-ID": "1"}, 3)
+    assert status_code == 200
+    assert [(e["id"], e["event"]) for e in events] == [
+        ("2", "checked_in"), ("3", "registered"), ("4", "checked_in")]
+    assert json.loads(events[0]["data"])["attendee_ids"] == [attendee_id]
+
+    # timeout=0 turns the stream into a plain catch-up request
+    response = client.get(f"/event/{event_id}/feed", headers=auth_headers,
+                          params={"since": 3, "timeout": 0})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.startswith("id: 4\nevent: checked_in\n")
+    assert client.get("/event/999999/feed", headers=auth_headers).status_code == 404
+
+
+def test_retried_writes_with_an_idempotency_key_run_once(client, auth_headers):
+    event_id = client.post("/event", headers=auth_headers, json={
+        "name": "Retry Event", "location": "Test Location", "description": "Test Description",
+        "start_time": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+        "end_time": (datetime.now(timezone.utc) + timedelta(days=2)).isoformat(),
+        "max_attendees": 10}).json()["event_id"]
+    email = fake.unique.email()
+    body = {"first_name": "R", "last_name": "T", "email": email, "phone_number": "1"}
+
+    first = client.post(f"/event/{event_id}/attendees", json=body, headers={"Idempotency-Key": "reg-1"})
+    retry = client.post(f"/event/{event_id}/attendees", json=body, headers={"Idempotency-Key": "reg-1"})
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    # Without a key the same request is a duplicate registration
+    assert client.post(f"/event/{event_id}/attendees", json=body).status_code == 400
+
+    upload = {"file": ("c.csv", f"email\n{email}\n", "text/csv")}
+    headers = {**auth_headers, "Idempotency-Key": "bulk-1"}
+    first = client.post(f"/event/{event_id}/attendees/bulk-checkin", headers=headers, files=upload)
+    retry = client.post(f"/event/{event_id}/attendees/bulk-checkin", headers=headers, files=upload)
+    assert first.json()["updated"] == retry.json()["updated"] == 1
+    assert retry.json()["already_checked_in"] == 0
+    assert client.get(f"/event/{event_id}/stats", headers=auth_headers).json()["checked_in"] == 1
+
+
+def test_queued_registrations_batch_and_overflow_to_the_waitlist(client, auth_headers):
+    import httpx
+
+    event_id = client.post("/event", headers=auth_headers, json={
+        "name": "Drop Event", "location": "Test Location", "description": "Test Description",
+        "start_time": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+        "end_time": (datetime.now(timezone.utc) + timedelta(days=2)).isoformat(),
+        "max_attendees": 5, "registration_queue": True, "waitlist": True}).json()["event_id"]
+    emails = [fake.unique.email() for _ in range(8)]
+    batches = registration.queues.batches
+
+    async def ticket_drop():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                     base_url="http://testserver") as c:
+            return await asyncio.gather(*(c.post(f"/event/{event_id}/attendees", json={
+                "first_name": "Q", "last_name": "D", "email": email, "phone_number": "1"})
+                for email in emails + emails[:1]))
+
+    responses = client.portal.call(ticket_drop)
+    # Concurrent signups share a handful of transactions instead of one each
+    assert registration.queues.batches - batches < len(responses)
+    codes = [r.status_code for r in responses]
+    assert sorted(codes) == [200] * 5 + [202] * 3 + [400]
+    waitlisted = [r.json() for r in responses if r.status_code == 202]
+    assert sorted(w["position"] for w in waitlisted) == [1, 2, 3]
+    assert all(w["status"] == "waitlisted" for w in waitlisted)
+    stats = client.get(f"/event/{event_id}/stats", headers=auth_headers).json()
+    assert (stats["registered"], stats["remaining"]) == (5, 0)
+
+    # A cancelled seat goes to the head of the waitlist
+    first_in_line = min(waitlisted, key=lambda w: w["position"])["email"]
+    # The newest registration, whose id SQLite would otherwise reuse for the promotion
+    cancelled = max(r.json()["attendee_id"] for r in responses if r.status_code == 200)
+    assert client.delete(f"/event/{event_id}/attendees/{cancelled}", headers=auth_headers).status_code == 204
+    assert client.delete(f"/event/{event_id}/attendees/{cancelled}", headers=auth_headers).status_code == 404
+    attendees = client.get(f"/event/{event_id}/attendees").json()
+    assert len(attendees) == 5 and cancelled not in {a["attendee_id"] for a in attendees}
+
+    # So do seats added by raising the capacity
+    client.put(f"/event/{event_id}", headers=auth_headers, json={"max_attendees": 10})
+    assert client.get(f"/event/{event_id}/stats", headers=auth_headers).json()["registered"] == 7
+
+    feed = client.get(f"/event/{event_id}/feed", headers=auth_headers, params={"since": 0, "timeout": 0})
+    messages = [json.loads(line[len("data: "):]) for line in feed.text.splitlines()
+                if line.startswith("data: ")]
+    assert [(m["type"], m["source"]) for m in messages][-3:] == [
+        ("cancelled", "single"), ("registered", "waitlist"), ("registered", "waitlist")]
+    assert sum(len(m["attendee_ids"]) for m in messages if m["type"] == "registered") == 8
+    # The promoted attendee is registered now, not waiting
+    again = client.post(f"/event/{event_id}/attendees", json={
+        "first_name": "Q", "last_name": "D", "email": first_in_line, "phone_number": "1"})
+    assert (again.status_code, again.json()["detail"]) == (400, crud.DUPLICATE_REGISTRATION)
+
+
+def test_full_event_with_a_waitlist_answers_202(client, auth_headers):
+    event_id = client.post("/event", headers=auth_headers, json={
+        "name": "Waitlist Event", "location": "Test Location", "description": "Test Description",
+        "start_time": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+        "end_time": (datetime.now(timezone.utc) + timedelta(days=2)).isoformat(),
+        "max_attendees": 1, "waitlist": True}).json()["event_id"]
+    bodies = [{"first_name": "W", "last_name": "L", "email": fake.unique.email(), "phone_number": "1"}
+              for _ in range(3)]
+    first, second, third = (client.post(f"/event/{event_id}/attendees", json=b) for b in bodies)
+    assert first.status_code == 200
+    assert (second.status_code, second.json()["position"]) == (202, 1)
+    assert (third.status_code, third.json()["position"]) == (202, 2)
+    again = client.post(f"/event/{event_id}/attendees", json=bodies[1])
+    assert again.status_code == 400 and "waitlist" in again.json()["detail"]
+
+    # Without a waitlist a full event still turns people away
+    client.put(f"/event/{event_id}", headers=auth_headers, json={"waitlist": False})
+    extra = {**bodies[0], "email": fake.unique.email()}
+    assert client.post(f"/event/{event_id}/attendees", json=extra).status_code == 400
+
+
+def test_import_overflow_joins_the_waitlist(client, auth_headers):
+    event_id = client.post("/event", headers=auth_headers, json={
+        "name": "Waitlist Import", "location": "Test Location", "description": "Test Description",
+        "start_time": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+        "end_time": (datetime.now(timezone.utc) + timedelta(days=2)).isoformat(),
+        "max_attendees": 1, "waitlist": True}).json()["event_id"]
+    waiting = {"first_name": "W", "last_name": "L", "email": fake.unique.email(), "phone_number": "1"}
+    assert client.post(f"/event/{event_id}/attendees", json=waiting).status_code == 200
+    assert client.post(f"/event/{event_id}/attendees",
+                       json={**waiting, "email": fake.unique.email()}).json()["position"] == 1
+
+    rows = [{**waiting, "email": fake.unique.email()} for _ in range(2)]
+    response = client.post(f"/event/{event_id}/attendees/import", headers=auth_headers, json=rows)
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["created"], result["waitlisted"], result["full"]) == (0, 2, 0)
+    assert [(row["status"], row["position"]) for row in result["rows"]] == [("waitlisted", 2), ("waitlisted", 3)]
+
+    response = client.post(f"/event/{event_id}/attendees/import", headers=auth_headers, json=rows[:1])
+    assert response.json()["rows"][0]["detail"].endswith("already on the waitlist for this event")
+    # Imported entries are promoted in turn like any other
+    client.put(f"/event/{event_id}", headers=auth_headers, json={"max_attendees": 3})
+    emails = [a["email"] for a in client.get(f"/event/{event_id}/attendees").json()]
+    assert emails[2] == rows[0]["email"]
+
+
+def test_concurrent_checkins_share_transactions(client, auth_headers):
+    import httpx
+
+    def create():
+        return client.post("/event", headers=auth_headers, json={
+            "name": "Door Event", "location": "Test Location", "description": "Test Description",
+            "start_time": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+            "end_time": (datetime.now(timezone.utc) + timedelta(days=2)).isoformat(),
+            "max_attendees": 20}).json()["event_id"]
+
+    event_id, other_id = create(), create()
+    ids = [client.post(f"/event/{event_id}/attendees", json={
+        "first_name": "D", "last_name": str(n), "email": fake.unique.email(), "phone_number": "1"
+    }).json()["attendee_id"] for n in range(10)]
+    batches = checkins.batcher.batches
+
+    async def scan(paths):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                     base_url="http://testserver") as c:
+            return await asyncio.gather(*(c.put(path, headers=auth_headers) for path in paths))
+
+    # Every attendee once, three scanned twice, one unknown and one at the wrong event
+    paths = [f"/event/{event_id}/attendees/{i}/checkin" for i in ids + ids[:3] + [999999]]
+    paths.append(f"/event/{other_id}/attendees/{ids[0]}/checkin")
+    responses = client.portal.call(scan, paths)
+    assert [r.status_code for r in responses] == [200] * 13 + [404] * 2
+    assert all(r.json()["check_in_status"] is True for r in responses[:13])
+    assert responses[0].json()["email"] and responses[0].json()["attendee_id"] == ids[0]
+    assert checkins.batcher.batches - batches < len(paths)
+
+    stats = client.get(f"/event/{event_id}/stats", headers=auth_headers).json()
+    assert stats["checked_in"] == 10
+    series = client.get(f"/event/{event_id}/stats/checkins", headers=auth_headers).json()
+    assert sum(bucket["count"] for bucket in series) == 10
+    feed = client.get(f"/event/{event_id}/feed", headers=auth_headers, params={"since": 0, "timeout": 0})
+    messages = [json.loads(line[len("data: "):]) for line in feed.text.splitlines()
+                if line.startswith("data: ")]
+    assert sorted(i for m in messages if m["type"] == "checked_in" for i in m["attendee_ids"]) == ids
+
+    response = client.put(f"/event/{event_id}/attendees/{ids[0]}/checkin",
+                          params={"check_in_status": False}, headers=auth_headers)
+    assert response.json()["check_in_status"] is False
+    assert client.get(f"/event/{event_id}/stats", headers=auth_headers).json()["checked_in"] == 9
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,102 @@
+import asyncio
+import csv
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud
+from app.database import Base, async_url
+from app.models import Attendee, Event
+
+ROWS = 100_000
+# Generous ceilings: the old row-at-a-time path needed minutes and held
+# the whole upload in memory, the chunked path needs a few seconds.
+MAX_SECONDS = 30
+MAX_PEAK_MEMORY = 32 * 1024 * 1024
+
+
+@pytest.fixture
+def bench_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'bench.db'}"
+
+
+@pytest.fixture
+def bench_db(bench_url):
+    engine = create_engine(bench_url)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield db
+    finally:
+        db.close()
+        engine.dispose()
+
+
+async def run_bulk_checkin(url, event_id, csv_path):
+    engine = create_async_engine(async_url(url))
+    try:
+        async with AsyncSession(engine) as db:
+            with open(csv_path, newline="") as f:
+                return await crud.bulk_checkin(db, event_id, csv.DictReader(f))
+    finally:
+        await engine.dispose()
+
+
+def test_bulk_checkin_100k_rows_bounded_time_and_memory(bench_db, bench_url, tmp_path):
+    event = Event(
+        name="Benchmark Event",
+        description="Bulk check-in benchmark",
+        location="Stadium",
+        start_time=datetime.now(timezone.utc) + timedelta(days=1),
+        end_time=datetime.now(timezone.utc) + timedelta(days=2),
+        max_attendees=ROWS,
+    )
+    bench_db.add(event)
+    bench_db.commit()
+    bench_db.execute(insert(Attendee), [
+        {
+            "attendee_id": i,
+            "first_name": "First",
+            "last_name": "Last",
+            "email": f"attendee{i}@example.com",
+            "phone_number": "555-0100",
+            "event_id": event.event_id,
+            "check_in_status": False,
+        }
+        for i in range(1, ROWS + 1)
+    ])
+    bench_db.commit()
+
+    # Half the file keys on attendee_id, the other half on email
+    csv_path = tmp_path / "checkin.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["attendee_id", "email"])
+        for i in range(1, ROWS + 1):
+            if i % 2:
+                writer.writerow([i, ""])
+            else:
+                writer.writerow(["", f"attendee{i}@example.com"])
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = asyncio.run(run_bulk_checkin(bench_url, event.event_id, csv_path))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert result["updated"] == ROWS
+    assert result["already_checked_in"] == 0
+    assert result["not_found"] == []
+    assert result["malformed"] == []
+    checked_in = bench_db.scalar(
+        select(func.count()).select_from(Attendee).where(Attendee.check_in_status.is_(True)))
+    assert checked_in == ROWS
+
+    assert elapsed < MAX_SECONDS, f"bulk check-in took {elapsed:.1f}s"
+    assert peak < MAX_PEAK_MEMORY, f"bulk check-in peaked at {peak / 2**20:.1f} MiB"
@@ -0,0 +1,82 @@
+import asyncio
+
+from app.cache import MemoryCacheBackend, ResponseCache
+
+
+class FakeRedis:
+    """Stands in for redis.asyncio.Redis: bytes in, bytes out."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, b"0")) + 1).encode()
+        return int(self.data[key])
+
+
+def test_memory_backend_evicts_least_recently_used():
+    async def run():
+        backend = MemoryCacheBackend(max_entries=2, max_bytes=1024)
+        await backend.set("a", b"1")
+        await backend.set("b", b"2")
+        await backend.get("a")
+        await backend.set("c", b"3")
+        return [await backend.get(key) for key in "abc"]
+
+    assert asyncio.run(run()) == [b"1", None, b"3"]
+
+
+def test_memory_backend_respects_byte_budget_and_ttl():
+    async def run():
+        backend = MemoryCacheBackend(max_entries=10, max_bytes=8)
+        await backend.set("big", b"x" * 9)
+        await backend.set("a", b"1234")
+        await backend.set("b", b"5678")
+        await backend.set("c", b"9")
+        await backend.set("expired", b"0", ex=-1)
+        return [await backend.get(key) for key in ("big", "a", "b", "c", "expired")]
+
+    assert asyncio.run(run()) == [None, None, b"5678", b"9", None]
+
+
+def test_memory_backend_set_if_absent_and_delete():
+    async def run():
+        backend = MemoryCacheBackend(max_entries=10, max_bytes=8)
+        claimed = await backend.set("k", b"1", nx=True)
+        taken = await backend.set("k", b"2", nx=True)
+        # Replacing a value with one too big to keep drops the old one too
+        await backend.set("k", b"x" * 9)
+        after_oversize = await backend.get("k")
+        await backend.set("k", b"3")
+        deleted = [await backend.delete("k"), await backend.delete("k")]
+        return claimed, taken, after_oversize, deleted, await backend.set("k", b"4", nx=True)
+
+    assert asyncio.run(run()) == (True, None, None, [1, 0], True)
+
+
+def test_response_cache_invalidation_on_redis_compatible_backend():
+    async def run():
+        cache = ResponseCache(FakeRedis(), ttl=30)
+        key = await cache.key("events", "/events", {"status": "scheduled", "after": None})
+        assert await cache.get(key) is None
+        stored = await cache.put(key, b"[]", next_cursor="7")
+
+        cached = await cache.get(key)
+        assert (cached.etag, cached.body, cached.next_cursor) == (stored.etag, b"[]", "7")
+        # Same filters, other order: same key
+        assert await cache.key("events", "/events", {"after": None, "status": "scheduled"}) == key
+
+        await cache.invalidate("attendees:1")
+        assert await cache.key("events", "/events", {"status": "scheduled"}) == key
+        await cache.invalidate("events")
+        new_key = await cache.key("events", "/events", {"status": "scheduled"})
+        assert new_key != key
+        assert await cache.get(new_key) is None
+
+    asyncio.run(run())
@@ -0,0 +1,82 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.checkins import CheckinBatcher
+from app.database import Base, make_async_engine
+from app.models import Attendee, Event
+
+SCANS = 600
+# Scanners at the entrance, each sending its next scan as soon as the last one is answered
+SCANNERS = 40
+# Conservative: batching is over ten times faster here, but CI machines are noisy
+MIN_SPEEDUP = 3
+
+
+def seed(url):
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        now = datetime.now(timezone.utc)
+        db.add_all([Event(event_id=event_id, name="Door", description="d", location="Stadium",
+                          max_attendees=SCANS, attendee_count=SCANS,
+                          start_time=now + timedelta(days=1), end_time=now + timedelta(days=2))
+                    for event_id in (1, 2)])
+        db.execute(insert(Attendee), [
+            {"attendee_id": i, "event_id": 1 + i % 2, "first_name": "F", "last_name": "L",
+             "email": f"door{i}@example.com", "phone_number": "1", "check_in_status": False}
+            for i in range(1, 2 * SCANS + 1)])
+        db.commit()
+    engine.dispose()
+
+
+async def scan_all(url, attendee_ids, checkin):
+    engine = make_async_engine(url)
+    sessions = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    queue = iter(attendee_ids)
+
+    async def scanner():
+        for attendee_id in queue:
+            await checkin(sessions, 1 + attendee_id % 2, attendee_id)
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(scanner() for _ in range(SCANNERS)))
+        return time.perf_counter() - started
+    finally:
+        await engine.dispose()
+
+
+def test_batched_checkins_outpace_one_transaction_per_scan(tmp_path):
+    url = f"sqlite:///{tmp_path / 'door.db'}"
+    seed(url)
+
+    async def one_transaction_each(sessions, event_id, attendee_id):
+        async with sessions() as db:
+            await crud.checkin_attendee(db, event_id, attendee_id)
+
+    batcher = CheckinBatcher()
+
+    async def batched(sessions, event_id, attendee_id):
+        batcher.session_factory = sessions
+        await batcher.submit(event_id, attendee_id)
+
+    unbatched_seconds = asyncio.run(scan_all(url, range(1, SCANS + 1), one_transaction_each))
+    batched_seconds = asyncio.run(scan_all(url, range(SCANS + 1, 2 * SCANS + 1), batched))
+
+    engine = create_engine(url)
+    with Session(engine) as db:
+        assert db.scalar(select(func.count()).select_from(Attendee)
+                         .where(Attendee.check_in_status.is_(True))) == 2 * SCANS
+        assert db.scalar(select(func.sum(Event.checked_in_count))) == 2 * SCANS
+    engine.dispose()
+    assert batcher.batches < SCANS / 4
+    print(f"\n{SCANS} check-ins from {SCANNERS} scanners: {SCANS / unbatched_seconds:.0f}/s "
+          f"one transaction each, {SCANS / batched_seconds:.0f}/s batched "
+          f"({batcher.batches} transactions)")
+    assert unbatched_seconds / batched_seconds >= MIN_SPEEDUP
@@ -0,0 +1,62 @@
+"""Requests handing work to a background writer must not hold a pooled connection meanwhile.
+
+The writers open sessions of their own, so a request that keeps its
+connection while it waits can starve the very writer it is waiting on.
+Each test sends more concurrent requests than the pool has connections.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.orm import Session
+
+from app import auth, registration
+from app.main import app
+from app.models import Attendee, Event, User
+
+POOL = {"pool_size": 2, "max_overflow": 1, "pool_timeout": 3}
+CLIENTS = 12
+
+
+@pytest.fixture
+def database(app_db):
+    database = app_db("handoff.db", **POOL)
+    now = datetime.now(timezone.utc)
+    with Session(database.engine) as db:
+        db.add(Event(event_id=1, name="Drop", description="d", location="Hall",
+                     max_attendees=2 * CLIENTS, attendee_count=CLIENTS, registration_queue=True,
+                     start_time=now + timedelta(days=1), end_time=now + timedelta(days=2)))
+        db.add(User(username="door", hashed_password="", role="staff"))
+        db.add_all([Attendee(event_id=1, first_name="D", last_name=str(n), phone_number="1",
+                             email=f"d{n}@example.com", check_in_status=False) for n in range(CLIENTS)])
+        db.commit()
+    return database
+
+
+def test_queued_registrations_release_their_connection(database, run_asgi, monkeypatch):
+    # Not yet known to be queued, so every request finds out for itself first
+    monkeypatch.setattr(registration, "queues", registration.RegistrationQueues(database.sessions))
+
+    async def requests(client):
+        return await asyncio.gather(*(client.post("/event/1/attendees", json={
+            "first_name": "Q", "last_name": str(n), "email": f"q{n}@example.com", "phone_number": "1"})
+            for n in range(CLIENTS)))
+
+    responses = run_asgi(app, requests)
+    assert [response.status_code for response in responses] == [200] * CLIENTS
+    assert len({response.json()["attendee_id"] for response in responses}) == CLIENTS
+
+
+def test_cold_token_checkins_release_their_connection(database, run_asgi, monkeypatch):
+    # Every token is new, so each request looks its user up before checking in
+    monkeypatch.setattr(auth, "token_cache", auth.TokenCache())
+    tokens = [auth.create_access_token({"sub": "door", "scanner": n}) for n in range(CLIENTS)]
+
+    async def requests(client):
+        return await asyncio.gather(*(client.put(f"/event/1/attendees/{n + 1}/checkin",
+                                                 headers={"Authorization": f"Bearer {token}"})
+                                      for n, token in enumerate(tokens)))
+
+    responses = run_asgi(app, requests)
+    assert [response.status_code for response in responses] == [200] * CLIENTS
+    assert all(response.json()["check_in_status"] for response in responses)
@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from app import crud, database
+from app.database import Base, BlockingSession, async_url, engine_profile, make_async_engine, make_engine
+from app.models import Attendee, Event
+from app.schemas import AttendeeCreate
+
+# Concurrent writers in the lock-contention test
+WRITERS = 32
+
+# CPU-bound inside SQLite for a few hundred milliseconds
+SLOW_QUERY = text(
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 1500000) "
+    "SELECT count(*) FROM c"
+)
+
+
+async def ticks_during_query(db):
+    """Count how often another coroutine got to run while ``db`` queried."""
+    ticks = 0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal ticks
+        while not done.is_set():
+            await asyncio.sleep(0.005)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    assert (await db.scalar(SLOW_QUERY)) == 1500000
+    done.set()
+    await task
+    return ticks
+
+
+def test_async_url_picks_asyncio_driver():
+    assert async_url("sqlite:///./events.db") == "sqlite+aiosqlite:///./events.db"
+    assert async_url("postgresql://u:p@db/events") == "postgresql+asyncpg://u:p@db/events"
+    assert async_url("sqlite+aiosqlite:///x.db") == "sqlite+aiosqlite:///x.db"
+    with pytest.raises(ValueError):
+        async_url("mssql+pyodbc://db/events")
+
+
+def test_unknown_profile_names_the_valid_ones():
+    assert engine_profile("medium")["pool_size"] == 10
+    with pytest.raises(ValueError, match="small, medium, large"):
+        engine_profile("medum")
+
+
+def test_suite_keeps_the_app_off_the_local_database():
+    # Startup migrations in tests must never touch the tracked events.db
+    assert database.async_engine.url.database == database.engine.url.database == "test.db"
+
+
+def test_async_mode_keeps_event_loop_responsive(tmp_path):
+    url = f"sqlite:///{tmp_path / 'loop.db'}"
+
+    async def run():
+        engine = create_async_engine(async_url(url))
+        try:
+            async with AsyncSession(engine) as db:
+                return await ticks_during_query(db)
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(run()) >= 5
+
+
+def test_sync_mode_blocks_event_loop(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'loop.db'}")
+    db = BlockingSession(Session(engine))
+    try:
+        assert asyncio.run(ticks_during_query(db)) <= 1
+    finally:
+        asyncio.run(db.close())
+        engine.dispose()
+
+
+def test_tuned_sqlite_has_no_lock_errors_with_concurrent_writers(tmp_path):
+    url = f"sqlite:///{tmp_path / 'writers.db'}"
+    sync_engine = make_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+    with sync_engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+    with Session(sync_engine) as db:
+        event = Event(name="Writers", description="d", location="Hall", max_attendees=WRITERS,
+                      start_time=datetime.now(timezone.utc) + timedelta(days=1),
+                      end_time=datetime.now(timezone.utc) + timedelta(days=2))
+        db.add(event)
+        db.commit()
+        event_id = event.event_id
+
+    async def writer(sessions, i):
+        async with sessions() as db:
+            await crud.register_attendee(db, event_id, AttendeeCreate(
+                first_name="W", last_name=str(i), email=f"writer{i}@example.com", phone_number="1"))
+            await crud.bulk_checkin(db, event_id, [{"email": f"writer{i}@example.com"}])
+
+    async def reader(sessions):
+        async with sessions() as db:
+            return await crud.get_attendee_count(db, event_id)
+
+    async def run():
+        async_engine = make_async_engine(url)
+        sessions = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+        try:
+            tasks = [writer(sessions, i) for i in range(WRITERS)]
+            tasks += [reader(sessions) for _ in range(WRITERS)]
+            return await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            await async_engine.dispose()
+
+    results = asyncio.run(run())
+    assert [r for r in results if isinstance(r, Exception)] == []
+    with Session(sync_engine) as db:
+        assert db.get(Event, event_id).attendee_count == WRITERS
+        assert db.scalar(select(func.count()).select_from(Attendee)
+                         .where(Attendee.check_in_status.is_(True))) == WRITERS
+    sync_engine.dispose()
@@ -0,0 +1,68 @@
+import asyncio
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+
+from app import export
+from app.database import Base, async_url
+from app.models import Attendee, Event
+
+ROWS = 200_000
+# Materializing the list would cost hundreds of MiB at this size; the
+# stream only ever holds one batch
+MAX_PEAK_MEMORY = 16 * 1024 * 1024
+# Measured under tracemalloc, which slows allocation-heavy code several-fold
+MAX_FIRST_ROWS_SECONDS = 1.5
+
+
+async def run_export(url, event_id, export_format):
+    engine = create_async_engine(async_url(url))
+    try:
+        db = AsyncSession(engine)
+        started = time.perf_counter()
+        first_rows = None
+        size = lines = 0
+        async for chunk in export.stream_rows(db, export.attendees_query(event_id), export_format):
+            if first_rows is None and lines:
+                first_rows = time.perf_counter() - started
+            size += len(chunk)
+            lines += chunk.count("\n")
+        return first_rows, size, lines
+    finally:
+        await engine.dispose()
+
+
+def test_export_streams_in_constant_memory(tmp_path):
+    url = f"sqlite:///{tmp_path / 'export.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        event = Event(name="Export", description="d", location="Hall", max_attendees=ROWS,
+                      start_time=datetime.now(timezone.utc) + timedelta(days=1),
+                      end_time=datetime.now(timezone.utc) + timedelta(days=2))
+        db.add(event)
+        db.commit()
+        event_id = event.event_id
+        db.execute(insert(Attendee), [
+            {"first_name": "First", "last_name": "Last", "email": f"attendee{i}@example.com",
+             "phone_number": "555-0100", "event_id": event_id, "check_in_status": False}
+            for i in range(ROWS)
+        ])
+        db.commit()
+    engine.dispose()
+
+    for export_format, expected_lines in (("csv", ROWS + 1), ("ndjson", ROWS)):
+        tracemalloc.start()
+        first_rows, size, lines = asyncio.run(run_export(url, event_id, export_format))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        assert lines == expected_lines
+        assert peak < MAX_PEAK_MEMORY, \
+            f"{export_format} export of {size / 2**20:.0f} MiB peaked at {peak / 2**20:.1f} MiB"
+        assert first_rows < MAX_FIRST_ROWS_SECONDS, \
+            f"first {export_format} rows took {first_rows:.2f}s"
@@ -0,0 +1,88 @@
+import asyncio
+
+from app.feed import FeedBroker, LocalFeedBackend
+
+
+def collect(subscription):
+    """Messages already queued for ``subscription``, without waiting for more."""
+    messages = []
+    while (message := subscription.poll()) is not None:
+        messages.append(message)
+    return messages
+
+
+def test_messages_are_numbered_per_event_and_fanned_out():
+    async def scenario():
+        broker = FeedBroker(LocalFeedBackend())
+        first, second = broker.subscribe(1), broker.subscribe(1)
+        other = broker.subscribe(2)
+        await broker.publish(1, "registered", attendee_ids=[10])
+        await broker.publish(2, "registered", attendee_ids=[20])
+        await broker.publish(1, "checked_in", attendee_ids=[10])
+        return collect(first), collect(second), collect(other)
+
+    first, second, other = asyncio.run(scenario())
+    assert [(m["seq"], m["type"]) for m in first] == [(1, "registered"), (2, "checked_in")]
+    assert second == first
+    assert [(m["seq"], m["attendee_ids"]) for m in other] == [(1, [20])]
+
+
+def test_subscribers_resume_from_a_sequence_number():
+    async def scenario():
+        broker = FeedBroker(LocalFeedBackend(), history=3)
+        for attendee_id in range(5):
+            await broker.publish(1, "checked_in", attendee_ids=[attendee_id])
+        return (collect(broker.subscribe(1, since=3)), collect(broker.subscribe(1, since=5)),
+                collect(broker.subscribe(1, since=0)), collect(broker.subscribe(1, since=9)))
+
+    caught_up, current, too_old, from_the_future = asyncio.run(scenario())
+    assert [m["seq"] for m in caught_up] == [4, 5]
+    assert current == []
+    # Messages 1 and 2 are gone: the client is told to reload, then gets the rest
+    assert [(m["type"], m["seq"]) for m in too_old] == [("reset", 2), ("checked_in", 3),
+                                                          ("checked_in", 4), ("checked_in", 5)]
+    # A seq from before a restart is just as unusable
+    assert [m["type"] for m in from_the_future] == ["reset", "checked_in", "checked_in", "checked_in"]
+
+
+def test_slow_consumers_are_dropped_without_holding_up_others():
+    async def scenario():
+        broker = FeedBroker(LocalFeedBackend(), queue_size=2)
+        slow, fast = broker.subscribe(1), broker.subscribe(1)
+        received = []
+        for attendee_id in range(4):
+            await broker.publish(1, "registered", attendee_ids=[attendee_id])
+            received.extend(collect(fast))
+        # The slow subscriber still gets what was queued, then its stream ends
+        queued = [message async for message in slow]
+        return slow.dropped, queued, received, broker._subscribers
+
+    dropped, queued, received, subscribers = asyncio.run(scenario())
+    assert dropped
+    assert [m["seq"] for m in queued] == [1, 2]
+    assert [m["seq"] for m in received] == [1, 2, 3, 4]
+    assert len(subscribers[1]) == 1
+
+
+def test_history_is_kept_for_the_most_recently_active_events():
+    async def scenario():
+        broker = FeedBroker(LocalFeedBackend(), history_events=2)
+        for event_id in (1, 2, 1, 3):
+            await broker.publish(event_id, "registered", attendee_ids=[])
+        return list(broker._history)
+
+    assert asyncio.run(scenario()) == [1, 3]
+
+
+def test_stop_ends_every_subscription():
+    async def scenario():
+        broker = FeedBroker(LocalFeedBackend())
+        subscription = broker.subscribe(1)
+        await broker.publish(1, "registered", attendee_ids=[1])
+        await broker.stop()
+        return [message async for message in subscription], subscription.dropped, broker._subscribers
+
+    messages, dropped, subscribers = asyncio.run(scenario())
+    assert [m["seq"] for m in messages] == [1]
+    assert not dropped
+    assert subscribers == {}
@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI, HTTPException
+
+from app import idempotency
+from app.cache import MemoryCacheBackend
+
+
+def make_app(wait_seconds=1.0):
+    app = FastAPI()
+    app.add_middleware(idempotency.IdempotencyMiddleware, wait_seconds=wait_seconds,
+                       routes=[("POST", "/orders"), ("POST", "/flaky")])
+    app.state.calls = 0
+
+    @app.post("/orders")
+    async def create_order():
+        app.state.calls += 1
+        await asyncio.sleep(0.05)
+        return {"order": app.state.calls}
+
+    @app.post("/flaky")
+    async def flaky():
+        app.state.calls += 1
+        if app.state.calls == 1:
+            raise HTTPException(status_code=503, detail="Try again")
+        return {"ok": app.state.calls}
+
+    @app.post("/unlisted")
+    async def unlisted():
+        app.state.calls += 1
+        return {"call": app.state.calls}
+
+    return app
+
+
+@pytest.fixture(autouse=True)
+def fresh_store(monkeypatch):
+    monkeypatch.setattr(idempotency.store, "backend", MemoryCacheBackend())
+
+
+def test_concurrent_duplicates_run_once_and_share_the_response(run_asgi):
+    app = make_app()
+    headers = {"Idempotency-Key": "order-1"}
+
+    async def requests(client):
+        burst = await asyncio.gather(*(client.post("/orders", headers=headers) for _ in range(5)))
+        later = await client.post("/orders", headers=headers)
+        other = await client.post("/orders", headers={"Idempotency-Key": "order-2"})
+        someone_else = await client.post("/orders", headers={**headers, "Authorization": "Bearer x"})
+        return burst, later, other, someone_else
+
+    burst, later, other, someone_else = run_asgi(app, requests)
+    assert [r.json() for r in burst + [later]] == [{"order": 1}] * 6
+    assert sum(r.headers.get("idempotent-replayed") == "true" for r in burst) == 4
+    assert later.headers["idempotent-replayed"] == "true"
+    assert later.headers["content-type"] == "application/json"
+    # A new key, or the same key from other credentials, is a new request
+    assert other.json() == {"order": 2}
+    assert someone_else.json() == {"order": 3}
+    assert app.state.calls == 3
+
+
+def test_server_errors_release_the_key(run_asgi):
+    app = make_app()
+    headers = {"Idempotency-Key": "retry-me"}
+
+    async def requests(client):
+        return [await client.post("/flaky", headers=headers) for _ in range(3)]
+
+    first, second, third = run_asgi(app, requests)
+    assert first.status_code == 503
+    assert second.json() == third.json() == {"ok": 2}
+    assert app.state.calls == 2
+
+
+def test_a_key_reused_with_another_body_is_rejected(run_asgi):
+    app = make_app()
+    headers = {"Idempotency-Key": "order-1"}
+
+    async def requests(client):
+        first = await client.post("/orders", headers=headers, json={"item": "a"})
+        retry = await client.post("/orders", headers=headers, json={"item": "a"})
+        changed = await client.post("/orders", headers=headers, json={"item": "b"})
+        # Each attempt gets its own multipart boundary
+        uploads = [await client.post("/orders", headers={"Idempotency-Key": "upload"},
+                                     files={"file": ("a.csv", b"email\na@example.com\n" * 1000)})
+                   for _ in range(2)]
+        return first, retry, changed, uploads
+
+    first, retry, changed, uploads = run_asgi(app, requests)
+    assert retry.json() == first.json() == {"order": 1}
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert changed.status_code == 422
+    assert "different request body" in changed.json()["detail"]
+    assert [r.json() for r in uploads] == [{"order": 2}] * 2
+    assert uploads[1].headers["idempotent-replayed"] == "true"
+    assert app.state.calls == 2
+
+
+def test_body_hash_ignores_multipart_boundaries_split_across_chunks():
+    async def digest(boundary, chunk_size):
+        body = b"".join(b"--" + boundary + b"\r\npart %d\r\n" % i for i in range(3)) + b"--" + boundary + b"--"
+        chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+        messages = iter([{"type": "http.request", "body": chunk, "more_body": n < len(chunks) - 1}
+                         for n, chunk in enumerate(chunks)])
+
+        async def receive():
+            return next(messages)
+
+        scope = {"headers": [(b"content-type", b"multipart/form-data; boundary=" + boundary)]}
+        return await idempotency.BodyHash(scope, receive).hexdigest()
+
+    async def digests():
+        return {await digest(boundary, size) for boundary in (b"abc123", b"zz99yy")
+                for size in (1, 5, 1000)}
+
+    assert len(asyncio.run(digests())) == 1
+
+
+def test_keys_are_ignored_off_the_listed_routes_and_validated_on_them(run_asgi):
+    app = make_app()
+
+    async def requests(client):
+        return ([await client.post("/unlisted", headers={"Idempotency-Key": "k"}) for _ in range(2)],
+                await client.post("/orders", headers={"Idempotency-Key": "k" * 256}))
+
+    unlisted, too_long = run_asgi(app, requests)
+    assert [r.json()["call"] for r in unlisted] == [1, 2]
+    assert too_long.status_code == 400
+
+
+def test_duplicate_of_a_request_held_elsewhere_gives_up_with_409(run_asgi):
+    app = make_app(wait_seconds=0.1)
+
+    async def requests(client):
+        # As if another worker had claimed the key and was still running
+        scope = {"method": "POST", "path": "/orders", "headers": []}
+        await idempotency.store.backend.set(
+            idempotency.store.key(scope, "/orders", b"busy"), idempotency.PENDING, ex=60)
+        return await client.post("/orders", headers={"Idempotency-Key": "busy"})
+
+    response = run_asgi(app, requests)
+    assert response.status_code == 409
+    assert response.headers["retry-after"] == "1"
+    assert app.state.calls == 0
@@ -0,0 +1,88 @@
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+import pytest
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from app import serialization
+from app.database import Base
+from app.main import app
+from app.models import Attendee, Event, EventStatus
+from app.schemas import Attendee as AttendeeSchema, Event as EventSchema
+
+ROWS = 10_000
+# Conservative: the column path costs 2.5x (events) to 10x (attendees) less CPU here,
+# fetching included, but CI machines are noisy
+MIN_SPEEDUP = 1.5
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('lists') / 'lists.db'}")
+    Base.metadata.create_all(bind=engine)
+    now = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        conn.execute(insert(Event), [
+            {"event_id": i, "name": f"Événement {i}", "description": "Quoted \"text\"\nand lines",
+             "location": "Hall", "max_attendees": 100, "status": list(EventStatus)[i % 4],
+             "waitlist": i % 2 == 0, "start_time": now + timedelta(days=1),
+             "end_time": now + timedelta(days=2)}
+            for i in range(1, ROWS + 1)])
+        conn.execute(insert(Attendee), [
+            {"attendee_id": i, "event_id": 1, "first_name": "Zoë", "last_name": str(i),
+             "email": f"a{i}@example.com", "phone_number": "555-0100", "check_in_status": i % 3 == 0}
+            for i in range(1, ROWS + 1)])
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def model_path(db, model, schema) -> bytes:
+    """What the list routes did before: ORM objects validated into models, then dumped."""
+    adapter = TypeAdapter(List[schema])
+    rows = db.scalars(select(model).order_by(*model.__table__.primary_key)).all()
+    return adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+
+
+def column_path(db, model, schema) -> bytes:
+    query = select(*serialization.schema_columns(model, schema)).order_by(
+        *model.__table__.primary_key)
+    return serialization.dump_rows(serialization.column_names(query), db.execute(query).all())
+
+
+def cpu_seconds(path, db, model, schema):
+    db.expunge_all()
+    started = time.process_time()
+    body = path(db, model, schema)
+    return time.process_time() - started, body
+
+
+@pytest.mark.parametrize("model, schema", [(Event, EventSchema), (Attendee, AttendeeSchema)])
+def test_column_path_matches_models_at_a_fraction_of_the_cpu(db, model, schema):
+    # Warm both paths up, so neither pays for first-use setup in the timing
+    model_path(db, model, schema), column_path(db, model, schema)
+    model_seconds, expected = cpu_seconds(model_path, db, model, schema)
+    column_seconds, body = cpu_seconds(column_path, db, model, schema)
+
+    assert body == expected
+    print(f"\n{model.__name__}: {model_seconds * 1000:.0f} ms CPU per {ROWS} rows through models, "
+          f"{column_seconds * 1000:.0f} ms from columns")
+    assert model_seconds / column_seconds >= MIN_SPEEDUP
+
+
+def test_stdlib_fallback_writes_the_same_bytes(db, monkeypatch):
+    expected = column_path(db, Event, EventSchema)
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert column_path(db, Event, EventSchema) == expected
+    assert serialization.dump_ndjson(["a"], [("é",)]) == '{"a":"é"}\n'.encode()
+
+
+def test_list_routes_keep_their_response_schemas():
+    paths = app.openapi()["paths"]
+    for path, schema in [("/events", "Event"), ("/events/search", "Event"),
+                         ("/event/{event_id}/attendees", "Attendee")]:
+        response = paths[path]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+        assert (response["type"], response["items"]) == ("array", {"$ref": f"#/components/schemas/{schema}"})
@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+from fastapi.routing import APIRoute
+
+from app.main import app
+from benchmarks import loadtest
+
+SMALL = dict(requests=6, auth_requests=2, concurrency=3)
+
+
+def test_harness_covers_every_route():
+    routes = {f"{method} {route.path}" for route in app.routes if isinstance(route, APIRoute)
+              for method in route.methods}
+    assert {scenario.name for scenario in loadtest.SCENARIOS} == routes
+
+
+def test_in_process_run_reports_every_route(tmp_path):
+    url = f"sqlite:///{tmp_path / 'bench.db'}"
+    dataset = loadtest.seed(url, events=3, attendees_per_event=20)
+    routes = asyncio.run(loadtest.run(url, dataset, "asgi", **SMALL))
+
+    assert list(routes) == [scenario.name for scenario in loadtest.SCENARIOS]
+    for name, stats in routes.items():
+        assert stats["errors"] == 0, (name, stats.get("first_error"))
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"] <= stats["max_ms"]
+        assert stats["throughput_rps"] > 0
+    assert routes["POST /token"]["requests"] == SMALL["auth_requests"]
+    assert routes["GET /events"]["requests"] == SMALL["requests"]
+
+
+def test_uvicorn_run_and_threshold_mode(tmp_path):
+    database = tmp_path / "bench.db"
+    first, second = tmp_path / "first.json", tmp_path / "second.json"
+    args = ["--mode", "uvicorn", "--events", "2", "--attendees", "10", "--requests", "5",
+            "--route", "GET /events", "--database", str(database)]
+
+    assert loadtest.main(args + ["--output", str(first)]) == 0
+    result = json.loads(first.read_text())
+    assert result["meta"]["mode"] == "uvicorn"
+    assert set(result["routes"]) == {s.name for s in loadtest.select_scenarios(["GET /events"])}
+    assert "GET /events/export" in result["routes"]
+    assert result["routes"]["GET /events"]["errors"] == 0
+
+    # An impossibly fast baseline turns the same run into a regression
+    for stats in result["routes"].values():
+        stats["p95_ms"] /= 1000
+    first.write_text(json.dumps(result))
+    assert loadtest.main(args + ["--output", str(second), "--baseline", str(first)]) == 1
+
+
+def test_compare_flags_slower_and_failing_routes():
+    def run(p95, rps, errors=0):
+        return {"p95_ms": p95, "throughput_rps": rps, "errors": errors}
+
+    baseline = {"routes": {"GET /events": run(10, 100), "GET /scheduler": run(5, 200),
+                           "POST /token": run(200, 5)}}
+    current = {"routes": {"GET /events": run(11, 95), "GET /scheduler": run(5, 100),
+                          "POST /token": run(200, 5, errors=1), "GET /new": run(1, 1)}}
+    regressions = loadtest.compare(current, baseline, tolerance=0.25)
+    assert [line.split(":")[0] for line in regressions] == ["GET /scheduler", "POST /token"]
@@ -0,0 +1,157 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import auth, metrics
+from app.database import make_engine
+from app.main import app
+from app.models import Event, User
+
+
+@pytest.fixture
+def metrics_db(app_db):
+    database = app_db("metrics.db")
+    with Session(database.engine) as db:
+        db.add(User(username="metrics", hashed_password="", role="user"))
+        db.add(Event(name="Metrics", description="d", location="Hall", max_attendees=1,
+                     start_time=datetime.now(timezone.utc) + timedelta(days=1),
+                     end_time=datetime.now(timezone.utc) + timedelta(days=2)))
+        db.commit()
+
+
+def parse(exposition: str) -> dict:
+    samples = {}
+    for line in exposition.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_metrics_endpoint_reports_requests_queries_and_domain_counters(metrics_db):
+    headers = {"Authorization": f"Bearer {auth.create_access_token({'sub': 'metrics'})}"}
+    route = 'http_requests_total{method="POST",route="/event/{event_id}/attendees",status="%s"}'
+
+    def attendee(n):
+        return {"first_name": "M", "last_name": str(n), "email": f"m{n}@example.com",
+                "phone_number": "1"}
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                     base_url="http://test") as client:
+            before = parse((await client.get("/metrics")).text)
+            assert (await client.post("/event/1/attendees", json=attendee(1))).status_code == 200
+            assert (await client.post("/event/1/attendees", json=attendee(2))).status_code == 400
+            assert (await client.put("/event/1/attendees/1/checkin", headers=headers)).status_code == 200
+            csv_content = "email\nm1@example.com\nnobody@example.com\n"
+            assert (await client.post("/event/1/attendees/bulk-checkin", headers=headers, files={
+                "file": ("c.csv", csv_content, "text/csv")})).status_code == 200
+            await client.get("/no-such-route")
+            response = await client.get("/metrics")
+            return before, response
+
+    before, response = asyncio.run(run())
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    after = parse(response.text)
+
+    def delta(name):
+        return after.get(name, 0) - before.get(name, 0)
+
+    assert delta(route % 200) == 1
+    assert delta(route % 400) == 1
+    assert delta('http_requests_total{method="GET",route="<unmatched>",status="404"}') == 1
+    # Route templates, not raw paths, become labels
+    assert not any("/event/1/" in name for name in after)
+    assert delta('http_request_duration_seconds_count{method="POST",'
+                 'route="/event/{event_id}/attendees"}') == 2
+    assert after['http_request_duration_seconds_bucket{method="POST",'
+                 'route="/event/{event_id}/attendees",le="+Inf"}'] >= 2
+    # The scrape itself is in flight while the page is rendered
+    assert after["http_requests_in_progress"] == 1
+
+    assert delta('db_query_duration_seconds_count{statement="SELECT"}') >= 4
+    assert delta('db_query_duration_seconds_count{statement="UPDATE"}') >= 2
+    assert delta("db_pool_checkouts_total") >= 4
+
+    assert delta('attendee_registrations_total{source="single"}') == 1
+    assert delta('attendee_registration_rejections_total{reason="full"}') == 1
+    assert delta('attendee_checkins_total{source="single"}') == 1
+    assert delta('bulk_checkin_rows_total{outcome="already_checked_in"}') == 1
+    assert delta('bulk_checkin_rows_total{outcome="not_found"}') == 1
+
+
+def test_pool_waits_are_counted(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'pool.db'}", pool_size=1, max_overflow=0)
+    waits = metrics.DB_POOL_WAITS.get()
+    checkouts = metrics.DB_POOL_CHECKOUTS.get()
+    held = threading.Event()
+
+    def hold():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            held.set()
+            time.sleep(0.2)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    held.wait()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    holder.join()
+    engine.dispose()
+
+    assert metrics.DB_POOL_WAITS.get() - waits == 1
+    assert metrics.DB_POOL_CHECKOUTS.get() - checkouts == 2
+    count, waited = metrics.DB_POOL_WAIT_SECONDS.get()
+    assert count >= 1 and waited >= 0.1
+
+
+def test_statement_verbs():
+    assert metrics.statement_verb("  select 1") == "SELECT"
+    assert metrics.statement_verb("WITH due AS (SELECT 1) UPDATE events SET status = 'x'") == "WITH"
+    assert metrics.statement_verb("WITH\nx AS (SELECT 1) SELECT * FROM x") == "WITH"
+    assert metrics.statement_verb("PRAGMA journal_mode=WAL") == "OTHER"
+    assert metrics.statement_verb("") == "OTHER"
+
+
+def test_histogram_exposition():
+    histogram = metrics.Histogram("demo_seconds", "Demo.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, "/a")
+    assert histogram.render().splitlines() == [
+        "# HELP demo_seconds Demo.",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{route="/a",le="0.1"} 1',
+        'demo_seconds_bucket{route="/a",le="1"} 3',
+        'demo_seconds_bucket{route="/a",le="+Inf"} 4',
+        'demo_seconds_sum{route="/a"} 4.05',
+        'demo_seconds_count{route="/a"} 4',
+    ]
+
+
+def test_middleware_overhead_is_small():
+    async def bare(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def noop(message):
+        pass
+
+    wrapped = metrics.MetricsMiddleware(bare)
+    scope = {"type": "http", "method": "GET"}
+    rounds = 20000
+
+    async def timed(handler):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            await handler(dict(scope), None, noop)
+        return time.perf_counter() - started
+
+    overhead = (asyncio.run(timed(wrapped)) - asyncio.run(timed(bare))) / rounds
+    assert overhead < 50e-6, f"middleware adds {overhead * 1e6:.1f}us per request"
@@ -0,0 +1,172 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from app import manage, migrations
+from app.database import Base
+
+# The schema the first release of the app created, before any migration existed
+FIRST_RELEASE_SCHEMA = [
+    "CREATE TABLE users (id INTEGER NOT NULL, username VARCHAR, hashed_password VARCHAR, "
+    "role VARCHAR, PRIMARY KEY (id))",
+    "CREATE INDEX ix_users_id ON users (id)",
+    "CREATE UNIQUE INDEX ix_users_username ON users (username)",
+    "CREATE TABLE events (event_id INTEGER NOT NULL, name VARCHAR, description VARCHAR, "
+    "start_time DATETIME, end_time DATETIME, location VARCHAR, max_attendees INTEGER, "
+    "status VARCHAR(9), PRIMARY KEY (event_id))",
+    "CREATE INDEX ix_events_event_id ON events (event_id)",
+    "CREATE INDEX ix_events_name ON events (name)",
+    "CREATE TABLE attendees (attendee_id INTEGER NOT NULL, first_name VARCHAR, last_name VARCHAR, "
+    "email VARCHAR, phone_number VARCHAR, event_id INTEGER, check_in_status BOOLEAN, "
+    "PRIMARY KEY (attendee_id), FOREIGN KEY(event_id) REFERENCES events (event_id))",
+    "CREATE INDEX ix_attendees_attendee_id ON attendees (attendee_id)",
+    "CREATE UNIQUE INDEX ix_attendees_email ON attendees (email)",
+]
+EVENTS = 25
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def legacy_engine(engine):
+    with engine.begin() as conn:
+        for statement in FIRST_RELEASE_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text(
+            "INSERT INTO events (event_id, name, description, location, max_attendees, status) "
+            "VALUES (:id, 'Legacy ' || :id, 'd', 'Hall', 10, 'SCHEDULED')"),
+            [{"id": i} for i in range(1, EVENTS + 1)])
+        # Event i has i % 4 attendees, every other one checked in
+        conn.execute(text(
+            "INSERT INTO attendees (first_name, last_name, email, phone_number, event_id, check_in_status) "
+            "VALUES ('F', 'L', :email, '1', :event_id, :checked_in)"),
+            [{"email": f"{i}-{n}@example.com", "event_id": i, "checked_in": n % 2 == 0}
+             for i in range(1, EVENTS + 1) for n in range(i % 4)])
+    return engine
+
+
+def schema(engine):
+    """Tables, columns and index names, the parts of a schema the app relies on."""
+    inspector = inspect(engine)
+    return {
+        table: ({column["name"] for column in inspector.get_columns(table)},
+                {index["name"] for index in inspector.get_indexes(table)}
+                | {constraint["name"] for constraint in inspector.get_unique_constraints(table)})
+        for table in inspector.get_table_names()
+        if table != "schema_migrations" and not table.startswith("events_fts_")
+    }
+
+
+def test_first_release_database_is_brought_up_to_date(legacy_engine, monkeypatch):
+    # Backfills several batches rather than one
+    monkeypatch.setattr(migrations, "MIGRATION_BATCH_SIZE", 4)
+    with legacy_engine.connect() as conn:
+        ran = migrations.upgrade(conn)
+        assert [m.version for m in ran] == [m.version for m in migrations.MIGRATIONS]
+        assert migrations.applied(conn) == list(range(1, migrations.LATEST + 1))
+        assert migrations.upgrade(conn) == []
+        migrations.check(conn)
+
+        counts = conn.execute(text(
+            "SELECT event_id, attendee_count, checked_in_count FROM events ORDER BY event_id")).all()
+        assert counts == [(i, i % 4, (i % 4 + 1) // 2) for i in range(1, EVENTS + 1)]
+        assert conn.scalar(text("SELECT count(*) FROM events_fts WHERE events_fts MATCH 'legacy'")) == EVENTS
+        # Emails are unique per event now, not across all of them
+        conn.execute(text("INSERT INTO attendees (email, event_id) VALUES ('1-0@example.com', 2)"))
+        with pytest.raises(Exception):
+            conn.execute(text("INSERT INTO attendees (email, event_id) VALUES ('1-0@example.com', 1)"))
+        conn.rollback()
+
+    fresh = create_engine("sqlite://")
+    Base.metadata.create_all(fresh)
+    assert schema(legacy_engine) == schema(fresh)
+
+
+def test_new_database_matches_the_models(engine):
+    with engine.connect() as conn:
+        migrations.upgrade(conn)
+    expected = create_engine("sqlite://")
+    Base.metadata.create_all(expected)
+    assert schema(engine) == schema(expected)
+
+
+def test_upgraded_database_never_reuses_attendee_ids(legacy_engine):
+    def register(conn):
+        conn.execute(text("INSERT INTO attendees (email, event_id) VALUES ('new@example.com', 1)"))
+        return conn.scalar(text("SELECT max(attendee_id) FROM attendees"))
+
+    with legacy_engine.connect() as conn:
+        rows = conn.execute(text("SELECT * FROM attendees ORDER BY attendee_id")).all()
+        migrations.upgrade(conn)
+        assert conn.execute(text(
+            "SELECT attendee_id, first_name, last_name, email, phone_number, event_id, check_in_status "
+            "FROM attendees ORDER BY attendee_id")).all() == rows
+
+        # The newest registration is cancelled; its id stays retired
+        newest = conn.scalar(text("SELECT max(attendee_id) FROM attendees"))
+        conn.execute(text("DELETE FROM attendees WHERE attendee_id = :id"), {"id": newest})
+        assert register(conn) == newest + 1
+        conn.commit()
+
+        # Back on the old table, the highest free id is handed out again
+        migrations.downgrade(conn, 6)
+        conn.execute(text("DELETE FROM attendees WHERE attendee_id = :id"), {"id": newest + 1})
+        assert register(conn) == newest
+        conn.rollback()
+
+
+def test_migrations_reverse_and_reapply(legacy_engine):
+    before = schema(legacy_engine)
+    with legacy_engine.connect() as conn:
+        migrations.upgrade(conn)
+        after = schema(legacy_engine)
+
+        # Back to the first release's schema, data kept
+        migrations.downgrade(conn, 1)
+        assert migrations.applied(conn) == [1]
+        assert schema(legacy_engine) == before
+        assert conn.scalar(text("SELECT count(*) FROM events")) == EVENTS
+
+        assert [m.version for m in migrations.upgrade(conn, 3)] == [2, 3]
+        with pytest.raises(RuntimeError, match="missing migration"):
+            migrations.check(conn)
+        migrations.upgrade(conn)
+    assert schema(legacy_engine) == after
+
+
+def test_downgrade_refuses_to_break_data(legacy_engine):
+    with legacy_engine.connect() as conn:
+        migrations.upgrade(conn)
+        conn.execute(text("INSERT INTO attendees (email, event_id) VALUES ('1-0@example.com', 2)"))
+        conn.commit()
+        # The first release's unique email index cannot hold this data
+        with pytest.raises(Exception):
+            migrations.downgrade(conn, 2)
+        # The later migrations were reversed, the failing one rolled back
+        assert migrations.applied(conn) == [1, 2, 3]
+        assert "ix_attendees_email" not in schema(legacy_engine)["attendees"][1]
+        migrations.upgrade(conn)
+        assert migrations.applied(conn)[-1] == migrations.LATEST
+
+
+def test_manage_commands(engine, monkeypatch, capsys):
+    monkeypatch.setattr(manage, "engine", engine)
+    manage.main(["migrate", "--to", "2"])
+    assert "Schema is at version 2" in capsys.readouterr().out
+
+    manage.main(["migration-status"])
+    status = capsys.readouterr().out.splitlines()
+    assert status[:3] == ["[x] 1: create tables", "[x] 2: events.attendee_count",
+                          "[ ] 3: filter indexes and per-event email uniqueness"]
+
+    manage.main(["migrate"])
+    assert f"Schema is at version {migrations.LATEST}" in capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        manage.main(["downgrade"])
+    manage.main(["downgrade", "--to", "0"])
+    assert "Reversed 1: create tables" in capsys.readouterr().out
+    assert inspect(engine).get_table_names() == ["schema_migrations"]
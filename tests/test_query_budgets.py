@@ -0,0 +1,163 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app import auth, idempotency, querystats, registration
+from app.cache import MemoryCacheBackend
+from app.main import app, response_cache
+from app.models import Attendee, Event, User
+
+# Most statements and commits each hot path may issue. Lower these when a
+# handler gets cheaper; raising one needs a reason in review.
+BUDGETS = {
+    "POST /event": (1, 1),
+    "PUT /event/{event_id}": (2, 1),
+    "POST /event/{event_id}/attendees": (2, 1),
+    # A retry with the same Idempotency-Key is answered from the key store
+    "POST /event/{event_id}/attendees (replayed)": (0, 0),
+    # Check-ins also bump the event's checked_in_count and its minute bucket
+    "PUT /event/{event_id}/attendees/{attendee_id}/checkin": (4, 1),
+    "POST /event/{event_id}/attendees/bulk-checkin": (5, 1),
+    "POST /event/{event_id}/attendees/import": (5, 1),
+    # Cancelling also looks for waitlisted attendees to take the freed seat
+    "DELETE /event/{event_id}/attendees/{attendee_id}": (4, 1),
+    "GET /events": (1, 0),
+    "GET /events (cached)": (0, 0),
+    "GET /events/search": (1, 0),
+    "GET /event/{event_id}/attendees": (1, 0),
+    "GET /event/{event_id}/stats": (1, 0),
+    "GET /event/{event_id}/feed": (1, 0),
+    "GET /scheduler": (0, 0),
+    "token lookup on a cold cache": (1, 0),
+}
+
+
+@pytest.fixture
+def budget_client(app_db, monkeypatch):
+    database = app_db("budget.db")
+    now = datetime.now(timezone.utc)
+    with Session(database.engine) as db:
+        db.add(User(username="budget", hashed_password="", role="user"))
+        db.add(Event(event_id=1, name="Budget", description="d", location="Hall",
+                     max_attendees=100, attendee_count=2,
+                     start_time=now + timedelta(days=1), end_time=now + timedelta(days=2)))
+        db.add_all([Attendee(event_id=1, first_name="B", last_name=str(n), phone_number="1",
+                             email=f"b{n}@example.com", check_in_status=False) for n in (1, 2)])
+        db.commit()
+
+    monkeypatch.setattr(querystats, "QUERY_STATS_HEADER", True)
+    monkeypatch.setattr(response_cache, "backend", MemoryCacheBackend())
+    monkeypatch.setattr(idempotency.store, "backend", MemoryCacheBackend())
+    # No lifespan: the scheduler is not part of any request's budget
+    return TestClient(app)
+
+
+def used(response):
+    stats = querystats.parse_header(response.headers["x-query-stats"])
+    return stats["statements"], stats["commits"]
+
+
+def check(name, response, expected_status=200):
+    assert response.status_code == expected_status, response.text
+    statements, commits = used(response)
+    max_statements, max_commits = BUDGETS[name]
+    assert statements <= max_statements, f"{name} ran {statements} statements, budget {max_statements}"
+    assert commits <= max_commits, f"{name} committed {commits} times, budget {max_commits}"
+
+
+def test_hot_paths_stay_within_query_budget(budget_client):
+    client = budget_client
+    token = auth.create_access_token({"sub": "budget"})
+    headers = {"Authorization": f"Bearer {token}"}
+    auth.token_cache.clear()
+    check("token lookup on a cold cache", client.get("/scheduler", headers=headers))
+    # From here on the principal is cached and costs nothing
+    check("GET /scheduler", client.get("/scheduler", headers=headers))
+
+    start = datetime.now(timezone.utc) + timedelta(days=3)
+    check("POST /event", client.post("/event", headers=headers, json={
+        "name": "New", "description": "d", "location": "Hall", "max_attendees": 5,
+        "start_time": start.isoformat(), "end_time": (start + timedelta(hours=1)).isoformat()}), 201)
+    check("PUT /event/{event_id}", client.put("/event/1", headers=headers,
+                                               json={"description": "changed"}))
+    signup = {"first_name": "N", "last_name": "W", "email": "new@example.com", "phone_number": "1"}
+    check("POST /event/{event_id}/attendees", client.post(
+        "/event/1/attendees", json=signup, headers={"Idempotency-Key": "budget"}))
+    check("POST /event/{event_id}/attendees (replayed)", client.post(
+        "/event/1/attendees", json=signup, headers={"Idempotency-Key": "budget"}))
+    check("PUT /event/{event_id}/attendees/{attendee_id}/checkin",
+          client.put("/event/1/attendees/1/checkin", headers=headers))
+    check("POST /event/{event_id}/attendees/bulk-checkin", client.post(
+        "/event/1/attendees/bulk-checkin", headers=headers,
+        files={"file": ("c.csv", "email\nb1@example.com\nb2@example.com\n", "text/csv")}))
+    check("POST /event/{event_id}/attendees/import", client.post(
+        "/event/1/attendees/import", headers=headers,
+        json=[{"first_name": "I", "last_name": str(n), "email": f"i{n}@example.com",
+               "phone_number": "1"} for n in range(5)]))
+    check("DELETE /event/{event_id}/attendees/{attendee_id}",
+          client.delete("/event/1/attendees/2", headers=headers), 204)
+
+    check("GET /events", client.get("/events", params={"status": "scheduled"}))
+    check("GET /events (cached)", client.get("/events", params={"status": "scheduled"}))
+    check("GET /events/search", client.get("/events/search", params={"q": "budget hall"}))
+    check("GET /event/{event_id}/attendees", client.get("/event/1/attendees"))
+    check("GET /event/{event_id}/stats", client.get("/event/1/stats", headers=headers))
+    check("GET /event/{event_id}/feed", client.get("/event/1/feed", headers=headers,
+                                                   params={"since": 0, "timeout": 0}))
+
+
+def test_batched_checkins_count_towards_each_request(budget_client, run_asgi):
+    headers = {"Authorization": f"Bearer {auth.create_access_token({'sub': 'budget'})}"}
+    budget_client.get("/scheduler", headers=headers)
+
+    async def requests(client):
+        checkins = [client.put(f"/event/1/attendees/{attendee_id}/checkin", headers=headers)
+                    for attendee_id in (1, 2)]
+        return await asyncio.gather(*checkins) + [await client.get("/event/1/attendees")]
+
+    *checkins, listing = run_asgi(app, requests)
+    # Each is charged for the transaction that carried it, shared or not
+    assert used(checkins[0]) == used(checkins[1])
+    for response in checkins:
+        check("PUT /event/{event_id}/attendees/{attendee_id}/checkin", response)
+        assert used(response)[1] == 1
+    # Nothing the writer ran afterwards leaks into another request
+    assert used(listing) == (1, 0)
+
+
+def test_queued_registrations_count_towards_each_request(budget_client, run_asgi, monkeypatch):
+    # Other modules' event 1 must not be remembered as queued
+    monkeypatch.setattr(registration, "queues",
+                        registration.RegistrationQueues(registration.queues.session_factory))
+    headers = {"Authorization": f"Bearer {auth.create_access_token({'sub': 'budget'})}"}
+    assert budget_client.put("/event/1", headers=headers, json={"registration_queue": True}).status_code == 200
+
+    async def requests(client):
+        signups = [client.post("/event/1/attendees", json={
+            "first_name": "Q", "last_name": str(n), "email": f"q{n}@example.com", "phone_number": "1"})
+            for n in range(2)]
+        return await asyncio.gather(*signups) + [await client.get("/event/1/attendees")]
+
+    *signups, listing = run_asgi(app, requests)
+    for response in signups:
+        assert response.status_code == 200
+        statements, commits = used(response)
+        assert statements > 0 and commits == 1
+    assert used(listing) == (1, 0)
+
+
+def test_header_is_off_by_default(budget_client, monkeypatch):
+    monkeypatch.setattr(querystats, "QUERY_STATS_HEADER", False)
+    assert "x-query-stats" not in budget_client.get("/events").headers
+
+
+def test_request_totals_are_logged(budget_client, caplog):
+    with caplog.at_level("DEBUG", logger="app.querystats"):
+        response = budget_client.get("/event/1/attendees")
+    record = next(r for r in caplog.records if r.name == "app.querystats")
+    assert record.route == "/event/{event_id}/attendees"
+    assert (record.statements, record.commits) == used(response)
+    assert record.rows == 2
@@ -0,0 +1,111 @@
+"""Fail when a query issued by the API regresses to a full table scan.
+
+Every statement the routes send to SQLite is captured while exercising
+them, then replayed through ``EXPLAIN QUERY PLAN``.
+"""
+import re
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.auth import create_access_token
+from app.main import app
+
+FTS_MATCH = re.compile(r"VIRTUAL TABLE INDEX \d+:M")
+
+
+@pytest.fixture
+def captured_statements(app_db):
+    database = app_db("plans.db")
+    statements = []
+
+    @event.listens_for(database.async_engine.sync_engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append((statement, parameters))
+
+    return statements, database.engine
+
+
+def exercise_api(client):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'planner'})}"}
+    now = datetime.now(timezone.utc)
+
+    assert client.post("/register", json={"username": "planner", "password": "pw"}).status_code == 200
+    assert client.post("/token", data={"username": "planner", "password": "pw"}).status_code == 200
+
+    response = client.post("/event", headers=headers, json={
+        "name": "Plan Event", "description": "d", "location": "Hall",
+        "start_time": (now + timedelta(days=1)).isoformat(),
+        "end_time": (now + timedelta(days=2)).isoformat(),
+        "max_attendees": 10,
+    })
+    event_id = response.json()["event_id"]
+    assert client.put(f"/event/{event_id}", headers=headers, json={"name": "Renamed"}).status_code == 200
+
+    attendee_ids = []
+    for i in range(2):
+        response = client.post(f"/event/{event_id}/attendees", json={
+            "first_name": "A", "last_name": "B", "email": f"plan{i}@example.com", "phone_number": "1",
+        })
+        attendee_ids.append(response.json()["attendee_id"])
+    assert client.post(f"/event/{event_id}/attendees", json={
+        "first_name": "A", "last_name": "B", "email": "plan0@example.com", "phone_number": "1",
+    }).status_code == 400
+
+    assert client.post(f"/event/{event_id}/attendees/import", headers=headers, json=[
+        {"first_name": "A", "last_name": "B", "email": "plan0@example.com", "phone_number": "1"},
+        {"first_name": "A", "last_name": "B", "email": "plan9@example.com", "phone_number": "1"},
+    ]).status_code == 200
+
+    assert client.put(f"/event/{event_id}/attendees/{attendee_ids[0]}/checkin",
+                      headers=headers).status_code == 200
+    csv_content = f"attendee_id,email\n{attendee_ids[1]},\n,plan0@example.com\n"
+    assert client.post(f"/event/{event_id}/attendees/bulk-checkin", headers=headers,
+                       files={"file": ("c.csv", csv_content, "text/csv")}).status_code == 200
+
+    for params in ({"status": "scheduled"}, {"location": "Hall"},
+                   {"date": (now + timedelta(days=1, hours=1)).isoformat()},
+                   {"after": event_id}):
+        assert client.get("/events", params=params).status_code == 200
+    for params in ({}, {"check_in_status": True}, {"after": attendee_ids[0]},
+                   {"check_in_status": False, "format": "ndjson"}):
+        assert client.get(f"/event/{event_id}/attendees", params=params).status_code == 200
+    for params in ({}, {"check_in_status": True, "format": "ndjson"}):
+        assert client.get(f"/event/{event_id}/attendees/export", headers=headers,
+                          params=params).status_code == 200
+    assert client.get(f"/event/{event_id}/stats", headers=headers).status_code == 200
+    assert client.get("/events/stats", headers=headers,
+                      params={"event_id": [event_id, 1]}).status_code == 200
+    assert client.get(f"/event/{event_id}/stats/checkins", headers=headers).status_code == 200
+    for params in ({"q": "hall"}, {"q": "ha*", "status": "scheduled"}):
+        assert client.get("/events/search", params=params).status_code == 200
+    assert client.get("/events/export", headers=headers,
+                      params={"status": "scheduled"}).status_code == 200
+
+
+def test_api_queries_use_indexes(captured_statements):
+    statements, sync_engine = captured_statements
+    # No lifespan: startup maintenance is not part of the request paths
+    exercise_api(TestClient(app))
+
+    checked = 0
+    scans = []
+    with sync_engine.connect() as conn:
+        for statement, parameters in statements:
+            verb = statement.lstrip().split(None, 1)[0].upper()
+            # Unfiltered statements (a plain first page) scan by design
+            if verb not in ("SELECT", "UPDATE", "DELETE") or "WHERE" not in statement.split():
+                continue
+            plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, tuple(parameters)).all()
+            checked += 1
+            for row in plan:
+                # FTS5 reports a MATCH-driven index lookup as a virtual table
+                # "scan" whose index string starts with M
+                if row.detail.startswith("SCAN ") and not FTS_MATCH.search(row.detail):
+                    scans.append(f"{row.detail}: {statement}")
+
+    assert checked >= 15
+    assert scans == []
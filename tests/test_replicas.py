@@ -0,0 +1,110 @@
+import json
+import shutil
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main, replicas
+from app.auth import create_access_token
+from app.cache import MemoryCacheBackend, ResponseCache
+from app.main import app
+
+NOW = "2030-01-01 10:00:00"
+
+
+def add_event(path, name):
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO events (name, description, location, max_attendees, status, "
+                     "start_time, end_time) VALUES (?, 'd', 'Hall', 10, 'SCHEDULED', ?, ?)", (name, NOW, NOW))
+    conn.close()
+
+
+@pytest.fixture
+def cluster(app_db, tmp_path, monkeypatch):
+    """A primary, two replicas copied from it, and a replica that was never migrated."""
+    app_db("primary.db", migrate=True)
+    with sqlite3.connect(tmp_path / "primary.db") as conn:
+        conn.execute("INSERT INTO users (username, hashed_password, role) VALUES ('writer', '', 'user')")
+    conn.close()
+    for name in ("a", "b"):
+        shutil.copy(tmp_path / "primary.db", tmp_path / f"{name}.db")
+        add_event(tmp_path / f"{name}.db", f"replica {name}")
+    urls = [f"sqlite:///{tmp_path / name}.db" for name in ("a", "b", "unmigrated")]
+
+    readers = replicas.ReadReplicas(urls, window=60, check_interval=3600)
+    monkeypatch.setattr(replicas, "readers", readers)
+    with TestClient(app) as client:
+        yield client, readers
+
+
+def event_names(client, **kwargs):
+    # NDJSON pages skip the response cache, so every call reaches a database
+    response = client.get("/events", params={"format": "ndjson"}, **kwargs)
+    assert response.status_code == 200
+    return {json.loads(line)["name"] for line in response.text.splitlines()}
+
+
+def test_reads_rotate_over_healthy_replicas(cluster):
+    client, readers = cluster
+    assert [replica.healthy for replica in readers.replicas] == [True, True, False]
+    seen = [event_names(client) for _ in range(4)]
+    assert seen == [{"replica a"}, {"replica b"}, {"replica a"}, {"replica b"}]
+
+    readers.replicas[0].healthy = False
+    assert [event_names(client) for _ in range(2)] == [{"replica b"}] * 2
+    # With no replica left, reads go to the primary
+    readers.replicas[1].healthy = False
+    assert event_names(client) == set()
+
+
+def test_writers_read_their_writes(cluster):
+    client, readers = cluster
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'writer'})}"}
+    response = client.post("/event", headers=headers, json={
+        "name": "written", "description": "d", "location": "Hall", "max_attendees": 10,
+        "start_time": "2030-01-01T10:00:00", "end_time": "2030-01-01T12:00:00"})
+    assert response.status_code == 201
+    assert replicas.PIN_COOKIE in response.cookies
+
+    # Pinned by the cookie, whichever worker answers
+    assert event_names(client) == {"written"}
+    # Pinned by the token in the worker that took the write
+    client.cookies.clear()
+    assert event_names(client, headers=headers) == {"written"}
+
+    # Anyone else reads from the replicas, which have not seen the write
+    assert event_names(client) in ({"replica a"}, {"replica b"})
+
+    # Once the window has passed, the writer is back on the replicas too
+    readers.window = 0
+    readers.pin({"type": "http", "headers": [(b"authorization", headers["Authorization"].encode())]})
+    assert event_names(client, headers=headers) in ({"replica a"}, {"replica b"})
+
+
+def test_pinned_reads_skip_pages_cached_from_replicas(cluster, monkeypatch):
+    client, readers = cluster
+    monkeypatch.setattr(main, "response_cache", ResponseCache(MemoryCacheBackend()))
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'writer'})}"}
+    response = client.post("/event", headers=headers, json={
+        "name": "written", "description": "d", "location": "Hall", "max_attendees": 10,
+        "start_time": "2030-01-01T10:00:00", "end_time": "2030-01-01T12:00:00"})
+    assert response.status_code == 201
+    client.cookies.clear()
+
+    def cached_names(**kwargs):
+        response = client.get("/events", **kwargs)
+        assert response.status_code == 200
+        return {event["name"] for event in response.json()}
+
+    # Someone else caches the page the write invalidated, from a replica
+    assert cached_names() in ({"replica a"}, {"replica b"})
+    assert cached_names(headers=headers) == {"written"}
+
+
+def test_failed_writes_do_not_pin(cluster):
+    client, readers = cluster
+    response = client.post("/event", json={"name": "anonymous"})
+    assert response.status_code == 401
+    assert replicas.PIN_COOKIE not in response.cookies
+    assert event_names(client) in ({"replica a"}, {"replica b"})
@@ -0,0 +1,109 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from app.database import Base, async_url
+from app.models import Event, EventStatus
+from app.scheduler import EventLifecycleScheduler
+
+
+def make_event(name, start, end, status=EventStatus.SCHEDULED):
+    return Event(name=name, description="d", location="Hall", max_attendees=10,
+                 start_time=start, end_time=end, status=status)
+
+
+def test_scheduler_applies_due_and_upcoming_transitions(tmp_path):
+    url = f"sqlite:///{tmp_path / 'scheduler.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    now = datetime.now(timezone.utc)
+    with Session(engine) as db:
+        db.add_all([
+            make_event("ended", now - timedelta(days=2), now - timedelta(days=1)),
+            make_event("running", now - timedelta(hours=1), now + timedelta(hours=1)),
+            make_event("starts soon", now + timedelta(milliseconds=300), now + timedelta(hours=2)),
+            make_event("later", now + timedelta(days=3), now + timedelta(days=4)),
+            make_event("canceled", now - timedelta(days=2), now - timedelta(days=1),
+                       status=EventStatus.CANCELED),
+        ])
+        db.commit()
+
+    async def run():
+        async_engine = create_async_engine(async_url(url))
+        scheduler = EventLifecycleScheduler(
+            async_sessionmaker(bind=async_engine, expire_on_commit=False))
+        try:
+            await scheduler.catch_up()
+            after_catch_up = scheduler.stats()
+            scheduler.start()
+            await asyncio.sleep(0.6)
+            return after_catch_up, scheduler.stats()
+        finally:
+            await scheduler.stop()
+            await async_engine.dispose()
+
+    after_catch_up, final = asyncio.run(run())
+
+    # "starts soon" start/end and "running" end are within the horizon
+    assert after_catch_up["transitions_applied"] == 2
+    assert after_catch_up["queue_depth"] == 3
+    assert final["transitions_applied"] == 3
+    assert final["queue_depth"] == 2
+    assert final["last_lag_seconds"] < 0.5
+
+    with Session(engine) as db:
+        statuses = dict(db.execute(select(Event.name, Event.status)).all())
+    assert statuses == {
+        "ended": EventStatus.COMPLETED,
+        "running": EventStatus.ONGOING,
+        "starts soon": EventStatus.ONGOING,
+        "later": EventStatus.SCHEDULED,
+        "canceled": EventStatus.CANCELED,
+    }
+    engine.dispose()
+
+
+def test_scheduler_survives_a_failed_run(tmp_path, caplog):
+    url = f"sqlite:///{tmp_path / 'scheduler.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    now = datetime.now(timezone.utc)
+    with Session(engine) as db:
+        db.add(make_event("starts soon", now + timedelta(milliseconds=200), now + timedelta(hours=2)))
+        db.commit()
+
+    async def run():
+        async_engine = create_async_engine(async_url(url))
+        sessions = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+        scheduler = EventLifecycleScheduler(sessions, retry_delay=0.05)
+        try:
+            await scheduler.catch_up()
+            # The run that finds "starts soon" due cannot reach the database
+            calls = []
+
+            def flaky_sessions():
+                calls.append(1)
+                if len(calls) == 1:
+                    raise OperationalError("BEGIN", {}, Exception("database is locked"))
+                return sessions()
+
+            scheduler.session_factory = flaky_sessions
+            scheduler.start()
+            await asyncio.sleep(0.6)
+            assert not scheduler._task.done()
+            return scheduler.stats(), len(calls)
+        finally:
+            await scheduler.stop()
+            await async_engine.dispose()
+
+    stats, calls = asyncio.run(run())
+    assert calls >= 2
+    assert stats["transitions_applied"] == 1
+    assert "Event lifecycle run failed" in caplog.text
+    with Session(engine) as db:
+        assert db.scalar(select(Event.status)) == EventStatus.ONGOING
+    engine.dispose()
@@ -0,0 +1,65 @@
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app import search
+from app.database import Base, async_url
+from app.models import Event
+
+EVENTS = 200_000
+# One event in this many mentions the rare word
+RARE_EVERY = 2000
+MAX_MEDIAN_SECONDS = 0.02
+WORDS = ["conference", "meetup", "workshop", "summit", "festival", "concert", "expo", "hackathon"]
+CITIES = ["Lisbon", "Osaka", "Denver", "Nairobi", "Tallinn", "Quito", "Perth", "Bergen"]
+
+
+async def timed(url, query, rounds=20):
+    engine = create_async_engine(async_url(url))
+    try:
+        async with AsyncSession(engine) as db:
+            rows = (await db.scalars(query)).all()
+            durations = []
+            for _ in range(rounds):
+                started = time.perf_counter()
+                (await db.scalars(query)).all()
+                durations.append(time.perf_counter() - started)
+            return rows, statistics.median(durations)
+    finally:
+        await engine.dispose()
+
+
+def test_ranked_search_over_many_events_is_fast(tmp_path):
+    url = f"sqlite:///{tmp_path / 'search.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    start = datetime.now(timezone.utc) + timedelta(days=1)
+    with engine.begin() as conn:
+        conn.execute(insert(Event), [{
+            "name": f"{CITIES[i % 8]} {WORDS[i % 7]} {i}",
+            "description": f"A {WORDS[(i // 7) % 8]} for everyone" + (" with axolotls" if i % RARE_EVERY == 0 else ""),
+            "location": CITIES[(i // 3) % 8], "max_attendees": 100,
+            "start_time": start, "end_time": start + timedelta(hours=2),
+        } for i in range(EVENTS)])
+    engine.dispose()
+
+    query = search.events_query("sqlite", "axolotl*").limit(20)
+    rows, fts_seconds = asyncio.run(timed(url, query))
+    assert len(rows) == 20
+    assert all("axolotls" in event.description for event in rows)
+    assert fts_seconds < MAX_MEDIAN_SECONDS, f"ranked search took {fts_seconds * 1000:.1f}ms"
+
+    # What filtering without the index costs: a scan of every row
+    like = select(Event).where(or_(Event.name.ilike("%axolotl%"), Event.description.ilike("%axolotl%"),
+                                   Event.location.ilike("%axolotl%"))).order_by(Event.event_id)
+    _, scan_seconds = asyncio.run(timed(url, like.limit(20).offset(EVENTS // RARE_EVERY - 20), rounds=3))
+    assert fts_seconds * 10 < scan_seconds
+
+    combined = search.events_query("sqlite", "osaka summit").limit(20)
+    rows, seconds = asyncio.run(timed(url, combined))
+    assert rows and all("Osaka" in event.name + event.location for event in rows)
+    assert seconds < MAX_MEDIAN_SECONDS * 5, f"two-word search took {seconds * 1000:.1f}ms"
@@ -0,0 +1,59 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+from app import migrations
+
+ROOT = Path(__file__).resolve().parent.parent
+# Generous: each takes a second or two at most here, but CI machines are noisy
+MAX_IMPORT_SECONDS = 5
+MAX_STARTUP_SECONDS = 5
+
+COLD_START = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+result = {"import": imported - started}
+if sys.argv[1] == "serve":
+    from fastapi.testclient import TestClient
+    with TestClient(app.main.app) as client:
+        result["startup"] = time.perf_counter() - imported
+        result["events"] = client.get("/events").status_code
+print(json.dumps(result))
+"""
+
+
+def cold_start(database, mode):
+    """Time a fresh interpreter importing the app and, for ``serve``, starting it."""
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{database}"}
+    output = subprocess.run([sys.executable, "-c", COLD_START, mode], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def test_import_touches_no_database(tmp_path):
+    database = tmp_path / "cold.db"
+    timings = cold_start(database, "import")
+    assert not database.exists()
+    print(f"\nimport app.main: {timings['import'] * 1000:.0f} ms")
+    assert timings["import"] < MAX_IMPORT_SECONDS
+
+
+def test_startup_migrates_once(tmp_path):
+    database = tmp_path / "cold.db"
+    first = cold_start(database, "serve")
+    second = cold_start(database, "serve")
+    assert first["events"] == second["events"] == 200
+
+    engine = create_engine(f"sqlite:///{database}")
+    with engine.connect() as conn:
+        assert migrations.applied(conn)[-1] == migrations.LATEST
+    engine.dispose()
+    print(f"\nstartup on a new database: {first['startup'] * 1000:.0f} ms, "
+          f"on a migrated one: {second['startup'] * 1000:.0f} ms")
+    assert second["startup"] < MAX_STARTUP_SECONDS